@@ -0,0 +1,170 @@
+"""Inference backends for the YOLO models.
+
+Every model runs on one of three backends, chosen per (media type, task) in
+config.MODEL_BACKENDS:
+
+- ``torch``: the .pt weights as they are
+- ``onnx``: an ONNX export run with ONNX Runtime
+- ``openvino``: an OpenVINO IR export
+- ``onnx-int8``: the ONNX export quantized to INT8 (see quantization.py),
+  calibrated on the images in config.QUANT_CALIBRATION_DIR
+
+Exports are made with Ultralytics on first use and cached under
+config.EXPORT_DIR in a directory keyed by the hash of the weights file and the
+input size, so later starts (and other workers) reuse them. All backends are
+loaded through YOLO(), which returns the same Results objects for each of them.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+from ultralytics import YOLO
+from ultralytics.utils.downloads import attempt_download_asset
+
+import config
+from logs import get_logger
+
+BACKENDS = ("torch", "onnx", "openvino", "onnx-int8")
+PRECISIONS = ("fp32", "int8")
+# Backend used when INT8 precision is requested
+INT8_BACKEND = "onnx-int8"
+
+# Ultralytics export format and the artifact it writes next to the weights
+EXPORT_FORMATS = {
+    "onnx": ("onnx", "{stem}.onnx"),
+    "openvino": ("openvino", "{stem}_openvino_model"),
+}
+
+logger = get_logger(__name__)
+
+_hashes = {}
+_export_locks = {}
+_lock = threading.Lock()
+
+
+class BackendError(RuntimeError):
+    pass
+
+
+def weights_hash(path):
+    """Content hash of a weights file, remembered per path, size and mtime."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+    digest = _hashes.get(key)
+    if digest is None:
+        hasher = hashlib.blake2b(digest_size=8)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(chunk)
+        digest = _hashes[key] = hasher.hexdigest()
+    return digest
+
+
+def export_dir(weights, backend, imgsz, **export_args):
+    """Cache directory for one export of weights."""
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    suffix = "".join(f"-{name}" for name, value in sorted(export_args.items()) if value)
+    return os.path.join(config.EXPORT_DIR, f"{stem}-{weights_hash(weights)}-{backend}-{imgsz}{suffix}")
+
+
+def export_model(weights, task, backend, imgsz, **export_args):
+    """Path of the cached export of weights for backend, exporting it if needed.
+
+    export_args are passed on to YOLO.export() and become part of the cache key.
+    """
+    export_format, artifact = EXPORT_FORMATS[backend]
+    # Official weights are downloaded on first use, as YOLO() would do
+    weights = str(attempt_download_asset(weights))
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    target = export_dir(weights, backend, imgsz, **export_args)
+    path = os.path.join(target, artifact.format(stem=stem))
+    if os.path.exists(path):
+        return path
+
+    with _lock:
+        lock = _export_locks.setdefault(target, threading.Lock())
+    with lock:
+        if os.path.exists(path):
+            return path
+        os.makedirs(config.EXPORT_DIR, exist_ok=True)
+        # Export into a scratch directory and move it into place in one step,
+        # so a crash or a concurrent worker never sees a partial export
+        scratch = tempfile.mkdtemp(prefix=".export-", dir=config.EXPORT_DIR)
+        try:
+            source = os.path.join(scratch, os.path.basename(weights))
+            shutil.copy2(weights, source)
+            logger.info("Exporting model, this only happens once",
+                        extra={"weights": weights, "backend": backend, "imgsz": imgsz})
+            YOLO(source, task=task).export(format=export_format, imgsz=imgsz, dynamic=True, verbose=False,
+                                           **export_args)
+            os.remove(source)
+            try:
+                os.replace(scratch, target)
+            except OSError:
+                # Another process finished the same export first
+                if not os.path.exists(path):
+                    raise
+        except Exception as e:
+            raise BackendError(f"Failed to export {weights} to {backend}: {e}") from e
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+    return path
+
+
+def quantized_model(weights, task, imgsz):
+    """Path of the cached INT8 quantization of the ONNX export of weights."""
+    from quantization import calibration_hash, calibration_images, quantize_model
+
+    images = calibration_images(config.QUANT_CALIBRATION_DIR, config.QUANT_CALIBRATION_IMAGES)
+    if not images:
+        raise BackendError(f"INT8 quantization needs calibration images in {config.QUANT_CALIBRATION_DIR}")
+    fp32_path = export_model(weights, task, "onnx", imgsz)
+    weights = str(attempt_download_asset(weights))
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    # The calibration set is part of the key, so changing it re-quantizes
+    target = export_dir(weights, INT8_BACKEND, imgsz) + f"-{calibration_hash(images)}"
+    path = os.path.join(target, f"{stem}-int8.onnx")
+    if os.path.exists(path):
+        return path
+
+    with _lock:
+        lock = _export_locks.setdefault(target, threading.Lock())
+    with lock:
+        if os.path.exists(path):
+            return path
+        scratch = tempfile.mkdtemp(prefix=".export-", dir=config.EXPORT_DIR)
+        try:
+            logger.info("Quantizing model to INT8, this only happens once",
+                        extra={"weights": weights, "calibration_images": len(images)})
+            quantize_model(fp32_path, os.path.join(scratch, os.path.basename(path)), images, imgsz)
+            try:
+                os.replace(scratch, target)
+            except OSError:
+                if not os.path.exists(path):
+                    raise
+        except Exception as e:
+            raise BackendError(f"Failed to quantize {weights}: {e}") from e
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+    return path
+
+
+def load_model(weights, task, backend="torch", imgsz=640, **export_args):
+    """YOLO model for weights running on backend; task is the Ultralytics task name."""
+    if backend not in BACKENDS:
+        raise BackendError(f"Unsupported backend: {backend}")
+    if backend == INT8_BACKEND:
+        weights = quantized_model(weights, task, imgsz)
+    elif backend != "torch":
+        weights = export_model(weights, task, backend, imgsz, **export_args)
+    return YOLO(weights, task=task)
+
+
+def artifact_bytes(path):
+    """Size of an exported model file or directory."""
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, files in os.walk(path) for name in files)
+    return os.path.getsize(path)
@@ -0,0 +1,116 @@
+"""Dynamic micro-batching of concurrent image inference requests.
+
+Requests arriving within a short window are grouped and sent to the model as
+a single batched predict() call; each caller gets back its own Results.
+"""
+import asyncio
+import contextvars
+from collections import Counter, deque
+
+import config
+from model_registry import predict
+from workers import image_pool
+
+
+class MicroBatcher:
+    def __init__(self, media_type, task, pool, max_batch_size=8, max_wait_ms=5):
+        self.media_type = media_type
+        self.task = task
+        self.pool = pool
+        self.max_batch_size = max(max_batch_size, 1)
+        self.max_wait = max_wait_ms / 1000
+        self.batch_sizes = Counter()
+        self._pending = deque()
+        self._wakeup = None
+        self._worker = None
+        self._loop = None
+
+    async def submit(self, image, **options):
+        """Queue one image and wait for its Results."""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            # The worker serves every request, so it must not inherit the
+            # context (e.g. a profile) of the one that happened to start it
+            self._worker = contextvars.Context().run(loop.create_task, self._run())
+        future = loop.create_future()
+        key = tuple(sorted(options.items()))
+        self._pending.append((key, image, options, future))
+        self._wakeup.set()
+        return await future
+
+    async def _wait_for_batch(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(self._pending) < self.max_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+
+    def _take_batch(self):
+        # Only requests with identical predict() options can share a batch
+        key = self._pending[0][0]
+        batch, rest = [], deque()
+        while self._pending and len(batch) < self.max_batch_size:
+            item = self._pending.popleft()
+            (batch if item[0] == key else rest).append(item)
+        self._pending.extendleft(reversed(rest))
+        return batch
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            await self._wait_for_batch()
+            batch = self._take_batch()
+            images = [item[1] for item in batch]
+            options = batch[0][2]
+            self.batch_sizes[len(batch)] += 1
+            try:
+                results = await self.pool.submit(
+                    predict, self.media_type, self.task, images, verbose=False, **options
+                )
+            except Exception as e:
+                for _, _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, _, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def stats(self):
+        batches = sum(self.batch_sizes.values())
+        images = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": batches,
+            "images": images,
+            "mean_batch_size": round(images / batches, 3) if batches else 0,
+            "batch_sizes": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "pending": self.pending,
+        }
+
+
+batchers = {
+    task: MicroBatcher(
+        "image",
+        task,
+        image_pool,
+        max_batch_size=config.BATCH_MAX_SIZE,
+        max_wait_ms=config.BATCH_MAX_WAIT_MS,
+    )
+    for task in ("detection", "segmentation")
+}
@@ -0,0 +1,1050 @@
+"""Command-line benchmarks for the detection backend.
+
+Run from the backend directory with the model weights present locally, e.g.
+
+    python benchmark.py video-memory --frames 300 1200
+    python benchmark.py compositing --instances 1 10 50 100
+    python benchmark.py video-stride --strides 1 2 4 8 --clip sample.mp4
+    python benchmark.py video-stride --strides 1 --motion-thresholds 0 0.005 0.02 --clip static.mp4
+    python benchmark.py backend-parity --weights yolov8n.pt --backends onnx openvino --images samples/
+    python benchmark.py quantization --weights yolov8l.pt --images dataset/images --labels dataset/labels
+    python benchmark.py tiling --tile-sizes 640 1280 --images aerial/ --labels aerial/labels
+    python benchmark.py decode --sizes 4000x3000 6000x4000 --imgsz 640 1280 --detect
+    python benchmark.py --output stages.json stages --sizes 640x480 1920x1080 --instances 1 10 50
+    python benchmark.py compare baseline.json stages.json
+    python benchmark.py server --workers 1 2 4 --duration 30
+    python benchmark.py video-io --queue-sizes 0 8 --encoders opencv ffmpeg --clip sample.mp4
+
+Every command prints its results as JSON; --output also writes them, with the
+commit and library versions, to a file that compare can diff later.
+"""
+import argparse
+import json
+import mimetypes
+import os
+import platform
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+
+import cv2
+import numpy as np
+
+from classes import names_list
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        # ru_maxrss is the peak, not the current value, but it is the best
+        # portable approximation
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def synthetic_frame(index, width, height):
+    """A frame with a few moving rectangles so consecutive frames differ."""
+    frame = np.full((height, width, 3), 40, dtype=np.uint8)
+    for k in range(3):
+        x = (index * (3 + k) + k * width // 3) % max(width - 80, 1)
+        y = (k * height // 3 + index) % max(height - 80, 1)
+        cv2.rectangle(frame, (x, y), (x + 80, y + 80), (60 * (k + 1), 255 - 60 * k, 120), -1)
+    return frame
+
+
+def synthetic_clip(path, frames, width, height, fps=30):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for index in range(frames):
+        writer.write(synthetic_frame(index, width, height))
+    writer.release()
+    return path
+
+
+def parse_size(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def bench_video_memory(args):
+    """Peak memory of the streaming video pipeline for clips of several lengths."""
+    from video import process_video
+
+    width, height = parse_size(args.size)
+    runs = []
+    for frame_count in args.frames:
+        with tempfile.TemporaryDirectory() as tmp:
+            clip = synthetic_clip(os.path.join(tmp, "clip.mp4"), frame_count, width, height)
+            output = os.path.join(tmp, "out.mp4")
+            step = max(frame_count // 20, 1)
+            samples = []
+
+            def progress(done, total):
+                if done % step == 0:
+                    samples.append(current_rss_mb())
+
+            start_rss = current_rss_mb()
+            start = time.perf_counter()
+            written = process_video(clip, output, args.task, names_list, 0.25, True, True, "#B9282B", 2,
+                                    progress=progress)
+            elapsed = time.perf_counter() - start
+            # Ignore the first sample, which includes one-off allocations
+            # made while the pipeline warms up
+            steady = samples[1:] or samples
+            runs.append({
+                "frames": written,
+                "seconds": round(elapsed, 3),
+                "fps": round(written / elapsed, 2) if elapsed else None,
+                "rss_start_mb": round(start_rss, 1),
+                "rss_peak_mb": round(max(samples), 1) if samples else None,
+                "rss_steady_growth_mb": round(steady[-1] - steady[0], 1) if steady else None,
+            })
+    return {"benchmark": "video-memory", "task": args.task, "size": args.size, "runs": runs}
+
+
+def synthetic_masks(count, mask_shape, seed=0):
+    """count random elliptical instance masks at the model's mask resolution."""
+    rng = np.random.default_rng(seed)
+    h, w = mask_shape
+    masks = np.zeros((count, h, w), dtype=np.float32)
+    for mask in masks:
+        center = (int(rng.integers(0, w)), int(rng.integers(0, h)))
+        axes = (int(rng.integers(8, w // 6)), int(rng.integers(8, h // 4)))
+        cv2.ellipse(mask, center, axes, 0, 0, 360, 1.0, -1)
+    return masks
+
+
+def legacy_composite(image, masks, colors, alpha=0.5):
+    """Per-instance compositing as done before compositing.py, for comparison."""
+    overlay = image.copy()
+    for mask_data, color in zip(masks, colors):
+        mask_resized = cv2.resize(mask_data, (image.shape[1], image.shape[0]))
+        mask_bin = (mask_resized > 0.5).astype(np.uint8)
+        colored_mask = np.zeros_like(image, dtype=np.uint8)
+        for c in range(3):
+            colored_mask[:, :, c] = color[c]
+        overlay[mask_bin == 1] = cv2.addWeighted(image, 1 - alpha, colored_mask, alpha, 0)[mask_bin == 1]
+    return overlay
+
+
+def timed(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def model_mask_shape(width, height, imgsz=640):
+    """Mask resolution of an imgsz model input letterboxed from a width x height image."""
+    gain = imgsz / max(width, height)
+    return int(round(height * gain / 32)) * 32, int(round(width * gain / 32)) * 32
+
+
+def bench_compositing(args):
+    """Segmentation compositing time vs. instance count, per-instance loop vs. vectorized."""
+    from compositing import blend_labels, label_map
+
+    width, height = parse_size(args.size)
+    image = synthetic_frame(0, width, height)
+    mask_shape = model_mask_shape(width, height)
+    runs = []
+    for count in args.instances:
+        masks = synthetic_masks(count, mask_shape)
+        colors = np.random.default_rng(1).integers(0, 255, (count, 3)).tolist()
+        vectorized = timed(lambda: blend_labels(image, label_map(masks, image.shape), colors, 0.5), args.repeat)
+        run = {"instances": count, "vectorized_ms": round(vectorized * 1000, 2)}
+        if not args.skip_legacy:
+            legacy = timed(lambda: legacy_composite(image, masks, colors), args.repeat)
+            run["legacy_ms"] = round(legacy * 1000, 2)
+            run["speedup"] = round(legacy / vectorized, 1)
+        runs.append(run)
+    return {"benchmark": "compositing", "size": args.size, "mask_shape": list(mask_shape), "runs": runs}
+
+
+def box_iou(a, b):
+    """IoU matrix between (N, 4) and (M, 4) xyxy boxes."""
+    a = np.asarray(a, dtype=float).reshape(-1, 4)
+    b = np.asarray(b, dtype=float).reshape(-1, 4)
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def box_agreement(reference, frames, iou=0.5):
+    """Share of reference boxes matched by a same-class box with IoU >= iou, over all frames."""
+    matched = total = 0
+    for ref, other in zip(reference, frames):
+        total += ref["count"]
+        if ref["count"] and other["count"]:
+            same_class = np.equal.outer(ref["class_ids"], other["class_ids"])
+            matched += int(((box_iou(ref["boxes"], other["boxes"]) >= iou) & same_class).any(axis=1).sum())
+    return round(matched / total, 4) if total else None
+
+
+def bench_video_stride(args):
+    """Throughput of keyframe inference and motion gating vs. detecting on every frame."""
+    from model_registry import get_model
+    from video import iter_video_detections
+
+    # Load the model up front so the baseline does not include it
+    get_model("video", args.task)
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = args.clip
+        if clip is None:
+            width, height = parse_size(args.size)
+            clip = synthetic_clip(os.path.join(tmp, "clip.mp4"), args.frames, width, height)
+        runs = []
+        reference = None
+        for stride in args.strides:
+            for adaptive in ([False, True] if args.adaptive and stride > 1 else [False]):
+                for motion_threshold in args.motion_thresholds:
+                    start = time.perf_counter()
+                    items = list(iter_video_detections(clip, args.task, names_list, 0.25, stride=stride,
+                                                       adaptive_stride=adaptive,
+                                                       tracker=args.tracker if stride > 1 or adaptive else None,
+                                                       motion_threshold=motion_threshold))
+                    elapsed = time.perf_counter() - start
+                    frames, stats = items[1:-1], items[-1]["stats"]
+                    if reference is None:
+                        reference = frames
+                    runs.append({
+                        "stride": stride,
+                        "adaptive": adaptive,
+                        "motion_threshold": motion_threshold,
+                        "frames": len(frames),
+                        "keyframes": stats["keyframes"],
+                        "gated": stats["gated"],
+                        "seconds": round(elapsed, 3),
+                        "fps": round(len(frames) / elapsed, 2) if elapsed else None,
+                        "box_agreement": box_agreement(reference, frames),
+                    })
+    baseline = runs[0]["fps"]
+    for run in runs:
+        run["speedup"] = round(run["fps"] / baseline, 2) if baseline and run["fps"] else None
+    return {"benchmark": "video-stride", "task": args.task, "tracker": args.tracker,
+            "clip": args.clip or args.size, "runs": runs}
+
+
+def load_images(directory, count, size):
+    """Images from a directory (sorted, at most count), or synthetic frames without one."""
+    if directory:
+        paths = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                       if name.lower().endswith((".jpg", ".jpeg", ".png", ".bmp", ".webp")))
+        images = [cv2.imread(path) for path in paths[:count]]
+        return [image for image in images if image is not None]
+    width, height = parse_size(size)
+    return [synthetic_frame(index * 7, width, height) for index in range(count)]
+
+
+def detect_columns(model, images, conf):
+    """Per-image detection columns and the mean latency of model on images."""
+    from postprocess import detection_columns, extract_detections
+
+    model.predict(images[0], verbose=False, conf=conf)
+    columns = []
+    start = time.perf_counter()
+    for image in images:
+        result = model.predict(image, verbose=False, conf=conf)[0]
+        columns.append(detection_columns(extract_detections(result)))
+    return columns, (time.perf_counter() - start) / len(images)
+
+
+def score_difference(reference, frames, iou=0.5):
+    """Largest confidence difference between matched boxes."""
+    largest = 0.0
+    for ref, other in zip(reference, frames):
+        if ref["count"] and other["count"]:
+            overlaps = box_iou(ref["boxes"], other["boxes"])
+            for row, column in enumerate(overlaps.argmax(axis=1)):
+                if overlaps[row, column] >= iou:
+                    largest = max(largest, abs(ref["scores"][row] - other["scores"][column]))
+    return round(largest, 4)
+
+
+def bench_backend_parity(args):
+    """Detection parity and latency of exported backends against torch."""
+    from backends import load_model
+    from model_registry import YOLO_TASKS
+
+    images = load_images(args.images, args.count, args.size)
+    task = YOLO_TASKS[args.task]
+    reference, torch_latency = detect_columns(load_model(args.weights, task, "torch"), images, args.conf)
+    runs = [{"backend": "torch", "latency_ms": round(torch_latency * 1000, 2),
+             "detections": sum(item["count"] for item in reference)}]
+    for backend in args.backends:
+        columns, latency = detect_columns(load_model(args.weights, task, backend, args.imgsz), images, args.conf)
+        runs.append({
+            "backend": backend,
+            "latency_ms": round(latency * 1000, 2),
+            "speedup": round(torch_latency / latency, 2),
+            "detections": sum(item["count"] for item in columns),
+            "same_counts": sum(a["count"] == b["count"] for a, b in zip(reference, columns)) / len(images),
+            "box_agreement": box_agreement(reference, columns),
+            "reverse_box_agreement": box_agreement(columns, reference),
+            "max_score_difference": score_difference(reference, columns),
+        })
+    return {"benchmark": "backend-parity", "weights": args.weights, "task": args.task,
+            "images": len(images), "runs": runs}
+
+
+def image_paths(directory, count):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.lower().endswith((".jpg", ".jpeg", ".png", ".bmp", ".webp")))[:count]
+
+
+def yolo_labels(path, width, height):
+    """Ground truth from a YOLO-format label file (class cx cy w h, normalized)."""
+    boxes, class_ids = [], []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                values = line.split()
+                if len(values) < 5:
+                    continue
+                cx, cy, w, h = (float(v) for v in values[1:5])
+                boxes.append([(cx - w / 2) * width, (cy - h / 2) * height, (cx + w / 2) * width, (cy + h / 2) * height])
+                class_ids.append(int(values[0]))
+    return {"count": len(boxes), "boxes": boxes, "class_ids": class_ids}
+
+
+def average_precision(predictions, ground_truth, iou=0.5):
+    """Mean over classes of the 101-point interpolated AP at an IoU threshold."""
+    classes = {c for item in ground_truth for c in item["class_ids"]}
+    precisions = []
+    for class_id in sorted(classes):
+        scored = []  # (score, is true positive)
+        total = 0
+        for pred, truth in zip(predictions, ground_truth):
+            gt = [box for box, c in zip(truth["boxes"], truth["class_ids"]) if c == class_id]
+            total += len(gt)
+            rows = [i for i, c in enumerate(pred["class_ids"]) if c == class_id]
+            rows.sort(key=lambda i: -pred["scores"][i])
+            used = set()
+            overlaps = box_iou([pred["boxes"][i] for i in rows], gt) if rows and gt else None
+            for k, i in enumerate(rows):
+                match = -1
+                if overlaps is not None:
+                    for j in np.argsort(-overlaps[k]):
+                        if overlaps[k, j] >= iou and j not in used:
+                            match = j
+                            break
+                if match >= 0:
+                    used.add(match)
+                scored.append((pred["scores"][i], match >= 0))
+        scored.sort(key=lambda item: -item[0])
+        hits = np.cumsum([tp for _, tp in scored]) if scored else np.zeros(0)
+        recall = hits / max(total, 1)
+        precision = hits / np.arange(1, len(scored) + 1) if scored else np.zeros(0)
+        # Precision envelope, sampled at 101 recall points
+        envelope = np.maximum.accumulate(precision[::-1])[::-1] if len(precision) else precision
+        samples = [envelope[recall >= r].max() if (recall >= r).any() else 0.0 for r in np.linspace(0, 1, 101)]
+        precisions.append(float(np.mean(samples)))
+    return round(float(np.mean(precisions)), 4) if precisions else None
+
+
+def throughput(model, images, batch, conf):
+    """Images per second when predicting in batches."""
+    start = time.perf_counter()
+    for index in range(0, len(images), batch):
+        model.predict(images[index:index + batch], verbose=False, conf=conf)
+    return round(len(images) / (time.perf_counter() - start), 2)
+
+
+def bench_quantization(args):
+    """Latency, throughput and accuracy of the INT8 model against FP32 on a local dataset."""
+    from backends import INT8_BACKEND, load_model
+    from model_registry import YOLO_TASKS
+
+    if args.images:
+        paths = image_paths(args.images, args.count)
+        images = [cv2.imread(path) for path in paths]
+    else:
+        paths, images = [], load_images(None, args.count, args.size)
+    truth = None
+    if args.labels:
+        truth = [yolo_labels(os.path.join(args.labels, os.path.splitext(os.path.basename(path))[0] + ".txt"),
+                             image.shape[1], image.shape[0]) for path, image in zip(paths, images)]
+
+    task = YOLO_TASKS[args.task]
+    runs = {}
+    for name, backend in (("fp32", args.fp32_backend), ("int8", INT8_BACKEND)):
+        model = load_model(args.weights, task, backend, args.imgsz)
+        columns, latency = detect_columns(model, images, args.conf)
+        runs[name] = {
+            "backend": backend,
+            "latency_ms": round(latency * 1000, 2),
+            "throughput_fps": throughput(model, images, args.batch, args.conf),
+            "detections": sum(item["count"] for item in columns),
+            "columns": columns,
+        }
+        if truth is not None:
+            runs[name]["map50"] = average_precision(columns, truth)
+
+    fp32, int8 = runs["fp32"], runs["int8"]
+    comparison = {
+        "speedup": round(fp32["latency_ms"] / int8["latency_ms"], 2) if int8["latency_ms"] else None,
+        "box_agreement": box_agreement(fp32["columns"], int8["columns"]),
+        "reverse_box_agreement": box_agreement(int8["columns"], fp32["columns"]),
+        "max_score_difference": score_difference(fp32["columns"], int8["columns"]),
+        # With no labels, the FP32 predictions serve as ground truth
+        "map50_vs_fp32": average_precision(int8["columns"], fp32["columns"]),
+    }
+    if truth is not None:
+        comparison["map50_delta"] = (round(int8["map50"] - fp32["map50"], 4)
+                                     if None not in (int8["map50"], fp32["map50"]) else None)
+    for run in runs.values():
+        del run["columns"]
+    return {"benchmark": "quantization", "weights": args.weights, "task": args.task, "images": len(images),
+            "runs": runs, "comparison": comparison}
+
+
+def peak_rss_growth_mb(fn, interval=0.005):
+    """fn()'s return value and how far RSS rose above its starting value while it ran."""
+    start = current_rss_mb()
+    peak = [start]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(interval):
+            peak[0] = max(peak[0], current_rss_mb())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        value = fn()
+    finally:
+        done.set()
+        sampler.join()
+    return value, round(max(peak[0], current_rss_mb()) - start, 1)
+
+
+def bench_tiling(args):
+    """Latency, memory and detections of tiled inference vs. whole-image inference on large images."""
+    from model_registry import get_model
+    from postprocess import detection_columns, extract_detections
+    from tiling import tile_windows, tiled_predict
+
+    if args.images:
+        paths = image_paths(args.images, args.count)
+        images = [cv2.imread(path) for path in paths]
+    else:
+        paths, images = [], load_images(None, args.count, args.size)
+    truth = None
+    if args.labels:
+        truth = [yolo_labels(os.path.join(args.labels, os.path.splitext(os.path.basename(path))[0] + ".txt"),
+                             image.shape[1], image.shape[0]) for path, image in zip(paths, images)]
+
+    model = get_model("image", "detection")
+    model.predict(images[0], verbose=False, conf=args.conf)
+
+    def predict(sources, **options):
+        return model.predict(sources, verbose=False, **options)
+
+    def run(name, infer, **extra):
+        def infer_all():
+            return [detection_columns(extract_detections(infer(image))) for image in images]
+
+        start = time.perf_counter()
+        columns, rss_growth = peak_rss_growth_mb(infer_all)
+        elapsed = time.perf_counter() - start
+        result = {"mode": name, **extra, "latency_ms": round(elapsed / len(images) * 1000, 2),
+                  "rss_peak_growth_mb": rss_growth, "detections": sum(item["count"] for item in columns)}
+        if truth is not None:
+            result["map50"] = average_precision(columns, truth)
+        return result, columns
+
+    whole, reference = run("whole", lambda image: predict([image], conf=args.conf)[0])
+    runs = [whole]
+    for tile in args.tile_sizes:
+        height, width = images[0].shape[:2]
+        tiled, columns = run("tiled", lambda image: tiled_predict(predict, image, tile, args.overlap, args.batch,
+                                                                  not args.no_full_pass, conf=args.conf),
+                             tile_size=tile, tiles=len(tile_windows(width, height, tile, args.overlap)))
+        tiled["speedup"] = round(whole["latency_ms"] / tiled["latency_ms"], 2) if tiled["latency_ms"] else None
+        # Share of whole-image boxes that tiling also finds
+        tiled["whole_box_recall"] = box_agreement(reference, columns)
+        runs.append(tiled)
+    return {"benchmark": "tiling", "images": len(images), "size": list(images[0].shape[1::-1]),
+            "overlap": args.overlap, "batch": args.batch, "full_pass": not args.no_full_pass, "runs": runs}
+
+
+def encoded_images(args):
+    """(name, encoded bytes) of the benchmark images: local files, or synthetic JPEG/PNG encodes of each size."""
+    if args.images:
+        paths = image_paths(args.images, args.count)
+        return [(os.path.basename(path), open(path, "rb").read()) for path in paths]
+    encoded = []
+    for size in args.sizes:
+        width, height = parse_size(size)
+        # Upscaled synthetic frame: smooth like a photo, so it compresses like one
+        image = cv2.resize(synthetic_frame(7, width // 8, height // 8), (width, height), interpolation=cv2.INTER_CUBIC)
+        encoded.append((f"{size}.jpg", cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()))
+        encoded.append((f"{size}.png", cv2.imencode(".png", image)[1].tobytes()))
+    return encoded
+
+
+def bench_decode(args):
+    """Decode time and memory of full-resolution vs. reduced decoding for each inference size."""
+    from decoding import decode_image, rescale_result
+
+    model = None
+    if args.detect:
+        from model_registry import get_model
+        from postprocess import detection_columns, extract_detections
+
+        model = get_model("image", "detection")
+
+    runs = []
+    for name, content in encoded_images(args):
+        full, full_rss = peak_rss_growth_mb(lambda: decode_image(content))
+        full_seconds = timed(lambda: decode_image(content), args.repeat)
+        for imgsz in args.imgsz:
+            (image, shape), rss = peak_rss_growth_mb(lambda: decode_image(content, imgsz))
+            seconds = timed(lambda: decode_image(content, imgsz), args.repeat)
+            run = {
+                "image": name,
+                "bytes": len(content),
+                "imgsz": imgsz,
+                "size": [shape[1], shape[0]],
+                "decoded_size": [image.shape[1], image.shape[0]],
+                "full_decode_ms": round(full_seconds * 1000, 2),
+                "decode_ms": round(seconds * 1000, 2),
+                "decode_speedup": round(full_seconds / seconds, 2) if seconds else None,
+                "full_decode_mb": round(full[0].nbytes / (1024 * 1024), 1),
+                "decoded_mb": round(image.nbytes / (1024 * 1024), 1),
+                "full_rss_growth_mb": full_rss,
+                "rss_growth_mb": rss,
+            }
+            if model is not None:
+                reference = model.predict(full[0], verbose=False, conf=args.conf, imgsz=imgsz)[0]
+                result = model.predict(image, verbose=False, conf=args.conf, imgsz=imgsz)[0]
+                if image.shape[:2] != shape:
+                    result = rescale_result(result, shape)
+                reference, result = (detection_columns(extract_detections(item)) for item in (reference, result))
+                run["detections"] = reference["count"]
+                run["box_agreement"] = box_agreement([reference], [result])
+            runs.append(run)
+    return {"benchmark": "decode", "repeat": args.repeat, "runs": runs}
+
+
+def local_model(media_type, task):
+    """The configured model for media_type and task, refusing to download missing weights."""
+    from model_registry import get_model, model_spec
+
+    weights = model_spec(media_type, task)[0]
+    if not os.path.exists(weights):
+        raise SystemExit(f"{weights} not found; the benchmark only uses local weights "
+                         f"(set ARGUS_{media_type.upper()}_{task.upper()}_WEIGHTS)")
+    return get_model(media_type, task)
+
+
+def synthetic_result(image, count, task, seed=0):
+    """Results for image with count random boxes, and masks for segmentation."""
+    import torch
+    from ultralytics.engine.results import Results
+
+    from classes import names
+
+    rng = np.random.default_rng(seed)
+    height, width = image.shape[:2]
+    corners = rng.uniform(0, 0.9, (count, 2)) * (width, height)
+    sizes = rng.uniform(0.02, 0.1, (count, 2)) * (width, height)
+    boxes = np.column_stack([corners, corners + sizes, rng.uniform(0.3, 0.95, count),
+                             rng.integers(0, len(names), count)]).astype(np.float32)
+    masks = None
+    if task == "segmentation":
+        masks = torch.from_numpy(synthetic_masks(count, model_mask_shape(width, height), seed))
+    return Results(image, path="", names=names, boxes=torch.from_numpy(boxes), masks=masks)
+
+
+def stage_row(media_type, task, size, stage, seconds, instances=None):
+    row = {"media": media_type, "task": task, "size": size, "stage": stage}
+    if instances is not None:
+        row["instances"] = instances
+    row["ms"] = round(seconds * 1000, 3)
+    return row
+
+
+def image_stages(task, size, instances, repeat, conf):
+    """Per-stage timings of the image path of /api/detect for one task and size."""
+    from compositing import blend_labels, label_map
+    from encoding import encode_image
+    from main import read_image_bytes
+    from postprocess import draw_boxes, extract_detections
+
+    width, height = parse_size(size)
+    content = cv2.imencode(".png", synthetic_frame(0, width, height))[1].tobytes()
+    model = local_model("image", task)
+    image = read_image_bytes(content, task)[0]
+    rows = [
+        stage_row("image", task, size, "decode", timed(lambda: read_image_bytes(content, task), repeat)),
+        stage_row("image", task, size, "inference",
+                  timed(lambda: model.predict(image, verbose=False, conf=conf, device="cpu"), repeat)),
+    ]
+    # The later stages depend on the instance count, so they run on synthetic results
+    for count in instances:
+        result = synthetic_result(image, count, task)
+        inclusive = task == "segmentation"
+        detections = extract_detections(result, names_list, conf, inclusive=inclusive)
+        rows.append(stage_row("image", task, size, "postprocess", timed(
+            lambda: extract_detections(result, names_list, conf, inclusive=inclusive), repeat), count))
+        if task == "detection":
+            output = draw_boxes(image.copy(), detections, (43, 40, 185), 2, True, True)
+            rows.append(stage_row("image", task, size, "annotate", timed(
+                lambda: draw_boxes(image.copy(), detections, (43, 40, 185), 2, True, True), repeat), count))
+        else:
+            masks = result.masks.data[detections.index].cpu().numpy()
+            colors = np.random.default_rng(1).integers(0, 255, (len(detections), 3)).tolist()
+            output = blend_labels(image, label_map(masks, image.shape), colors, 0.5)
+            rows.append(stage_row("image", task, size, "composite", timed(
+                lambda: blend_labels(image, label_map(masks, image.shape), colors, 0.5), repeat), count))
+        rows.append(stage_row("image", task, size, "encode", timed(lambda: encode_image(output, "png"), repeat),
+                              count))
+    return rows
+
+
+def video_stages(task, size, frames, conf):
+    """Per-frame timings of each stage of the video path for one task and size."""
+    from postprocess import extract_detections
+    from video import color_to_bgr, draw_frame_detections, draw_frame_segmentation
+
+    width, height = parse_size(size)
+    model = local_model("video", task)
+    totals = dict.fromkeys(("decode", "inference", "postprocess", "annotate", "encode"), 0.0)
+    color = color_to_bgr("#B9282B")
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = synthetic_clip(os.path.join(tmp, "clip.mp4"), frames, width, height)
+        cap = cv2.VideoCapture(clip)
+        writer = cv2.VideoWriter(os.path.join(tmp, "out.mp4"), cv2.VideoWriter_fourcc(*"mp4v"), 30, (width, height))
+        model.predict(synthetic_frame(0, width, height), verbose=False, conf=conf, device="cpu")
+        count = 0
+        try:
+            while True:
+                start = time.perf_counter()
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                decoded = time.perf_counter()
+                result = model.predict(frame, verbose=False, conf=conf, device="cpu")[0]
+                inferred = time.perf_counter()
+                detections = extract_detections(result, names_list, conf, inclusive=task == "segmentation")
+                processed = time.perf_counter()
+                if task == "detection":
+                    frame = draw_frame_detections(frame, detections, True, True, color, 2)
+                else:
+                    frame = draw_frame_segmentation(frame, result, detections, True, color, 2)
+                annotated = time.perf_counter()
+                writer.write(frame)
+                written = time.perf_counter()
+                for stage, seconds in zip(totals, (decoded - start, inferred - decoded, processed - inferred,
+                                                   annotated - processed, written - annotated)):
+                    totals[stage] += seconds
+                count += 1
+        finally:
+            cap.release()
+            writer.release()
+    rows = [stage_row("video", task, size, stage, seconds / max(count, 1)) for stage, seconds in totals.items()]
+    rows.append(stage_row("video", task, size, "frame", sum(totals.values()) / max(count, 1)))
+    return rows
+
+
+def bench_stages(args):
+    """Time of each stage of the /api/detect image and video paths, per size and instance count."""
+    rows = []
+    for task in args.tasks:
+        for size in args.sizes:
+            rows.extend(image_stages(task, size, args.instances, args.repeat, args.conf))
+        if args.video_frames:
+            for size in args.video_sizes:
+                rows.extend(video_stages(task, size, args.video_frames, args.conf))
+    return {"benchmark": "stages", "repeat": args.repeat, "video_frames": args.video_frames, "stages": rows}
+
+
+def stage_key(row):
+    return tuple(row.get(name) for name in ("media", "task", "size", "instances", "stage"))
+
+
+def bench_compare(args):
+    """Stage timings of two stages result files side by side, flagging slowdowns above the tolerance."""
+    with open(args.baseline) as f:
+        baseline = {stage_key(row): row["ms"] for row in json.load(f)["stages"]}
+    with open(args.current) as f:
+        current = json.load(f)["stages"]
+    rows = []
+    for row in current:
+        before = baseline.get(stage_key(row))
+        if before is None:
+            continue
+        ratio = row["ms"] / before if before else None
+        rows.append({**{name: value for name, value in row.items() if name != "ms"}, "baseline_ms": before,
+                     "ms": row["ms"], "ratio": round(ratio, 3) if ratio is not None else None,
+                     "regression": ratio is not None and ratio > 1 + args.tolerance})
+    return {"benchmark": "compare", "baseline": args.baseline, "current": args.current,
+            "tolerance": args.tolerance, "regressions": sum(row["regression"] for row in rows), "stages": rows}
+
+
+def multipart_body(fields, files):
+    """(body, content type) of a multipart/form-data request."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content) in files.items():
+        media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f"Content-Type: {media_type}\r\n\r\n".encode() + content + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def process_memory_mb(pid):
+    """RSS and PSS of a process in MB; PSS counts pages shared copy-on-write once."""
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, value = line.split(":", 1)
+                if name in ("Rss", "Pss"):
+                    memory[name.lower() + "_mb"] = round(int(value.split()[0]) / 1024, 1)
+    except (OSError, ValueError):
+        pass
+    return memory
+
+
+def child_pids(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def wait_until_ready(url, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"server exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=5):
+                return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.5)
+    raise SystemExit(f"server did not start within {timeout} s")
+
+
+def load_test(url, body, content_type, concurrency, duration):
+    """Requests per second and latencies of concurrency clients posting body for duration seconds."""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        while time.monotonic() < deadline:
+            request = urllib.request.Request(url, data=body, headers={"Content-Type": content_type})
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=120) as response:
+                    ok = "error" not in json.loads(response.read())
+                    status = response.status if ok else "error"
+            except urllib.error.HTTPError as e:
+                ok, status = False, e.code
+            except (urllib.error.URLError, ConnectionError) as e:
+                ok, status = False, type(e).__name__
+            seconds = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(seconds)
+                else:
+                    errors.append(status)
+
+    start = time.perf_counter()
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "error_statuses": sorted({str(status) for status in errors}),
+        "requests_per_second": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p95_ms": round(float(np.percentile(ms, 95)), 1),
+    }
+
+
+def bench_server(args):
+    """Throughput, latency and memory of the multi-worker server (server.py) for each worker count."""
+    width, height = parse_size(args.size)
+    image = cv2.resize(synthetic_frame(7, width // 8, height // 8), (width, height), interpolation=cv2.INTER_CUBIC)
+    body, content_type = multipart_body(
+        {"task": args.task, "render": str(args.render).lower(), "threshold": args.conf},
+        {"file": ("image.jpg", cv2.imencode(".jpg", image)[1].tobytes())},
+    )
+    # Every request sends the same image, so the inference cache must not answer them
+    env = {**os.environ, "ARGUS_INFERENCE_CACHE_MB": "0", "ARGUS_INFERENCE_CACHE_DIR": ""}
+    server = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+    rows = []
+    for workers in args.workers:
+        command = [sys.executable, server, "--workers", str(workers), "--port", str(args.port),
+                   "--log-level", "warning"]
+        if args.pin_cpus:
+            command.append("--pin-cpus")
+        started = time.perf_counter()
+        process = subprocess.Popen(command, env=env)
+        try:
+            base = f"http://127.0.0.1:{args.port}"
+            wait_until_ready(f"{base}/api/models", process, args.startup_timeout)
+            startup = time.perf_counter() - started
+            concurrency = args.concurrency or 2 * workers
+            # Warm up every worker before measuring
+            load_test(f"{base}/api/detect", body, content_type, concurrency, min(args.duration, 5))
+            row = load_test(f"{base}/api/detect", body, content_type, concurrency, args.duration)
+            # The parent holds the weights the workers share, so it is counted too
+            memory = [process_memory_mb(pid) for pid in [process.pid] + child_pids(process.pid)]
+            rows.append({
+                "workers": workers,
+                "concurrency": concurrency,
+                "startup_seconds": round(startup, 1),
+                **row,
+                "rss_mb": round(sum(m.get("rss_mb", 0) for m in memory), 1),
+                "pss_mb": round(sum(m.get("pss_mb", 0) for m in memory), 1),
+            })
+        finally:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+    baseline = rows[0]["requests_per_second"] if rows else 0
+    for row in rows:
+        row["speedup"] = round(row["requests_per_second"] / baseline, 2) if baseline else None
+    return {"benchmark": "server", "task": args.task, "size": args.size, "render": args.render,
+            "duration": args.duration, "cpus": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity")
+            else os.cpu_count(), "results": rows}
+
+
+def bench_video_io(args):
+    """End-to-end video fps with decode and encode inline vs. in background threads."""
+    import shutil
+
+    import config
+    from video import process_video, video_properties
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = args.clip
+        if clip is None:
+            width, height = parse_size(args.size)
+            clip = synthetic_clip(os.path.join(tmp, "clip.mp4"), args.frames, width, height, fps=args.fps)
+        source = video_properties(clip)
+
+        def annotate(queue_size, encoder, output):
+            start = time.perf_counter()
+            written = process_video(clip, output, args.task, names_list, args.conf, True, True, "#B9282B", 2,
+                                    queue_size=queue_size, encoder=encoder)
+            return written, time.perf_counter() - start
+
+        # Loads and warms up the model outside of the timed runs
+        annotate(0, "opencv", os.path.join(tmp, "warmup.mp4"))
+        runs = []
+        baseline = None
+        for encoder in args.encoders:
+            if encoder == "ffmpeg" and shutil.which(config.VIDEO_FFMPEG) is None:
+                runs.append({"encoder": encoder, "skipped": f"{config.VIDEO_FFMPEG} not found"})
+                continue
+            for queue_size in args.queue_sizes:
+                output = os.path.join(tmp, f"out-{encoder}-{queue_size}.mp4")
+                best = None
+                for _ in range(args.repeat):
+                    written, elapsed = annotate(queue_size, encoder, output)
+                    best = elapsed if best is None else min(best, elapsed)
+                fps = written / best if best else None
+                if baseline is None:
+                    baseline = fps
+                runs.append({
+                    "encoder": encoder,
+                    "queue_size": queue_size,
+                    "frames": written,
+                    "seconds": round(best, 3),
+                    "fps": round(fps, 2) if fps else None,
+                    "speedup": round(fps / baseline, 2) if fps and baseline else None,
+                    "output_fps": video_properties(output)["fps"],
+                    "output_mb": round(os.path.getsize(output) / (1024 * 1024), 2),
+                })
+    return {"benchmark": "video-io", "task": args.task, "width": source["width"], "height": source["height"],
+            "source_fps": source["fps"], "cpus": os.cpu_count(), "runs": runs}
+
+
+def environment():
+    """Commit, platform and library versions, stored with written results."""
+    import torch
+    import ultralytics
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "ultralytics": ultralytics.__version__,
+        "opencv": cv2.__version__,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="also write the results, with environment details, to this JSON file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    video_memory = subparsers.add_parser("video-memory", help=bench_video_memory.__doc__)
+    video_memory.add_argument("--frames", type=int, nargs="+", default=[300, 1200])
+    video_memory.add_argument("--size", default="640x360")
+    video_memory.add_argument("--task", choices=["detection", "segmentation"], default="detection")
+    video_memory.set_defaults(func=bench_video_memory)
+
+    compositing = subparsers.add_parser("compositing", help=bench_compositing.__doc__)
+    compositing.add_argument("--instances", type=int, nargs="+", default=[1, 10, 50, 100])
+    compositing.add_argument("--size", default="1920x1080")
+    compositing.add_argument("--repeat", type=int, default=5)
+    compositing.add_argument("--skip-legacy", action="store_true")
+    compositing.set_defaults(func=bench_compositing)
+
+    video_stride = subparsers.add_parser("video-stride", help=bench_video_stride.__doc__)
+    video_stride.add_argument("--strides", type=int, nargs="+", default=[1, 2, 4, 8],
+                              help="the first stride is the baseline, normally 1")
+    video_stride.add_argument("--adaptive", action="store_true", help="also run each stride adaptively")
+    video_stride.add_argument("--motion-thresholds", type=float, nargs="+", default=[0],
+                              help="motion gating thresholds to try (0 disables gating)")
+    video_stride.add_argument("--tracker", choices=["bytetrack", "botsort"], default="bytetrack")
+    video_stride.add_argument("--clip", help="video file to use instead of a synthetic clip")
+    video_stride.add_argument("--frames", type=int, default=300)
+    video_stride.add_argument("--size", default="1280x720")
+    video_stride.add_argument("--task", choices=["detection", "segmentation"], default="detection")
+    video_stride.set_defaults(func=bench_video_stride)
+
+    backend_parity = subparsers.add_parser("backend-parity", help=bench_backend_parity.__doc__)
+    backend_parity.add_argument("--weights", default="yolov8n.pt")
+    backend_parity.add_argument("--task", choices=["detection", "segmentation"], default="detection")
+    backend_parity.add_argument("--backends", nargs="+", choices=["onnx", "openvino"], default=["onnx"])
+    backend_parity.add_argument("--images", help="directory of images to use instead of synthetic frames")
+    backend_parity.add_argument("--count", type=int, default=20)
+    backend_parity.add_argument("--size", default="640x480")
+    backend_parity.add_argument("--imgsz", type=int, default=640)
+    backend_parity.add_argument("--conf", type=float, default=0.25)
+    backend_parity.set_defaults(func=bench_backend_parity)
+
+    quantization = subparsers.add_parser("quantization", help=bench_quantization.__doc__)
+    quantization.add_argument("--weights", default="yolov8l.pt")
+    quantization.add_argument("--task", choices=["detection", "segmentation"], default="detection")
+    quantization.add_argument("--fp32-backend", choices=["torch", "onnx"], default="torch")
+    quantization.add_argument("--images", help="directory of evaluation images (synthetic frames without one)")
+    quantization.add_argument("--labels", help="directory of YOLO-format .txt labels for --images")
+    quantization.add_argument("--count", type=int, default=100)
+    quantization.add_argument("--size", default="640x480")
+    quantization.add_argument("--imgsz", type=int, default=640)
+    quantization.add_argument("--batch", type=int, default=8)
+    quantization.add_argument("--conf", type=float, default=0.25)
+    quantization.set_defaults(func=bench_quantization)
+
+    tiling = subparsers.add_parser("tiling", help=bench_tiling.__doc__)
+    tiling.add_argument("--tile-sizes", type=int, nargs="+", default=[640, 1280])
+    tiling.add_argument("--overlap", type=float, default=0.2)
+    tiling.add_argument("--batch", type=int, default=8)
+    tiling.add_argument("--no-full-pass", action="store_true", help="skip the whole-image pass of tiled runs")
+    tiling.add_argument("--images", help="directory of large images (synthetic frames without one)")
+    tiling.add_argument("--labels", help="directory of YOLO-format .txt labels for --images")
+    tiling.add_argument("--count", type=int, default=5)
+    tiling.add_argument("--size", default="7680x4320")
+    tiling.add_argument("--conf", type=float, default=0.25)
+    tiling.set_defaults(func=bench_tiling)
+
+    decode = subparsers.add_parser("decode", help=bench_decode.__doc__)
+    decode.add_argument("--sizes", nargs="+", default=["4032x3024", "6000x4000"],
+                        help="synthetic image sizes, encoded as JPEG and PNG")
+    decode.add_argument("--images", help="directory of images to use instead of synthetic ones")
+    decode.add_argument("--count", type=int, default=10)
+    decode.add_argument("--imgsz", type=int, nargs="+", default=[640, 1280])
+    decode.add_argument("--repeat", type=int, default=5)
+    decode.add_argument("--detect", action="store_true",
+                        help="also compare detections on full and reduced decodes")
+    decode.add_argument("--conf", type=float, default=0.25)
+    decode.set_defaults(func=bench_decode)
+
+    stages = subparsers.add_parser("stages", help=bench_stages.__doc__)
+    stages.add_argument("--tasks", nargs="+", choices=["detection", "segmentation"],
+                        default=["detection", "segmentation"])
+    stages.add_argument("--sizes", nargs="+", default=["640x480", "1920x1080", "3840x2160"])
+    stages.add_argument("--instances", type=int, nargs="+", default=[1, 10, 50])
+    stages.add_argument("--repeat", type=int, default=10)
+    stages.add_argument("--video-sizes", nargs="+", default=["640x360", "1280x720"])
+    stages.add_argument("--video-frames", type=int, default=60, help="frames per generated clip (0 skips video)")
+    stages.add_argument("--conf", type=float, default=0.25)
+    stages.set_defaults(func=bench_stages)
+
+    compare = subparsers.add_parser("compare", help=bench_compare.__doc__)
+    compare.add_argument("baseline", help="stages results written with --output")
+    compare.add_argument("current", help="stages results written with --output")
+    compare.add_argument("--tolerance", type=float, default=0.1, help="allowed slowdown before flagging, 0.1 = 10%%")
+    compare.set_defaults(func=bench_compare)
+
+    server = subparsers.add_parser("server", help=bench_server.__doc__)
+    server.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4],
+                        help="worker counts to compare; the first is the baseline")
+    server.add_argument("--concurrency", type=int, default=0, help="concurrent clients (0: twice the workers)")
+    server.add_argument("--duration", type=float, default=30, help="seconds of load per worker count")
+    server.add_argument("--task", choices=["detection", "segmentation"], default="detection")
+    server.add_argument("--size", default="1280x720")
+    server.add_argument("--render", action="store_true", help="also draw and encode the result image")
+    server.add_argument("--pin-cpus", action="store_true")
+    server.add_argument("--port", type=int, default=8765)
+    server.add_argument("--startup-timeout", type=float, default=300)
+    server.add_argument("--conf", type=float, default=0.25)
+    server.set_defaults(func=bench_server)
+
+    video_io = subparsers.add_parser("video-io", help=bench_video_io.__doc__)
+    video_io.add_argument("--queue-sizes", type=int, nargs="+", default=[0, 8],
+                          help="frames queued for decode and encode (0: inline); the first is the baseline")
+    video_io.add_argument("--encoders", nargs="+", choices=["opencv", "ffmpeg"], default=["opencv", "ffmpeg"])
+    video_io.add_argument("--clip", help="video to use instead of a synthetic clip")
+    video_io.add_argument("--frames", type=int, default=150)
+    video_io.add_argument("--size", default="1280x720")
+    video_io.add_argument("--fps", type=float, default=25, help="frame rate of the synthetic clip")
+    video_io.add_argument("--task", choices=["detection", "segmentation"], default="detection")
+    video_io.add_argument("--repeat", type=int, default=2, help="runs per setting; the fastest is reported")
+    video_io.add_argument("--conf", type=float, default=0.25)
+    video_io.set_defaults(func=bench_video_io)
+
+    args = parser.parse_args()
+    results = args.func(args)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({**results, "environment": environment()}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
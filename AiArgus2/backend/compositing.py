@@ -0,0 +1,94 @@
+"""Vectorized compositing of segmentation masks.
+
+All instance masks of a frame are merged into one label map at the model's
+mask resolution, which is then scaled to the frame in a single resize. Colors,
+outlines and label positions are derived from that map, so the cost per frame
+no longer grows with instances x pixels.
+"""
+import cv2
+import numpy as np
+
+
+def mask_region(mask_shape, image_shape):
+    """Part of a letterboxed mask that covers the original image (top, bottom, left, right)."""
+    h, w = mask_shape
+    height, width = image_shape
+    gain = min(h / height, w / width)
+    pad_w = (w - width * gain) / 2
+    pad_h = (h - height * gain) / 2
+    top, left = int(round(pad_h - 0.1)), int(round(pad_w - 0.1))
+    bottom, right = int(round(h - pad_h + 0.1)), int(round(w - pad_w + 0.1))
+    return top, bottom, left, right
+
+
+def label_map(masks, image_shape, threshold=0.5):
+    """Merge (N, h, w) instance masks into an (H, W) label map.
+
+    Pixel value 0 is background and i + 1 is instance i. Where instances
+    overlap, the later one wins, as when masks are painted one after another.
+    """
+    height, width = image_shape[:2]
+    if masks is None or len(masks) == 0:
+        return np.zeros((height, width), dtype=np.uint16)
+    binary = masks > threshold
+    count = binary.shape[0]
+    # Index of the last instance covering each pixel
+    last = count - 1 - np.argmax(binary[::-1], axis=0)
+    labels = np.where(binary.any(axis=0), last + 1, 0).astype(np.uint16)
+
+    top, bottom, left, right = mask_region(labels.shape, (height, width))
+    labels = labels[top:bottom, left:right]
+    if labels.shape != (height, width):
+        labels = cv2.resize(labels, (width, height), interpolation=cv2.INTER_NEAREST)
+    return labels
+
+
+def colorize(labels, colors):
+    """(H, W, 3) image with each instance in labels painted in its color."""
+    count = len(colors)
+    if count < 256:
+        # cv2.LUT is much faster than fancy indexing but needs 8-bit input
+        lut = np.zeros((256, 1, 3), dtype=np.uint8)
+        lut[1:count + 1, 0] = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)
+        small = labels.astype(np.uint8)
+        return cv2.LUT(cv2.merge([small, small, small]), lut)
+    lut = np.zeros((count + 1, 3), dtype=np.uint8)
+    lut[1:] = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)
+    return np.take(lut, labels, axis=0)
+
+
+def blend_labels(image, labels, colors, alpha, out=None):
+    """Blend per-instance colors into image in one pass.
+
+    colors is an (N, 3) array of BGR colors, one per instance in labels.
+    """
+    if out is None:
+        out = image.copy()
+    if len(colors) == 0:
+        return out
+    foreground = cv2.compare(labels, 0, cv2.CMP_GT)
+    blended = cv2.addWeighted(image, 1 - alpha, colorize(labels, colors), alpha, 0)
+    cv2.copyTo(blended, foreground, out)
+    return out
+
+
+def draw_outlines(image, labels, color, thickness=1):
+    """Draw the boundaries of all instances in labels onto image in place."""
+    edges = np.zeros(labels.shape, dtype=np.uint8)
+    edges[:, 1:] |= labels[:, 1:] != labels[:, :-1]
+    edges[1:, :] |= labels[1:, :] != labels[:-1, :]
+    if thickness > 1:
+        edges = cv2.dilate(edges, np.ones((thickness, thickness), dtype=np.uint8))
+    image[edges.astype(bool)] = color
+    return image
+
+
+def label_centroids(labels, count):
+    """(count, 2) array of instance centroids (x, y); NaN for empty instances."""
+    flat = labels.ravel()
+    ys, xs = np.indices(labels.shape)
+    areas = np.bincount(flat, minlength=count + 1)[1:count + 1].astype(np.float64)
+    sum_x = np.bincount(flat, weights=xs.ravel(), minlength=count + 1)[1:count + 1]
+    sum_y = np.bincount(flat, weights=ys.ravel(), minlength=count + 1)[1:count + 1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.stack([sum_x / areas, sum_y / areas], axis=1)
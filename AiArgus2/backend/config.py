@@ -0,0 +1,183 @@
+"""Runtime configuration for the backend, read from ARGUS_* environment variables."""
+import os
+
+
+def env_str(name, default):
+    return os.environ.get(name, default)
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_list(name, default):
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return list(default)
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+# Weights used for each (media type, task) combination
+MODEL_WEIGHTS = {
+    ("image", "detection"): env_str("ARGUS_IMAGE_DETECTION_WEIGHTS", "yolov8n.pt"),
+    ("image", "segmentation"): env_str("ARGUS_IMAGE_SEGMENTATION_WEIGHTS", "yolov8n-seg.pt"),
+    ("video", "detection"): env_str("ARGUS_VIDEO_DETECTION_WEIGHTS", "yolov8l.pt"),
+    ("video", "segmentation"): env_str("ARGUS_VIDEO_SEGMENTATION_WEIGHTS", "yolov8n-seg.pt"),
+}
+
+# Inference backend for each (media type, task): "torch", "onnx" or "openvino".
+# ARGUS_MODEL_BACKEND sets the default for all of them
+MODEL_BACKEND = env_str("ARGUS_MODEL_BACKEND", "torch")
+MODEL_BACKENDS = {
+    ("image", "detection"): env_str("ARGUS_IMAGE_DETECTION_BACKEND", MODEL_BACKEND),
+    ("image", "segmentation"): env_str("ARGUS_IMAGE_SEGMENTATION_BACKEND", MODEL_BACKEND),
+    ("video", "detection"): env_str("ARGUS_VIDEO_DETECTION_BACKEND", MODEL_BACKEND),
+    ("video", "segmentation"): env_str("ARGUS_VIDEO_SEGMENTATION_BACKEND", MODEL_BACKEND),
+}
+# Exported ONNX/OpenVINO models are cached here, keyed by weights hash and input size
+EXPORT_DIR = env_str("ARGUS_EXPORT_DIR", "exports")
+EXPORT_IMAGE_SIZE = env_int("ARGUS_EXPORT_IMAGE_SIZE", 640)
+# "fp32" runs the configured backends; "int8" switches every model to its INT8
+# quantized ONNX variant. Requests can override it with precision=
+MODEL_PRECISION = env_str("ARGUS_MODEL_PRECISION", "fp32")
+# Local images used to calibrate INT8 quantization
+QUANT_CALIBRATION_DIR = env_str("ARGUS_QUANT_CALIBRATION_DIR", "calibration")
+QUANT_CALIBRATION_IMAGES = env_int("ARGUS_QUANT_CALIBRATION_IMAGES", 100)
+
+# Model registry
+PRELOAD_MODELS = env_bool("ARGUS_PRELOAD_MODELS", True)
+WARMUP_MODELS = env_bool("ARGUS_WARMUP_MODELS", True)
+WARMUP_IMAGE_SIZE = env_int("ARGUS_WARMUP_IMAGE_SIZE", 640)
+# 0 disables the budget (models are never evicted)
+MODEL_MEMORY_BUDGET_MB = env_float("ARGUS_MODEL_MEMORY_BUDGET_MB", 0)
+
+# Worker pools for blocking decode/inference/encode work
+WORKER_KIND = env_str("ARGUS_WORKER_KIND", "thread")  # "thread" or "process"
+IMAGE_WORKERS = env_int("ARGUS_IMAGE_WORKERS", max(1, (os.cpu_count() or 2) // 2))
+IMAGE_MAX_IN_FLIGHT = env_int("ARGUS_IMAGE_MAX_IN_FLIGHT", 16)
+VIDEO_WORKERS = env_int("ARGUS_VIDEO_WORKERS", 1)
+VIDEO_MAX_IN_FLIGHT = env_int("ARGUS_VIDEO_MAX_IN_FLIGHT", 2)
+RETRY_AFTER_SECONDS = env_int("ARGUS_RETRY_AFTER_SECONDS", 5)
+
+# Micro-batching of concurrent image requests
+BATCH_MAX_SIZE = env_int("ARGUS_BATCH_MAX_SIZE", 8)
+BATCH_MAX_WAIT_MS = env_float("ARGUS_BATCH_MAX_WAIT_MS", 5)
+# Images of one /api/detect/batch request being decoded, predicted or waiting
+# to be sent at once; bounds its memory whatever the number of images
+BATCH_REQUEST_WINDOW = env_int("ARGUS_BATCH_REQUEST_WINDOW", 32)
+
+# Image inference size, overridable per request with imgsz
+IMAGE_SIZE = env_int("ARGUS_IMAGE_SIZE", 640)
+# Decode images that are not drawn on at 1/2, 1/4 or 1/8 resolution when that
+# still covers the inference size
+DECODE_REDUCED = env_bool("ARGUS_DECODE_REDUCED", True)
+
+# Tiled inference for large images: images whose longer side exceeds
+# TILE_SIZE are predicted in overlapping TILE_SIZE tiles (0 disables it unless
+# a request asks for it)
+TILE_SIZE = env_int("ARGUS_TILE_SIZE", 0)
+TILE_OVERLAP = env_float("ARGUS_TILE_OVERLAP", 0.2)
+# Also run the whole (downscaled) image to catch objects larger than a tile
+TILE_FULL_PASS = env_bool("ARGUS_TILE_FULL_PASS", True)
+# Boxes of a class overlapping by more than this share of the smaller one are merged
+TILE_MERGE_THRESHOLD = env_float("ARGUS_TILE_MERGE_THRESHOLD", 0.6)
+
+# Response encoding
+JPEG_QUALITY = env_int("ARGUS_JPEG_QUALITY", 85)
+WEBP_QUALITY = env_int("ARGUS_WEBP_QUALITY", 80)
+PNG_COMPRESSION = env_int("ARGUS_PNG_COMPRESSION", 1)
+MAX_METADATA_HEADER_BYTES = env_int("ARGUS_MAX_METADATA_HEADER_BYTES", 8192)
+
+# Uploads
+MAX_IMAGE_UPLOAD_MB = env_float("ARGUS_MAX_IMAGE_UPLOAD_MB", 50)
+MAX_VIDEO_UPLOAD_MB = env_float("ARGUS_MAX_VIDEO_UPLOAD_MB", 1024)
+# Whole /api/detect/batch upload (all files, or the archive)
+MAX_BATCH_UPLOAD_MB = env_float("ARGUS_MAX_BATCH_UPLOAD_MB", 4096)
+UPLOAD_CHUNK_SIZE = env_int("ARGUS_UPLOAD_CHUNK_SIZE", 1024 * 1024)
+# Directory for per-request working files; None uses the system temp dir
+TEMP_DIR = env_str("ARGUS_TEMP_DIR", None)
+
+# Keyframe video inference: the detector runs every VIDEO_STRIDE frames and a
+# tracker fills in the frames in between (1 runs it on every frame)
+VIDEO_STRIDE = env_int("ARGUS_VIDEO_STRIDE", 1)
+VIDEO_ADAPTIVE_STRIDE = env_bool("ARGUS_VIDEO_ADAPTIVE_STRIDE", False)
+VIDEO_MAX_STRIDE = env_int("ARGUS_VIDEO_MAX_STRIDE", 8)
+VIDEO_TRACKER = env_str("ARGUS_VIDEO_TRACKER", "bytetrack")  # "bytetrack" or "botsort"
+
+# Motion gating: video frames whose downscaled grayscale difference to the last
+# inferred frame changes less than this share of pixels reuse its detections
+# (0 disables gating)
+VIDEO_MOTION_THRESHOLD = env_float("ARGUS_VIDEO_MOTION_THRESHOLD", 0)
+VIDEO_MOTION_WIDTH = env_int("ARGUS_VIDEO_MOTION_WIDTH", 96)
+VIDEO_MOTION_PIXEL_DELTA = env_int("ARGUS_VIDEO_MOTION_PIXEL_DELTA", 12)
+VIDEO_MOTION_MAX_SKIP = env_int("ARGUS_VIDEO_MOTION_MAX_SKIP", 30)
+
+# Video I/O: frames decoded ahead of inference and waiting to be encoded, per
+# video (0 decodes and encodes inline on the inference thread), and the
+# encoder of annotated videos: "opencv" (mp4v) or "ffmpeg" (H.264, piped to
+# the VIDEO_FFMPEG executable; falls back to OpenCV when it is not found)
+VIDEO_QUEUE_SIZE = env_int("ARGUS_VIDEO_QUEUE_SIZE", 8)
+VIDEO_ENCODER = env_str("ARGUS_VIDEO_ENCODER", "opencv")
+VIDEO_FFMPEG = env_str("ARGUS_VIDEO_FFMPEG", "ffmpeg")
+VIDEO_FFMPEG_CODEC = env_str("ARGUS_VIDEO_FFMPEG_CODEC", "libx264")
+VIDEO_FFMPEG_PRESET = env_str("ARGUS_VIDEO_FFMPEG_PRESET", "veryfast")
+VIDEO_FFMPEG_CRF = env_int("ARGUS_VIDEO_FFMPEG_CRF", 23)
+
+# Live WebSocket detection (/api/live): connections served at once
+LIVE_MAX_CONNECTIONS = env_int("ARGUS_LIVE_MAX_CONNECTIONS", 8)
+
+# Logging: level of the backend's loggers (per-request details are DEBUG) and
+# "text" or "json" output
+LOG_LEVEL = env_str("ARGUS_LOG_LEVEL", "INFO")
+LOG_FORMAT = env_str("ARGUS_LOG_FORMAT", "text")
+
+# Per-request profiling (profile=true on /api/detect) is only allowed for
+# callers that send ARGUS_PROFILE_TOKEN in X-Profile-Token or connect from an
+# address in ARGUS_PROFILE_CLIENTS; with neither set it is disabled
+PROFILE_TOKEN = env_str("ARGUS_PROFILE_TOKEN", None)
+PROFILE_CLIENTS = env_list("ARGUS_PROFILE_CLIENTS", [])
+PROFILE_DIR = env_str("ARGUS_PROFILE_DIR", "profiles")
+
+# Multi-worker server (server.py): number of forked workers, torch intra-op
+# threads per worker (0 splits the CPU cores evenly between the workers),
+# inter-op threads per worker, and whether each worker is pinned to its cores
+SERVER_WORKERS = env_int("ARGUS_SERVER_WORKERS", 1)
+SERVER_THREADS = env_int("ARGUS_SERVER_THREADS", 0)
+SERVER_INTEROP_THREADS = env_int("ARGUS_SERVER_INTEROP_THREADS", 1)
+SERVER_PIN_CPUS = env_bool("ARGUS_SERVER_PIN_CPUS", False)
+
+# Background video jobs
+JOBS_DIR = env_str("ARGUS_JOBS_DIR", "jobs")
+JOBS_DB = env_str("ARGUS_JOBS_DB", os.path.join(JOBS_DIR, "jobs.sqlite3"))
+JOB_CONCURRENCY = env_int("ARGUS_JOB_CONCURRENCY", 1)
+
+# Watch-folder ingestion (ingest.py): files processed at once, and with
+# --watch how often the folder is scanned and how long a file must have been
+# left unchanged before it is picked up
+INGEST_WORKERS = env_int("ARGUS_INGEST_WORKERS", 2)
+INGEST_POLL_SECONDS = env_float("ARGUS_INGEST_POLL_SECONDS", 10)
+INGEST_SETTLE_SECONDS = env_float("ARGUS_INGEST_SETTLE_SECONDS", 30)
+
+# Cache of raw image inference results, keyed by upload content and model
+# 0 MB (and no directory) disables it. Off by default: cached requests run the
+# model for all classes at the floor below, without the request's filters
+INFERENCE_CACHE_MB = env_float("ARGUS_INFERENCE_CACHE_MB", 0)
+# Optional second tier on disk; None keeps the cache in memory only
+INFERENCE_CACHE_DIR = env_str("ARGUS_INFERENCE_CACHE_DIR", None)
+INFERENCE_CACHE_DISK_MB = env_float("ARGUS_INFERENCE_CACHE_DISK_MB", 2048)
+# Cached results are predicted at this confidence so any higher threshold can
+# be served from them
+INFERENCE_CACHE_MIN_CONFIDENCE = env_float("ARGUS_INFERENCE_CACHE_MIN_CONFIDENCE", 0.05)
@@ -0,0 +1,102 @@
+"""Resolution-aware image decoding.
+
+The model letterboxes every image down to the inference size, so decoding a
+24-megapixel photo at full resolution only to shrink it right away wastes time
+and memory. When the full-size pixels are not needed (nothing is drawn on the
+image), uploads are decoded with OpenCV's IMREAD_REDUCED_COLOR_2/4/8 flags at
+the largest factor that still leaves the longer side at or above the inference
+size, so detections lose nothing. For JPEG the reduction happens inside the
+decoder (DCT scaling) and the full-size image is never built. Other formats
+gain nothing from those flags (OpenCV decodes them fully and then resizes,
+more slowly than a plain decode), so they are decoded normally and shrunk right
+away with a fast area resize, which the letterbox would otherwise do later.
+
+Results predicted on a reduced image are mapped back to the original image
+coordinates with rescale_result().
+"""
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+from ultralytics.engine.results import Results
+
+from classes import names
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+REDUCED_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+# EXIF orientations that swap width and height (OpenCV applies them on decode)
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def image_header(content):
+    """(width, height, format) of an encoded image as displayed, read from its header only; None if unknown."""
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            width, height = image.size
+            if image.getexif().get(0x0112) in TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+            return width, height, image.format
+    except Exception:
+        return None
+
+
+def reduction_factor(width, height, target):
+    """Largest decode reduction (1, 2, 4 or 8) that keeps the longer side at least target."""
+    for factor in (8, 4, 2):
+        if max(width, height) // factor >= target:
+            return factor
+    return 1
+
+
+def decode_image(content, target=None):
+    """(image, (height, width)) of an upload, or (None, None) if it cannot be decoded.
+
+    With a target inference size, the image may be decoded at reduced
+    resolution; the returned shape is always that of the full image.
+    """
+    header = image_header(content) if target else None
+    factor = reduction_factor(*header[:2], target) if header else 1
+    if factor > 1 and header[2] == "JPEG":
+        image = cv2.imdecode(np.frombuffer(content, np.uint8), REDUCED_FLAGS[factor])
+        if image is None:
+            return None, None
+        width, height = header[:2]
+        if (image.shape[1] > image.shape[0]) != (width > height):
+            # The decoder and the header disagree on the orientation
+            width, height = height, width
+        shape = (height, width)
+    else:
+        image = cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return None, None
+        shape = image.shape[:2]
+        if factor > 1:
+            size = (-(-shape[1] // factor), -(-shape[0] // factor))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    if factor > 1:
+        logger.debug("Decoded image at reduced resolution",
+                     extra={"width": shape[1], "height": shape[0], "factor": factor})
+    return image, shape
+
+
+def placeholder(shape):
+    """Zero-stride stand-in for an image of shape (height, width) that is never drawn on."""
+    return np.broadcast_to(np.zeros(3, dtype=np.uint8), (*shape, 3))
+
+
+def rescale_result(result, shape):
+    """Results of a reduced image as Results of the full image of shape (height, width)."""
+    height, width = result.orig_shape
+    boxes = result.boxes.data.clone()
+    boxes[:, [0, 2]] *= shape[1] / width
+    boxes[:, [1, 3]] *= shape[0] / height
+    # Masks stay at the model resolution; Results scales their outlines to shape
+    masks = result.masks.data if result.masks is not None else None
+    return Results(placeholder(shape), path="", names=names, boxes=boxes, masks=masks)
@@ -0,0 +1,141 @@
+"""Encoding of annotated media and the HTTP responses that carry it.
+
+/api/detect can answer in three formats:
+
+- ``json``: the legacy ``{"image": <hex>}`` / ``{"video": <hex>}`` body
+- ``binary``: the media itself as the response body, with detection
+  metadata in ``X-Detections`` headers
+- ``multipart``: a ``multipart/mixed`` body with a JSON metadata part
+  followed by the media part
+
+With ``render=false`` nothing is drawn or encoded and only detections are
+returned: columnar JSON or an ``.npz`` archive for images, NDJSON (one line
+per frame) for videos.
+"""
+import io
+import json
+import uuid
+
+import cv2
+import numpy as np
+from fastapi.responses import Response, StreamingResponse
+
+import config
+
+IMAGE_FORMATS = {
+    "png": ("png", "image/png"),
+    "jpeg": ("jpg", "image/jpeg"),
+    "jpg": ("jpg", "image/jpeg"),
+    "webp": ("webp", "image/webp"),
+}
+VIDEO_MEDIA_TYPE = "video/mp4"
+RESPONSE_FORMATS = ("json", "binary", "multipart")
+DETECTIONS_FORMATS = ("json", "npz")
+NPZ_MEDIA_TYPE = "application/x-npz"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CHUNK_SIZE = 1024 * 1024
+
+
+class EncodingError(ValueError):
+    pass
+
+
+def image_format_name(image_format):
+    image_format = (image_format or "png").lower()
+    if image_format not in IMAGE_FORMATS:
+        raise EncodingError(f"Unsupported image format: {image_format}")
+    return "jpeg" if image_format == "jpg" else image_format
+
+
+def encode_image(image, image_format="png", quality=None):
+    """Encode a BGR image, returning (bytes, media type)."""
+    image_format = image_format_name(image_format)
+    extension, media_type = IMAGE_FORMATS[image_format]
+    params = []
+    if image_format == "jpeg":
+        params = [cv2.IMWRITE_JPEG_QUALITY, int(quality or config.JPEG_QUALITY)]
+    elif image_format == "webp":
+        params = [cv2.IMWRITE_WEBP_QUALITY, int(quality or config.WEBP_QUALITY)]
+    elif image_format == "png":
+        params = [cv2.IMWRITE_PNG_COMPRESSION, config.PNG_COMPRESSION]
+    ok, buffer = cv2.imencode("." + extension, image, params)
+    if not ok:
+        raise EncodingError(f"Failed to encode image as {image_format}")
+    return buffer.tobytes(), media_type
+
+
+def metadata_headers(metadata):
+    """Detection metadata as response headers.
+
+    The full JSON is only sent when it fits the header size limit; larger
+    payloads should be requested with the multipart format.
+    """
+    detections = metadata.get("detections", [])
+    headers = {
+        "X-Detection-Count": str(len(detections)),
+        "X-Message": metadata.get("message", ""),
+    }
+    payload = json.dumps(metadata, separators=(",", ":"))
+    if len(payload) <= config.MAX_METADATA_HEADER_BYTES:
+        headers["X-Detections"] = payload
+    else:
+        headers["X-Detections-Truncated"] = "1"
+    return headers
+
+
+def multipart_chunks(metadata, media_type, chunks, boundary):
+    yield (
+        f"--{boundary}\r\nContent-Type: application/json\r\n\r\n".encode()
+        + json.dumps(metadata, separators=(",", ":")).encode()
+        + f"\r\n--{boundary}\r\nContent-Type: {media_type}\r\n\r\n".encode()
+    )
+    for chunk in chunks:
+        yield chunk
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+
+def file_chunks(path):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def media_response(data, media_type, metadata, response_format):
+    """Response for encoded media held in memory."""
+    if response_format == "multipart":
+        boundary = uuid.uuid4().hex
+        return StreamingResponse(
+            multipart_chunks(metadata, media_type, [data], boundary),
+            media_type=f"multipart/mixed; boundary={boundary}",
+        )
+    return Response(content=data, media_type=media_type, headers=metadata_headers(metadata))
+
+
+def file_response(path, media_type, metadata, response_format, background=None):
+    """Response that streams an encoded media file from disk in chunks.
+
+    background runs once the body has been sent, e.g. to delete the file.
+    """
+    if response_format == "multipart":
+        boundary = uuid.uuid4().hex
+        return StreamingResponse(
+            multipart_chunks(metadata, media_type, file_chunks(path), boundary),
+            media_type=f"multipart/mixed; boundary={boundary}",
+            background=background,
+        )
+    return StreamingResponse(file_chunks(path), media_type=media_type, headers=metadata_headers(metadata),
+                             background=background)
+
+
+def npz_bytes(arrays, **scalars):
+    """Serialize arrays (and scalar metadata) as an uncompressed .npz archive."""
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays, **{name: np.asarray(value) for name, value in scalars.items()})
+    return buffer.getvalue()
+
+
+def ndjson_line(item):
+    return (json.dumps(item, separators=(",", ":")) + "\n").encode()
@@ -0,0 +1,46 @@
+"""Cheap change detection used to skip inference on static video frames.
+
+Each frame is reduced to a small grayscale thumbnail and compared with the
+thumbnail of the last frame the model actually ran on. When the share of
+thumbnail pixels that changed noticeably stays below the threshold, the frame
+is considered static and reuses the previous detections. Comparing against the
+last inferred frame (rather than the previous frame) keeps slow drift from
+accumulating unnoticed.
+"""
+import cv2
+
+
+class MotionGate:
+    def __init__(self, threshold, width=96, pixel_delta=12, max_skip=30):
+        self.threshold = threshold
+        self.width = width
+        self.pixel_delta = pixel_delta
+        # Run the model at least this often, whatever the gate says
+        self.max_skip = max_skip
+        self.skipped = 0
+        self._reference = None
+
+    def _thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        size = (self.width, max(1, round(height * self.width / width)))
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+    def change(self, frame):
+        """Share of thumbnail pixels that differ from the reference frame (1.0 without one)."""
+        if self._reference is None:
+            return 1.0
+        diff = cv2.absdiff(self._thumbnail(frame), self._reference)
+        return cv2.countNonZero(cv2.compare(diff, self.pixel_delta, cv2.CMP_GT)) / diff.size
+
+    def static(self, frame):
+        """True if frame can reuse the detections of the reference frame."""
+        if self.skipped >= self.max_skip or self.change(frame) > self.threshold:
+            return False
+        self.skipped += 1
+        return True
+
+    def reset(self, frame):
+        """Make frame, which the model has just run on, the new reference."""
+        self._reference = self._thumbnail(frame)
+        self.skipped = 0
@@ -0,0 +1,196 @@
+"""Content-addressed cache of raw inference results.
+
+Entries are keyed by a hash of the uploaded bytes, the model weights and the
+parameters that change what the model returns. They hold the unfiltered boxes
+(and masks) predicted at a low confidence floor, so requests that only change
+the styling, the threshold or the selected classes are answered by redrawing,
+without running the model again.
+
+Entries live in a size-bounded in-memory LRU and, when config.INFERENCE_CACHE_DIR
+is set, in a second size-bounded tier of .npz files on disk.
+"""
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+import config
+from classes import names
+from model_registry import model_spec
+
+
+def cache_key(content, media_type, task, **options):
+    """Key for the Results of one upload with the given predict() options."""
+    digest = hashlib.blake2b(content, digest_size=16)
+    digest.update(repr((model_spec(media_type, task, options.get("precision")), sorted(options.items()))).encode())
+    return digest.hexdigest()
+
+
+def cached_confidence(threshold):
+    """Confidence the model runs at so the entry can serve any higher threshold."""
+    return min(threshold, config.INFERENCE_CACHE_MIN_CONFIDENCE)
+
+
+def to_entry(result):
+    """Raw arrays of a Results object: boxes (N, 6) and boolean masks (N, h, w) or None."""
+    entry = {"boxes": result.boxes.data.cpu().numpy().astype(np.float32)}
+    if result.masks is not None:
+        entry["masks"] = result.masks.data.cpu().numpy() > 0.5
+    return entry
+
+
+def to_result(entry, image):
+    """Rebuild a Results object for image from a cache entry."""
+    masks = entry.get("masks")
+    return Results(
+        image,
+        path="",
+        names=names,
+        boxes=torch.from_numpy(entry["boxes"]),
+        masks=torch.from_numpy(masks.astype(np.float32)) if masks is not None else None,
+    )
+
+
+# Rough bookkeeping cost of an entry besides its arrays, so that many empty
+# results still count against the budget
+ENTRY_OVERHEAD = 512
+
+
+def entry_size(entry):
+    return ENTRY_OVERHEAD + sum(array.nbytes for array in entry.values())
+
+
+class InferenceCache:
+    def __init__(self, max_bytes, disk_dir=None, disk_max_bytes=0):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 or bool(self.disk_dir)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._put_memory(key, entry)
+        return entry
+
+    def lookup(self, content, media_type, task, **options):
+        """(key, entry) for an upload; entry is None on a miss."""
+        key = cache_key(content, media_type, task, **options)
+        return key, self.get(key)
+
+    def put(self, key, entry):
+        self._put_memory(key, entry)
+        self._write_disk(key, entry)
+
+    def _put_memory(self, key, entry):
+        size = entry_size(entry)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= entry_size(self._entries.pop(key))
+            self._entries[key] = entry
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= entry_size(evicted)
+                self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key + ".npz")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                entry = {name: data[name] for name in data.files}
+            # The modification time doubles as the last use for eviction
+            os.utime(path)
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, entry):
+        if not self.disk_dir:
+            return
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **entry)
+        # Write to a temporary name first so readers never see partial files
+        temp_path = self._path(key) + f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(buffer.getbuffer())
+        os.replace(temp_path, self._path(key))
+        self._trim_disk()
+
+    def _trim_disk(self):
+        if self.disk_max_bytes <= 0:
+            return
+        files = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith(".npz"):
+                try:
+                    stat = os.stat(os.path.join(self.disk_dir, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.disk_dir, name))
+            except OSError:
+                pass
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "disk_dir": self.disk_dir,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else None,
+            }
+
+
+inference_cache = InferenceCache(
+    int(config.INFERENCE_CACHE_MB * 1024 * 1024),
+    disk_dir=config.INFERENCE_CACHE_DIR,
+    disk_max_bytes=int(config.INFERENCE_CACHE_DISK_MB * 1024 * 1024),
+)
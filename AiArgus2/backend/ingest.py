@@ -0,0 +1,324 @@
+"""Batch ingestion of images and videos that are already on a local or mounted disk.
+
+    python ingest.py /data/footage --output /data/argus
+    python ingest.py /data/incoming --output /data/argus --watch --workers 4
+
+Files are read in place, without an upload copy, and processed by a pool of
+worker threads with the same models and options as the API. For every input
+file an annotated copy and its detections are written under the output
+directory (mirroring the input tree), and a line is appended to
+manifest.jsonl there. Progress is checkpointed in ingest.sqlite3 next to the
+manifest: files that are done and unchanged since are skipped, so a run that
+was interrupted resumes where it stopped. With --watch the directory is
+scanned again every ARGUS_INGEST_POLL_SECONDS for new or changed files.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from classes import names_list
+from decoding import decode_image, rescale_result
+from encoding import IMAGE_FORMATS, encode_image, image_format_name, ndjson_line
+from logs import get_logger
+from model_registry import predict
+from postprocess import detection_columns, mask_polygons, predict_options
+from rendering import detections_payload, render_image
+from uploads import IMAGE_SUFFIXES
+from video import iter_video_detections, process_video, video_options, video_properties
+
+logger = get_logger("ingest")
+
+VIDEO_SUFFIXES = {".mp4", ".avi", ".mov", ".mkv", ".m4v", ".webm", ".mpg", ".mpeg"}
+MANIFEST = "manifest.jsonl"
+CHECKPOINT = "ingest.sqlite3"
+# Annotation style, as the API's defaults
+DRAWING = {"show_labels": True, "show_confidence": True, "color": "#B9282B", "thickness": 2}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    started_at REAL,
+    finished_at REAL
+)
+"""
+
+
+def media_kind(path):
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix in IMAGE_SUFFIXES:
+        return "image"
+    if suffix in VIDEO_SUFFIXES:
+        return "video"
+    return None
+
+
+def scan(input_dir, skip_dir=None, settle=0):
+    """(path, relative path, size, mtime) of the images and videos under input_dir, in a stable order.
+
+    Hidden files and directories and skip_dir (the output directory) are
+    left out, and so are files modified less than settle seconds ago, which
+    may still be being written.
+    """
+    now = time.time()
+    for root, dirs, files in os.walk(input_dir):
+        dirs[:] = sorted(name for name in dirs if not name.startswith(".")
+                         and os.path.join(root, name) != skip_dir)
+        for name in sorted(files):
+            if name.startswith(".") or media_kind(name) is None:
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if now - stat.st_mtime < settle:
+                continue
+            yield path, os.path.relpath(path, input_dir), stat.st_size, stat.st_mtime
+
+
+class Checkpoint:
+    """Status of every input file, keyed by its path relative to the input directory."""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(SCHEMA)
+
+    def get(self, path):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM files WHERE path = ?", (path,)).fetchone()
+        return dict(row) if row else None
+
+    def pending(self, path, size, mtime, retry_failed=False):
+        """True if the file still has to be processed."""
+        row = self.get(path)
+        if row is None or row["size"] != size or row["mtime"] != mtime:
+            return True
+        if row["status"] == "failed":
+            return retry_failed
+        # "running" was interrupted by a previous run
+        return row["status"] != "done"
+
+    def mark(self, path, size, mtime, status, error=None):
+        now = time.time()
+        with self._lock, self._conn:
+            if status == "running":
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO files (path, size, mtime, status, started_at) VALUES (?, ?, ?, ?, ?)",
+                    (path, size, mtime, status, now),
+                )
+            else:
+                self._conn.execute("UPDATE files SET status = ?, error = ?, finished_at = ? WHERE path = ?",
+                                   (status, error, now, path))
+
+
+def replace_when_done(path):
+    """Temporary name to write path under, so that partial outputs never carry the final name."""
+    root, extension = os.path.splitext(path)
+    return f"{root}.partial{extension}"
+
+
+class Ingestor:
+    def __init__(self, input_dir, output_dir, task="detection", selected_classes=None, threshold=0.25,
+                 render=True, include_masks=False, image_format="jpeg", options=None, retry_failed=False):
+        self.input_dir = os.path.abspath(input_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        self.task = task
+        self.selected_classes = names_list if selected_classes is None else selected_classes
+        self.threshold = threshold
+        self.render = render
+        self.include_masks = include_masks
+        self.image_format = image_format_name(image_format)
+        self.options = options or {}
+        self.retry_failed = retry_failed
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.checkpoint = Checkpoint(os.path.join(self.output_dir, CHECKPOINT))
+        self.counts = {"done": 0, "failed": 0, "skipped": 0}
+        self._lock = threading.Lock()
+        self._queued = set()
+
+    def output_paths(self, relative, kind):
+        """(annotated, detections) output paths of an input file; annotated is None without rendering."""
+        base = os.path.join(self.output_dir, relative)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        if kind == "image":
+            extension = IMAGE_FORMATS[self.image_format][0]
+            return (f"{base}.annotated.{extension}" if self.render else None), base + ".detections.json"
+        return (base + ".annotated.mp4" if self.render else None), base + ".detections.ndjson"
+
+    def process_image(self, path, annotated, detections):
+        with open(path, "rb") as f:
+            content = f.read()
+        # Without drawing, large images can be decoded at reduced resolution
+        reduce = config.DECODE_REDUCED and not self.render
+        image, shape = decode_image(content, config.IMAGE_SIZE if reduce else None)
+        if image is None:
+            raise ValueError("Could not decode image")
+        options = dict(predict_options(self.selected_classes, self.threshold), imgsz=config.IMAGE_SIZE,
+                       precision=self.options.get("precision"))
+        result = predict("image", self.task, [image], verbose=False, **options)[0]
+        if image.shape[:2] != shape:
+            result = rescale_result(result, shape)
+        payload = detections_payload(shape, result, self.task, self.selected_classes, self.threshold,
+                                     self.include_masks)
+        temp_path = replace_when_done(detections)
+        with open(temp_path, "w") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(temp_path, detections)
+
+        if annotated is not None:
+            if self.task == "segmentation" and result.masks is None:
+                # Nothing to draw
+                image_bytes, _ = encode_image(image, self.image_format)
+            else:
+                image_bytes, _, _ = render_image(image, result, self.task, self.selected_classes, self.threshold,
+                                                 image_format=self.image_format, response_format="binary",
+                                                 **DRAWING)
+            temp_path = replace_when_done(annotated)
+            with open(temp_path, "wb") as f:
+                f.write(image_bytes)
+            os.replace(temp_path, annotated)
+        return {"width": shape[1], "height": shape[0], "objects": payload["detections"]["count"]}
+
+    def process_video(self, path, annotated, detections):
+        temp_detections = replace_when_done(detections)
+        with open(temp_detections, "wb") as f:
+            if annotated is None:
+                # Same lines as /api/detect with render=false: properties, frames, stats
+                for item in iter_video_detections(path, self.task, self.selected_classes, self.threshold,
+                                                  self.include_masks, **self.options):
+                    f.write(ndjson_line(item))
+                stats = item["stats"]
+            else:
+                f.write(ndjson_line(video_properties(path)))
+                frame = [0]
+
+                def write_frame(result, frame_detections):
+                    polygons = mask_polygons(result, frame_detections) if self.include_masks else None
+                    f.write(ndjson_line(dict(frame=frame[0], **detection_columns(frame_detections, polygons))))
+                    frame[0] += 1
+
+                stats = {}
+                temp_annotated = replace_when_done(annotated)
+                process_video(path, temp_annotated, self.task, self.selected_classes, self.threshold,
+                              stats=stats, on_frame=write_frame, **DRAWING, **self.options)
+                f.write(ndjson_line({"stats": stats}))
+                os.replace(temp_annotated, annotated)
+        os.replace(temp_detections, detections)
+        return {"frames": stats["frames"], "stats": stats}
+
+    def process(self, path, relative, size, mtime):
+        kind = media_kind(path)
+        annotated, detections = self.output_paths(relative, kind)
+        self.checkpoint.mark(relative, size, mtime, "running")
+        start = time.perf_counter()
+        try:
+            if kind == "image":
+                details = self.process_image(path, annotated, detections)
+            else:
+                details = self.process_video(path, annotated, detections)
+            status, error = "done", None
+        except Exception as e:
+            logger.exception("Failed to process file", extra={"path": relative})
+            details, status, error = {}, "failed", str(e)
+        seconds = time.perf_counter() - start
+        self.checkpoint.mark(relative, size, mtime, status, error)
+
+        entry = {"source": relative, "kind": kind, "status": status, "size": size, "task": self.task,
+                 "seconds": round(seconds, 3), **details}
+        if status == "done":
+            entry["detections"] = os.path.relpath(detections, self.output_dir)
+            if annotated is not None:
+                entry["annotated"] = os.path.relpath(annotated, self.output_dir)
+        else:
+            entry["error"] = error
+        with self._lock:
+            with open(os.path.join(self.output_dir, MANIFEST), "a") as f:
+                f.write(json.dumps(entry) + "\n")
+            self.counts[status] += 1
+            self._queued.discard(path)
+        logger.info("Processed file", extra={"path": relative, "status": status, "seconds": round(seconds, 3)})
+
+    def run(self, workers=1, watch=False, poll_seconds=10, settle_seconds=30):
+        """Process the input directory once, or keep watching it for new or changed files."""
+        executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="argus-ingest")
+        try:
+            while True:
+                for path, relative, size, mtime in scan(self.input_dir, self.output_dir,
+                                                        settle_seconds if watch else 0):
+                    with self._lock:
+                        if path in self._queued:
+                            continue
+                    pending = self.checkpoint.pending(relative, size, mtime, self.retry_failed)
+                    with self._lock:
+                        if not pending:
+                            if not watch:
+                                self.counts["skipped"] += 1
+                            continue
+                        self._queued.add(path)
+                    executor.submit(self.process, path, relative, size, mtime)
+                if not watch:
+                    break
+                time.sleep(poll_seconds)
+            executor.shutdown(wait=True)
+        except KeyboardInterrupt:
+            # Files in progress stay "running" and are processed again next time
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        return dict(self.counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="directory of images and videos, scanned recursively")
+    parser.add_argument("--output", required=True, help="directory for outputs, the manifest and the checkpoint")
+    parser.add_argument("--watch", action="store_true", help="keep scanning the input directory for new files")
+    parser.add_argument("--workers", type=int, default=config.INGEST_WORKERS, help="files processed at once")
+    parser.add_argument("--task", choices=["detection", "segmentation"], default="detection")
+    parser.add_argument("--classes", help="comma-separated class names to keep (default: all)")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--no-render", action="store_true", help="only write detections, no annotated copies")
+    parser.add_argument("--include-masks", action="store_true", help="add segmentation outlines to the detections")
+    parser.add_argument("--image-format", default="jpeg", help="png, jpeg or webp for annotated images")
+    parser.add_argument("--stride", type=int, help="video keyframe stride (default: ARGUS_VIDEO_STRIDE)")
+    parser.add_argument("--precision", choices=["fp32", "int8"])
+    parser.add_argument("--retry-failed", action="store_true", help="process files that failed before again")
+    parser.add_argument("--poll-seconds", type=float, default=config.INGEST_POLL_SECONDS)
+    parser.add_argument("--settle-seconds", type=float, default=config.INGEST_SETTLE_SECONDS,
+                        help="with --watch, skip files modified more recently than this")
+    args = parser.parse_args()
+
+    selected_classes = None
+    if args.classes:
+        selected_classes = [name.strip() for name in args.classes.split(",") if name.strip()]
+        unknown = sorted(set(selected_classes) - set(names_list))
+        if unknown:
+            parser.error(f"unknown classes: {', '.join(unknown)}")
+    if os.path.abspath(args.output) == os.path.abspath(args.input):
+        parser.error("--output must differ from the input directory")
+
+    ingestor = Ingestor(args.input, args.output, args.task, selected_classes, args.threshold,
+                        render=not args.no_render, include_masks=args.include_masks, image_format=args.image_format,
+                        options=video_options(stride=args.stride, precision=args.precision),
+                        retry_failed=args.retry_failed)
+    try:
+        counts = ingestor.run(args.workers, args.watch, args.poll_seconds, args.settle_seconds)
+    except KeyboardInterrupt:
+        # The files in progress are finished before exiting
+        counts = dict(ingestor.counts, interrupted=True)
+    print(json.dumps(counts, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Background video jobs with progress reporting.
+
+Job state lives in a local SQLite database so queued and interrupted jobs are
+picked up again when the server restarts. Uploads and outputs are kept in one
+directory per job under config.JOBS_DIR.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from metrics import record_video
+from video import process_video
+
+# How often running jobs write their progress to the database
+PROGRESS_INTERVAL = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    task TEXT NOT NULL,
+    params TEXT NOT NULL,
+    input_path TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    frames_done INTEGER NOT NULL DEFAULT 0,
+    frames_total INTEGER NOT NULL DEFAULT 0,
+    fps REAL,
+    stats TEXT,
+    error TEXT,
+    worker_pid INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+)
+"""
+
+
+class JobStore:
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(SCHEMA)
+            # Databases created before a column was added
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "stats" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN stats TEXT")
+            if "worker_pid" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN worker_pid INTEGER")
+
+    def create(self, job_id, task, params, input_path, output_path):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, task, params, input_path, output_path, created_at) "
+                "VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, task, json.dumps(params), input_path, output_path, time.time()),
+            )
+
+    def update(self, job_id, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def claim(self, job_id, started_at):
+        """Mark a queued job running in this process; False when another worker got to it first."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, frames_done = 0, worker_pid = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (started_at, os.getpid(), job_id),
+            )
+        return cursor.rowcount == 1
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def with_status(self, *statuses):
+        marks = ", ".join("?" for _ in statuses)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs WHERE status IN ({marks}) ORDER BY created_at", statuses
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete(self, job_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def job_status(job):
+    """Public view of a job row."""
+    frames_done = job["frames_done"]
+    frames_total = job["frames_total"]
+    fps = job["fps"]
+    eta = None
+    if job["status"] == "running" and fps and frames_total > frames_done:
+        eta = round((frames_total - frames_done) / fps, 1)
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "task": job["task"],
+        "frames_processed": frames_done,
+        "frames_total": frames_total,
+        "progress": round(frames_done / frames_total, 4) if frames_total else None,
+        "fps": round(fps, 2) if fps else None,
+        "eta_seconds": eta,
+        "stats": json.loads(job["stats"]) if job["stats"] else None,
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+
+
+class JobManager:
+    def __init__(self, jobs_dir, db_path, concurrency=1):
+        self.jobs_dir = jobs_dir
+        self.db_path = db_path
+        self.concurrency = max(concurrency, 1)
+        # The multi-worker server recovers jobs once, before starting its
+        # workers, so one worker does not requeue another's running jobs
+        self.recover_on_start = True
+        self.store = None
+        self._executor = None
+
+    def recover(self, worker_pids=None):
+        """Requeue jobs left running by a previous run, or with worker_pids
+        only those that the given (dead) worker processes were running."""
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        store = self.store or JobStore(self.db_path)
+        requeued = 0
+        for job in store.with_status("running"):
+            if worker_pids is None or job["worker_pid"] in worker_pids:
+                store.update(job["id"], status="queued", frames_done=0, fps=None, started_at=None,
+                             worker_pid=None)
+                requeued += 1
+        if store is not self.store:
+            store.close()
+        return requeued
+
+    def start(self):
+        """Open the job database and start the queued jobs, after requeueing
+        the ones left over from a previous run."""
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self.store = JobStore(self.db_path)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="argus-job")
+        if self.recover_on_start:
+            self.recover()
+        # Every worker of the multi-worker server submits the queued jobs;
+        # claim() lets only one of them run each job
+        for job in self.store.with_status("queued"):
+            self._executor.submit(self._run, job["id"])
+
+    def shutdown(self):
+        if self._executor is not None:
+            # Running jobs are marked queued again on the next start
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def job_dir(self, job_id):
+        return os.path.join(self.jobs_dir, job_id)
+
+    def new_job_id(self):
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.job_dir(job_id))
+        return job_id
+
+    def submit(self, job_id, input_path, task, params):
+        output_path = os.path.join(self.job_dir(job_id), "output.mp4")
+        self.store.create(job_id, task, params, input_path, output_path)
+        self._executor.submit(self._run, job_id)
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def queued(self):
+        """Number of jobs waiting to run."""
+        return len(self.store.with_status("queued")) if self.store is not None else 0
+
+    def delete(self, job_id):
+        self.store.delete(job_id)
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def _run(self, job_id):
+        job = self.store.get(job_id)
+        if job is None or job["status"] != "queued":
+            return
+        started = time.time()
+        if not self.store.claim(job_id, started):
+            return
+        last_update = [0.0]
+
+        def progress(frames_done, frames_total):
+            now = time.time()
+            if now - last_update[0] >= PROGRESS_INTERVAL:
+                last_update[0] = now
+                self.store.update(job_id, frames_done=frames_done, frames_total=frames_total,
+                                  fps=frames_done / max(now - started, 1e-6))
+
+        stats = {}
+        try:
+            params = json.loads(job["params"])
+            frames = process_video(job["input_path"], job["output_path"], job["task"], progress=progress,
+                                   stats=stats, **params)
+        except Exception as e:
+            self.store.update(job_id, status="failed", error=str(e), finished_at=time.time())
+            return
+
+        finished = time.time()
+        record_video(job["task"], frames, finished - started)
+        self.store.update(job_id, status="done", frames_done=frames, frames_total=frames,
+                          fps=frames / max(finished - started, 1e-6), stats=json.dumps(stats),
+                          finished_at=finished)
+        # The upload is only needed to restart an interrupted job
+        if os.path.exists(job["input_path"]):
+            os.remove(job["input_path"])
+
+
+job_manager = JobManager(config.JOBS_DIR, config.JOBS_DB, concurrency=config.JOB_CONCURRENCY)
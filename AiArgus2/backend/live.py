@@ -0,0 +1,101 @@
+"""Per-connection state of the live detection WebSocket (/api/live).
+
+Frames wait in a single latest-frame slot: a frame that arrives while an older
+one is still waiting replaces it, and the older one is counted as dropped.
+Inference always works on the newest frame, so a client that sends faster
+than the model keeps up sees results at most about one inference late
+instead of falling further and further behind.
+"""
+import asyncio
+import time
+from collections import deque
+
+from metrics import live_frames_total
+
+
+class LatestFrame:
+    """Holds only the newest frame until the consumer takes it."""
+
+    def __init__(self):
+        self._frame = None
+        self._ready = asyncio.Event()
+        self.closed = False
+
+    def put(self, frame):
+        """Store frame; True if it replaced one that was never taken."""
+        replaced = self._frame is not None
+        self._frame = frame
+        self._ready.set()
+        return replaced
+
+    async def get(self):
+        """The newest frame, or None once closed (a frame still waiting then has no one to go to)."""
+        while self._frame is None and not self.closed:
+            self._ready.clear()
+            await self._ready.wait()
+        if self.closed:
+            return None
+        frame, self._frame = self._frame, None
+        return frame
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+
+class LiveSession:
+    # Frames per second are measured over the most recent frames
+    FPS_WINDOW = 30
+
+    def __init__(self, task, client=None):
+        self.task = task
+        self.client = client
+        self.started = time.time()
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_latency = None
+        self._received_at = deque(maxlen=self.FPS_WINDOW)
+        self._processed_at = deque(maxlen=self.FPS_WINDOW)
+
+    def frame_received(self, replaced):
+        self.received += 1
+        self._received_at.append(time.perf_counter())
+        if replaced:
+            self.dropped += 1
+            live_frames_total.inc(task=self.task, outcome="dropped")
+
+    def frame_done(self, latency, error=False):
+        self.last_latency = latency
+        if error:
+            self.errors += 1
+            live_frames_total.inc(task=self.task, outcome="failed")
+        else:
+            self.processed += 1
+            self._processed_at.append(time.perf_counter())
+            live_frames_total.inc(task=self.task, outcome="processed")
+
+    @staticmethod
+    def rate(times):
+        if len(times) < 2 or times[-1] == times[0]:
+            return None
+        return round((len(times) - 1) / (times[-1] - times[0]), 2)
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "drop_ratio": round(self.dropped / self.received, 4) if self.received else 0.0,
+            "input_fps": self.rate(self._received_at),
+            "fps": self.rate(self._processed_at),
+            "latency_ms": round(self.last_latency * 1000, 1) if self.last_latency is not None else None,
+        }
+
+    def info(self):
+        return {"task": self.task, "client": self.client, "started": self.started, **self.stats()}
+
+
+sessions = set()
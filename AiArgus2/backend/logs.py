@@ -0,0 +1,58 @@
+"""Structured logging for the backend.
+
+Modules log through get_logger(__name__), under the "argus" logger. Details
+of individual requests are logged at DEBUG, so the request path stays silent
+at the default INFO level (ARGUS_LOG_LEVEL). Fields passed with extra={...}
+are kept as structured data: appended as key=value in the text format, or as
+keys of one JSON object per line with ARGUS_LOG_FORMAT=json.
+"""
+import json
+import logging
+import sys
+
+import config
+
+# Attributes every LogRecord has; anything else came in through extra=
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+def record_fields(record):
+    return {name: value for name, value in vars(record).items() if name not in RECORD_ATTRIBUTES}
+
+
+class TextFormatter(logging.Formatter):
+    def formatMessage(self, record):
+        fields = "".join(f" {name}={value}" for name, value in record_fields(record).items())
+        return super().formatMessage(record) + fields
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **record_fields(record),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def get_logger(name):
+    return logging.getLogger(f"argus.{name}")
+
+
+def configure_logging(level=None, log_format=None):
+    """Send the backend's logs to stderr at the configured level and format."""
+    logger = logging.getLogger("argus")
+    handler = logging.StreamHandler(sys.stderr)
+    if (log_format or config.LOG_FORMAT) == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logger.handlers[:] = [handler]
+    logger.setLevel((level or config.LOG_LEVEL).upper())
+    logger.propagate = False
+    return logger
@@ -1,15 +1,38 @@
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from ultralytics import YOLO
-import numpy as np
-import cv2
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 import os
 from typing import List
 import json
 import torch
-from ultralytics.nn.tasks import DetectionModel
-from torch.nn.modules.container import Sequential
-import base64
+import asyncio
+import hmac
+import threading
+import time
+from classes import names_list
+from model_registry import registry, predict, preload_configured_models, resolve_precision
+from workers import image_pool, video_pool
+from batching import batchers
+from video import annotate_video, color_to_bgr, iter_video_detections, video_options
+from backends import BackendError
+from postprocess import predict_options
+from rendering import DetectionError, detections_payload, render_image
+from jobs import job_manager, job_status
+from live import LatestFrame, LiveSession, sessions as live_sessions
+from decoding import decode_image, placeholder, rescale_result
+from tiling import merge_tile_results, needs_tiling, tile_images, tile_windows
+from inference_cache import cached_confidence, inference_cache, to_entry, to_result
+from logs import configure_logging, get_logger
+from metrics import Gauge, record_video, requests_total, timed_stage
+import metrics
+from profiling import RequestProfile, current_profile, profiling
+from uploads import (WorkDir, endpoint_upload_bytes, is_archive, iter_archive_images, iter_spooled_images,
+                     max_upload_bytes, read_upload, readable_archive, spool_image_uploads, spool_upload,
+                     upload_suffix)
+from encoding import (DETECTIONS_FORMATS, NDJSON_MEDIA_TYPE, NPZ_MEDIA_TYPE, RESPONSE_FORMATS, VIDEO_MEDIA_TYPE,
+                      file_response, image_format_name, media_response, ndjson_line)
+import config
 
 # Store the original torch.load function
 original_torch_load = torch.load
@@ -22,8 +45,21 @@ def custom_torch_load(*args, **kwargs):
 # Replace torch.load with our custom version
 torch.load = custom_torch_load
 
+configure_logging()
+logger = get_logger(__name__)
+
 app = FastAPI()
 
+@app.middleware("http")
+async def reject_oversized_uploads(request, call_next):
+    # Refuse uploads that announce a size above the endpoint's limit before
+    # the multipart body is read at all
+    if request.method == "POST" and request.url.path.startswith(("/api/detect", "/api/jobs")):
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > endpoint_upload_bytes(request.url.path):
+            return JSONResponse(status_code=413, content={"detail": "Upload too large"})
+    return await call_next(request)
+
 # Konfiguracja CORS
 app.add_middleware(
     CORSMiddleware,
@@ -31,53 +67,296 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
-    expose_headers=["*"],
+    expose_headers=["*", "X-Detections", "X-Detection-Count", "X-Detections-Truncated", "X-Message", "X-Profile"],
     max_age=3600,
 )
 
-# COCO class names
-names = {0: 'person', 1: 'bicycle', 2: 'car', 3: 'motorcycle', 4: 'airplane',
-        5: 'bus', 6: 'train', 7: 'truck', 8: 'boat', 9: 'traffic light', 
-        10: 'fire hydrant', 11: 'stop sign', 12: 'parking meter', 
-        13: 'bench', 14: 'bird', 15: 'cat', 16: 'dog', 17: 'horse', 
-        18: 'sheep', 19: 'cow', 20: 'elephant', 21: 'bear', 22: 'zebra', 
-        23: 'giraffe', 24: 'backpack', 25: 'umbrella', 26: 'handbag', 
-        27: 'tie', 28: 'suitcase', 29: 'frisbee', 30: 'skis', 31: 'snowboard', 
-        32: 'sports ball', 33: 'kite', 34: 'baseball bat', 35: 'baseball glove', 
-        36: 'skateboard', 37: 'surfboard', 38: 'tennis racket', 39: 'bottle', 
-        40: 'wine glass', 41: 'cup', 42: 'fork', 43: 'knife', 44: 'spoon', 
-        45: 'bowl', 46: 'banana', 47: 'apple', 48: 'sandwich', 49: 'orange', 
-        50: 'broccoli', 51: 'carrot', 52: 'hot dog', 53: 'pizza', 54: 'donut', 
-        55: 'cake', 56: 'chair', 57: 'couch', 58: 'potted plant', 59: 'bed', 
-        60: 'dining table', 61: 'toilet', 62: 'tv', 63: 'laptop', 64: 'mouse', 
-        65: 'remote', 66: 'keyboard', 67: 'cell phone', 68: 'microwave', 
-        69: 'oven', 70: 'toaster', 71: 'sink', 72: 'refrigerator', 73: 'book', 
-        74: 'clock', 75: 'vase', 76: 'scissors', 77: 'teddy bear', 
-        78: 'hair drier', 79: 'toothbrush'}
-
-names_list = [name for name in names.values()]
-
-def hex_to_bgr(value):
-    value = value.lstrip('#')
-    lv = len(value)
-    rgb_value = tuple(int(value[i:i + lv // 3], 16) for i in range(0, lv, lv // 3))
-    r_value, g_value, b_value = rgb_value
-    bgr_value = (b_value, g_value, r_value)
-    rgb_value = (r_value, g_value, b_value)
-    return bgr_value, rgb_value
-
-def read_image_bytes(image_bytes, task):
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    # Zawsze używamy BGR
-    return img
+def read_image_bytes(image_bytes, task, target=None):
+    # Zawsze używamy BGR; z target obraz może być zdekodowany w mniejszej rozdzielczości
+    return decode_image(image_bytes, target)
+
+@app.on_event("startup")
+def load_models():
+    if config.PRELOAD_MODELS:
+        preload_configured_models()
+
+@app.on_event("startup")
+def start_jobs():
+    job_manager.start()
+
+@app.on_event("shutdown")
+def stop_workers():
+    image_pool.shutdown()
+    video_pool.shutdown()
+    job_manager.shutdown()
+
+@app.get("/api/models")
+async def get_models():
+    return registry.stats()
+
+@app.get("/api/workers")
+async def get_workers():
+    return {"pid": os.getpid(), "image": image_pool.stats(), "video": video_pool.stats()}
+
+@app.get("/api/batching")
+async def get_batching():
+    return {task: batcher.stats() for task, batcher in batchers.items()}
+
+@app.get("/api/cache")
+async def get_cache():
+    return inference_cache.stats()
+
+@app.get("/api/live")
+async def get_live():
+    return {"max_connections": config.LIVE_MAX_CONNECTIONS,
+            "connections": [session.info() for session in list(live_sessions)]}
+
+Gauge("argus_in_flight_requests", "Requests being processed by each worker pool.", ["pool"],
+      lambda: {(pool.name,): pool.in_flight for pool in (image_pool, video_pool)})
+Gauge("argus_queue_depth", "Items waiting in the batching and job queues.", ["queue"],
+      lambda: {**{(f"batch-{task}",): batcher.pending for task, batcher in batchers.items()},
+               ("jobs",): job_manager.queued()})
+Gauge("argus_live_connections", "Open live detection WebSocket connections.", [],
+      lambda: {(): len(live_sessions)})
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.get("/api/class-names")
 async def get_class_names():
     return {"class_names": names_list}
 
+def inference_size(imgsz=None):
+    """Inference size for a request, with None taken from the config."""
+    imgsz = config.IMAGE_SIZE if imgsz is None else imgsz
+    if not 32 <= imgsz <= 4096 or imgsz % 32:
+        raise ValueError("imgsz must be a multiple of 32 between 32 and 4096")
+    return imgsz
+
+
+def tile_options(task, tile_size=None, tile_overlap=None):
+    """(tile size, overlap) for tiled inference, with unset fields taken from the config.
+
+    The configured tile size only applies to detection, the only task that can be tiled.
+    """
+    if tile_size is None:
+        tile_size = config.TILE_SIZE if task == "detection" else 0
+    tile_overlap = config.TILE_OVERLAP if tile_overlap is None else tile_overlap
+    if tile_size and tile_size < 32:
+        raise ValueError("tile_size must be 0 (off) or at least 32")
+    if not 0 <= tile_overlap < 1:
+        raise ValueError("tile_overlap must be in [0, 1)")
+    return tile_size, tile_overlap
+
+
+async def predict_one(image, task, options):
+    if current_profile() is not None:
+        # Profiled requests skip micro-batching so the model call is profiled with them
+        return (await image_pool.submit(predict, "image", task, [image], verbose=False, **options))[0]
+    return await batchers[task].submit(image, **options)
+
+
+async def predict_image(image, task, options, tile_size=0, tile_overlap=0.2):
+    """Results for image, predicted in overlapping tiles when it is larger than tile_size."""
+    if not needs_tiling(image, tile_size):
+        return await predict_one(image, task, options)
+    windows = tile_windows(image.shape[1], image.shape[0], tile_size, tile_overlap)
+    sources = tile_images(image, windows)
+    if config.TILE_FULL_PASS:
+        sources.append(image)
+    logger.debug("Predicting tiles", extra={"tiles": len(windows), "tile_size": tile_size})
+    # Tiles are views into the image; the batcher groups them into batches
+    # of config.BATCH_MAX_SIZE, so only one batch is preprocessed at a time
+    results = await asyncio.gather(*(predict_one(source, task, options) for source in sources))
+    full_result = results.pop() if config.TILE_FULL_PASS else None
+    return await image_pool.submit(merge_tile_results, image, windows, results, full_result,
+                                   config.TILE_MERGE_THRESHOLD)
+
+
+async def detect_image(content, task, selected_classes, threshold, show_labels, show_confidence, color, thickness,
+                       image_format="png", quality=None, response_format="json", render=True,
+                       include_masks=False, detections_format="json", precision=None, tiles=(0, 0.2), imgsz=640):
+    if task not in batchers:
+        return {"error": "Unsupported file type or task"}
+    try:
+        # Without drawing or tiling, the full-size pixels are never needed
+        reduce = config.DECODE_REDUCED and not render and not tiles[0]
+        with timed_stage("decode", "image", task):
+            image, shape = await image_pool.submit(read_image_bytes, content, task, imgsz if reduce else None)
+        if image is None:
+            return {"error": "Could not decode image"}
+        logger.debug("Decoded image", extra={"width": image.shape[1], "height": image.shape[0]})
+        if not needs_tiling(image, tiles[0]):
+            tiles = (0, 0)
+        elif task != "detection":
+            return {"error": "Tiled inference supports detection only"}
+
+        options = dict(predict_options(selected_classes, threshold), precision=precision, imgsz=imgsz)
+        key = entry = None
+        if inference_cache.enabled:
+            # Cached results keep every class down to a low confidence floor;
+            # the request's filters are applied when drawing
+            options = {"conf": cached_confidence(threshold), "precision": precision, "imgsz": imgsz}
+            # The cache lives in this process, so it is never sent to the
+            # pool (which may run in worker processes)
+            key, entry = await asyncio.to_thread(inference_cache.lookup, content, "image", task, tiles=tiles,
+                                                 **options)
+
+        if entry is not None:
+            logger.debug("Using cached results", extra={"task": task})
+            # Cached boxes are in full image coordinates
+            result = to_result(entry, image if image.shape[:2] == shape else placeholder(shape))
+        else:
+            try:
+                with timed_stage("inference", "image", task):
+                    result = await predict_image(image, task, options, *tiles)
+                logger.debug("Inference complete", extra={"task": task, "objects": len(result.boxes)})
+                if image.shape[:2] != shape:
+                    result = rescale_result(result, shape)
+            except Exception as e:
+                logger.exception("Inference failed")
+                return {"error": f"Failed to run {task}: {str(e)}"}
+            if key is not None:
+                await asyncio.to_thread(inference_cache.put, key, to_entry(result))
+
+        if not render:
+            payload = await image_pool.submit(detections_payload, shape, result, task, selected_classes, threshold,
+                                              include_masks, detections_format)
+            if detections_format == "npz":
+                return Response(content=payload, media_type=NPZ_MEDIA_TYPE)
+            return payload
+
+        output = await image_pool.submit(render_image, image, result, task, selected_classes, threshold,
+                                         show_labels, show_confidence, color, thickness,
+                                         image_format, quality, response_format)
+        if response_format == "json":
+            return output
+        return media_response(*output, response_format)
+    except DetectionError as e:
+        return {"error": str(e)}
+    except Exception as e:
+        logger.exception("Error processing image")
+        return {"error": str(e)}
+
+
+def read_hex(path):
+    with open(path, 'rb') as f:
+        return f.read().hex()
+
+
+async def detect_video(file, task, selected_classes, threshold, show_labels, show_confidence, color, thickness,
+                       response_format="json", options=None):
+    if task not in ("detection", "segmentation"):
+        return {"error": "Unsupported file type or task"}
+
+    # Each request works in its own directory, removed once the response is sent
+    workdir = WorkDir()
+    try:
+        async with video_pool.slot():
+            input_file = workdir.file("input" + upload_suffix(file.filename))
+            size = await spool_upload(file, input_file, max_upload_bytes("video"))
+            logger.debug("Processing video", extra={"upload": file.filename, "bytes": size})
+
+            output_file = workdir.file("output.mp4")
+            start = time.perf_counter()
+            with timed_stage("process", "video", task):
+                frames, stats = await video_pool.submit(annotate_video, input_file, output_file, task,
+                                                        selected_classes, threshold, show_labels, show_confidence,
+                                                        color, thickness, **(options or {}))
+            record_video(task, frames, time.perf_counter() - start)
+            if response_format == "json":
+                video_hex = await video_pool.submit(read_hex, output_file)
+                workdir.cleanup()
+                return {"video": video_hex, "stats": stats}
+    except BaseException:
+        workdir.cleanup()
+        raise
+
+    metadata = {"format": "mp4", "message": f"{task.capitalize()} completed successfully", "frames": frames,
+                "stats": stats}
+    return file_response(output_file, VIDEO_MEDIA_TYPE, metadata, response_format,
+                         background=BackgroundTask(workdir.cleanup))
+
+
+async def stream_video_detections(frames, workdir, task):
+    """NDJSON body for iter_video_detections, one line per item.
+
+    Frames are decoded and detected one at a time, so only the line being
+    sent is held in memory.
+    """
+    # The generator cannot be sent to a worker process, so it is always
+    # driven from threads. A disconnect can cancel the stream while a frame
+    # is still being processed; the lock makes the close wait for that frame
+    lock = threading.Lock()
+
+    def next_item():
+        with lock:
+            return next(frames, None)
+
+    def close():
+        with lock:
+            frames.close()
+            workdir.cleanup()
+
+    start = time.perf_counter()
+    count = 0
+    try:
+        while True:
+            item = await asyncio.to_thread(next_item)
+            if item is None:
+                break
+            count += "frame" in item
+            yield ndjson_line(item)
+        record_video(task, count, time.perf_counter() - start)
+    finally:
+        video_pool.release()
+        asyncio.get_running_loop().run_in_executor(None, close)
+
+
+async def detect_video_detections(file, task, selected_classes, threshold, include_masks=False, options=None):
+    if task not in ("detection", "segmentation"):
+        return {"error": "Unsupported file type or task"}
+
+    # The slot is taken first, so a busy server rejects the request before
+    # any working directory exists
+    video_pool.acquire()
+    workdir = WorkDir()
+    try:
+        input_file = workdir.file("input" + upload_suffix(file.filename))
+        size = await spool_upload(file, input_file, max_upload_bytes("video"))
+        logger.debug("Processing video", extra={"upload": file.filename, "bytes": size})
+    except BaseException:
+        video_pool.release()
+        workdir.cleanup()
+        raise
+
+    # The slot and the work directory are released when the stream ends
+    frames = iter_video_detections(input_file, task, selected_classes, threshold, include_masks,
+                                   **(options or {}))
+    return StreamingResponse(stream_video_detections(frames, workdir, task), media_type=NDJSON_MEDIA_TYPE)
+
+
+def profiling_allowed(request):
+    """True if the caller may profile requests (see config.PROFILE_TOKEN and config.PROFILE_CLIENTS)."""
+    token = request.headers.get("X-Profile-Token")
+    if config.PROFILE_TOKEN and token and hmac.compare_digest(token, config.PROFILE_TOKEN):
+        return True
+    return request.client is not None and request.client.host in config.PROFILE_CLIENTS
+
+
+def attach_profile(response, summary):
+    """Add a profile summary to a JSON body, or as the X-Profile header of any other response."""
+    if isinstance(response, dict):
+        return dict(response, profile=summary)
+    response.headers["X-Profile"] = json.dumps(summary)
+    return response
+
+
 @app.post("/api/detect")
 async def detect_objects(
+    request: Request,
     file: UploadFile = File(...),
     task: str = Form("detection"),
     selected_classes: str = Form(None),
@@ -85,361 +364,418 @@ async def detect_objects(
     show_labels: bool = Form(True),
     show_confidence: bool = Form(True),
     color: str = Form("#B9282B"),
-    thickness: int = Form(2)
+    thickness: int = Form(2),
+    response_format: str = Form("json"),
+    image_format: str = Form("png"),
+    quality: int = Form(None),
+    render: bool = Form(True),
+    include_masks: bool = Form(False),
+    detections_format: str = Form("json"),
+    stride: int = Form(None),
+    adaptive_stride: bool = Form(None),
+    tracker: str = Form(None),
+    motion_threshold: float = Form(None),
+    precision: str = Form(None),
+    tile_size: int = Form(None),
+    tile_overlap: float = Form(None),
+    imgsz: int = Form(None),
+    profile: bool = Form(False)
 ):
+    file_type = (file.content_type or "").split('/')[0]
+    # Bad fields are the client's fault: they get a 400 before anything is
+    # counted or read, so the metrics only ever see known tasks
+    try:
+        if task not in ("detection", "segmentation"):
+            raise ValueError(f"Unsupported task: {task}")
+        selected_classes = names_list if selected_classes is None else json.loads(selected_classes)
+        if response_format not in RESPONSE_FORMATS:
+            raise ValueError(f"Unsupported response format: {response_format}")
+        image_format_name(image_format)
+        if detections_format not in DETECTIONS_FORMATS:
+            raise ValueError(f"Unsupported detections format: {detections_format}")
+        if file_type == "image":
+            image_options = {"precision": resolve_precision(precision),
+                             "tiles": tile_options(task, tile_size, tile_overlap), "imgsz": inference_size(imgsz)}
+        elif file_type == "video":
+            options = video_options(stride, adaptive_stride, tracker, motion_threshold, precision)
+    except (ValueError, BackendError) as e:
+        logger.info("Rejected detect request", extra={"reason": str(e)})
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
-        print(f"\n=== Starting {task} process ===")
-        print(f"Task type: {task}")
-        
-        if selected_classes is None:
-            selected_classes = names_list
+        requests_total.inc(media=file_type if file_type in ("image", "video") else "other", task=task)
+        logger.debug("Detect request", extra={"task": task, "media": file_type, "upload": file.filename})
+
+        request_profile = None
+        if profile:
+            if not profiling_allowed(request):
+                raise HTTPException(status_code=403, detail="Profiling is not allowed for this client")
+            if file_type == "video" and not render:
+                return {"error": "Profiling is not supported for streamed video detections"}
+            request_profile = RequestProfile()
+
+        with profiling(request_profile):
+            if file_type == "image":
+                async with image_pool.slot():
+                    content = await read_upload(file, max_upload_bytes("image"))
+                    logger.debug("Processing image", extra={"bytes": len(content)})
+                    response = await detect_image(content, task, selected_classes, threshold,
+                                                  show_labels, show_confidence, color, thickness,
+                                                  image_format, quality, response_format,
+                                                  render, include_masks, detections_format, **image_options)
+            elif file_type == "video":
+                if not render:
+                    return await detect_video_detections(file, task, selected_classes, threshold, include_masks,
+                                                         options)
+                response = await detect_video(file, task, selected_classes, threshold,
+                                              show_labels, show_confidence, color, thickness, response_format,
+                                              options)
+            else:
+                return {"error": "Unsupported file type or task"}
+
+        if request_profile is not None:
+            summary = await asyncio.to_thread(request_profile.finish, config.PROFILE_DIR)
+            logger.info("Profiled request", extra={"profile_id": summary["id"], "total_ms": summary["total_ms"]})
+            response = attach_profile(response, summary)
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Unexpected error")
+        return {"error": str(e)} 
+
+
+async def detect_batch_item(index, name, content, error, task, selected_classes, threshold, include_masks,
+                            options):
+    """NDJSON line with the detections (or the error) of one image of a batch."""
+    line = {"index": index, "name": name}
+    if error is not None:
+        return dict(line, error=error)
+    payload = await detect_image(content, task, selected_classes, threshold, show_labels=False,
+                                 show_confidence=False, color=None, thickness=0, render=False,
+                                 include_masks=include_masks, **options)
+    return dict(line, **payload)
+
+
+async def stream_batch_detections(items, workdir, detect, window):
+    """NDJSON body of /api/detect/batch: one line per image as soon as it is done, then the stats.
+
+    At most window images are read, decoded, predicted or waiting at once,
+    so memory does not grow with the number of images. Their inference goes
+    through the micro-batcher, which groups them into model batches.
+    """
+    # The archive is read from threads; the lock makes the close wait for a read in progress
+    lock = threading.Lock()
+
+    def next_item():
+        with lock:
+            return next(items, None)
+
+    def close():
+        with lock:
+            items.close()
+            workdir.cleanup()
+
+    start = time.perf_counter()
+    pending = set()
+    read = done_count = errors = 0
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < window:
+                try:
+                    item = await asyncio.to_thread(next_item)
+                except Exception as e:
+                    # A truncated or corrupt archive ends the batch
+                    logger.warning("Failed to read batch archive", extra={"error": str(e)})
+                    yield ndjson_line({"error": f"Failed to read archive: {e}"})
+                    item = None
+                if item is None:
+                    exhausted = True
+                else:
+                    pending.add(asyncio.ensure_future(detect(read, *item)))
+                    read += 1
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                line = future.result()
+                done_count += 1
+                errors += "error" in line
+                yield ndjson_line(line)
+        seconds = time.perf_counter() - start
+        yield ndjson_line({"stats": {"images": done_count, "errors": errors, "seconds": round(seconds, 3),
+                                     "images_per_second": round(done_count / seconds, 2) if seconds else None}})
+    finally:
+        for future in pending:
+            future.cancel()
+        image_pool.release()
+        asyncio.get_running_loop().run_in_executor(None, close)
+
+
+@app.post("/api/detect/batch")
+async def detect_batch(
+    files: List[UploadFile] = File(...),
+    task: str = Form("detection"),
+    selected_classes: str = Form(None),
+    threshold: float = Form(0.25),
+    include_masks: bool = Form(False),
+    precision: str = Form(None),
+    tile_size: int = Form(None),
+    tile_overlap: float = Form(None),
+    imgsz: int = Form(None)
+):
+    try:
+        if task not in batchers:
+            return {"error": "Unsupported file type or task"}
+        selected_classes = names_list if selected_classes is None else json.loads(selected_classes)
+        options = {"precision": resolve_precision(precision), "tiles": tile_options(task, tile_size, tile_overlap),
+                   "imgsz": inference_size(imgsz)}
+    except Exception as e:
+        return {"error": str(e)}
+    requests_total.inc(media="batch", task=task)
+
+    # Uploads are spooled to disk and read back one image at a time
+    # The slot is taken first, so a busy server rejects the request before
+    # any working directory exists
+    image_pool.acquire()
+    workdir = WorkDir()
+    try:
+        if len(files) == 1 and is_archive(files[0].filename):
+            archive = workdir.file("archive")
+            size = await spool_upload(files[0], archive, max_upload_bytes("batch"))
+            logger.debug("Processing batch archive", extra={"upload": files[0].filename, "bytes": size})
+            if not await asyncio.to_thread(readable_archive, archive):
+                image_pool.release()
+                workdir.cleanup()
+                return {"error": "Unsupported or corrupt archive"}
+            items = iter_archive_images(archive, max_upload_bytes("image"))
         else:
-            selected_classes = json.loads(selected_classes)
+            entries = await spool_image_uploads(files, workdir, max_upload_bytes("image"))
+            logger.debug("Processing batch", extra={"files": len(entries)})
+            items = iter_spooled_images(entries)
+    except BaseException:
+        image_pool.release()
+        workdir.cleanup()
+        raise
 
-        content = await file.read()
-        file_type = file.content_type.split('/')[0]
-        print(f"Processing {file_type} file: {file.filename}, size: {len(content)} bytes")
+    async def detect(index, name, content, error):
+        return await detect_batch_item(index, name, content, error, task, selected_classes, threshold,
+                                       include_masks, options)
 
-        if file_type == "image":
+    # The slot and the work directory are released when the stream ends
+    return StreamingResponse(stream_batch_detections(items, workdir, detect, max(config.BATCH_REQUEST_WINDOW, 1)),
+                             media_type=NDJSON_MEDIA_TYPE)
+
+
+async def detect_live_frame(content, task, selected_classes, threshold, options, include_masks=False, drawing=None):
+    """Detections payload of one live frame, and the annotated image when drawing options are given.
+
+    Frames skip the inference cache (live frames do not repeat) but share
+    micro-batches with other connections and requests.
+    """
+    reduce = config.DECODE_REDUCED and drawing is None
+    with timed_stage("decode", "live", task):
+        image, shape = await image_pool.submit(read_image_bytes, content, task, options["imgsz"] if reduce else None)
+    if image is None:
+        raise DetectionError("Could not decode image")
+    with timed_stage("inference", "live", task):
+        result = await predict_one(image, task, dict(predict_options(selected_classes, threshold), **options))
+    if image.shape[:2] != shape:
+        result = rescale_result(result, shape)
+    payload = await image_pool.submit(detections_payload, shape, result, task, selected_classes, threshold,
+                                      include_masks)
+    if drawing is None:
+        return payload, None
+    image_bytes, _, _ = await image_pool.submit(render_image, image, result, task, selected_classes, threshold,
+                                                response_format="binary", **drawing)
+    return payload, image_bytes
+
+
+@app.websocket("/api/live")
+async def live_detection(
+    websocket: WebSocket,
+    task: str = "detection",
+    selected_classes: str = None,
+    threshold: float = 0.25,
+    include_masks: bool = False,
+    precision: str = None,
+    imgsz: int = None,
+    render: bool = False,
+    image_format: str = "jpeg",
+    quality: int = None,
+    show_labels: bool = True,
+    show_confidence: bool = True,
+    color: str = "#B9282B",
+    thickness: int = 2
+):
+    """Live detection: the client sends encoded frames as binary messages and
+    gets a JSON message per processed frame, followed by the annotated frame
+    as a binary message with render=true. Only the newest waiting frame is
+    processed; older ones are dropped."""
+    if len(live_sessions) >= config.LIVE_MAX_CONNECTIONS:
+        # Closing before accepting rejects the handshake
+        await websocket.close(code=1013)
+        return
+    # The slot is taken before the first await, so concurrent handshakes
+    # cannot all pass the check above
+    client = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else None
+    session = LiveSession(task, client)
+    live_sessions.add(session)
+    try:
+        await websocket.accept()
+        try:
+            if task not in batchers:
+                raise ValueError(f"Unsupported task: {task}")
+            selected_classes = names_list if selected_classes is None else json.loads(selected_classes)
+            image_format_name(image_format)
+            options = {"precision": resolve_precision(precision), "imgsz": inference_size(imgsz)}
+        except Exception as e:
+            await websocket.close(code=1008, reason=str(e)[:120])
+            return
+        drawing = None
+        if render:
+            drawing = {"show_labels": show_labels, "show_confidence": show_confidence, "color": color,
+                       "thickness": thickness, "image_format": image_format, "quality": quality}
+
+        frames = LatestFrame()
+        max_bytes = max_upload_bytes("image")
+
+        async def receive_frames():
             try:
-                image = read_image_bytes(content, task)
-                print(f"Successfully read image with shape: {image.shape}")
-                
-                if task == "detection":
-                    print("Loading YOLO model...")
-                    try:
-                        model = YOLO('yolov8n.pt')
-                        print("Model loaded successfully")
-                    except Exception as e:
-                        print(f"Error loading model: {str(e)}")
-                        return {"error": f"Failed to load YOLO model: {str(e)}"}
-                    
-                    print("Running detection...")
-                    try:
-                        result = model.predict(image, verbose=True)
-                        print(f"Detection complete. Found {len(result[0].boxes.cls)} objects")
-                    except Exception as e:
-                        print(f"Error during prediction: {str(e)}")
-                        return {"error": f"Failed to run detection: {str(e)}"}
-                    
-                    # Convert HEX to BGR properly
-                    color_hex = color.lstrip('#')
-                    if len(color_hex) == 3:
-                        color_hex = ''.join([c*2 for c in color_hex])
-                    color_bgr = tuple(int(color_hex[i:i+2], 16) for i in (4, 2, 0))  # RGB to BGR
-                    print(f"Using color BGR: {color_bgr}")
-                    
-                    # Create a copy of the image for drawing
-                    image_with_boxes = image.copy()
-                    print(f"Original image shape: {image.shape}")
-                    
-                    # Debug YOLO results
-                    print("\nYOLO Detection Results:")
-                    print(f"Number of boxes: {len(result[0].boxes.cls)}")
-                    
-                    # Use YOLO results directly
-                    boxes = result[0].boxes
-                    print(f"Boxes type: {type(boxes)}")
-                    print(f"Boxes attributes: {dir(boxes)}")
-                    
-                    for i in range(len(boxes)):
-                        box = boxes[i]
-                        confidence = float(box.conf)
-                        class_id = int(box.cls)
-                        class_name = names[class_id]
-                        
-                        print(f"\nObject {i+1}:")
-                        print(f"Class: {class_name} (ID: {class_id})")
-                        print(f"Confidence: {confidence}")
-                        print(f"Box coordinates: {box.xyxy[0]}")
-                        
-                        if class_name in selected_classes and confidence > threshold:
-                            # Get box coordinates in xyxy format
-                            x1, y1, x2, y2 = map(int, box.xyxy[0])
-                            print(f"Drawing box at: ({x1}, {y1}) to ({x2}, {y2})")
-                            
-                            # Draw rectangle
-                            cv2.rectangle(image_with_boxes, (x1, y1), (x2, y2), color_bgr, thickness)
-                            
-                            if show_confidence:
-                                cv2.putText(image_with_boxes, 
-                                    f"{confidence:.2f}",
-                                    (x2 - 30, y1 + 12), 
-                                    cv2.FONT_HERSHEY_SIMPLEX, 
-                                    0.5, 
-                                    color_bgr, 
-                                    1)
-
-                            if show_labels:
-                                cv2.putText(image_with_boxes, 
-                                    class_name, 
-                                    (x1 + 6, y1 + 12), 
-                                    cv2.FONT_HERSHEY_SIMPLEX, 
-                                    0.5, 
-                                    color_bgr, 
-                                    1)
-
-                    # Convert image to bytes
-                    print("\nConverting image to bytes...")
-                    try:
-                        output_image_rgb = cv2.cvtColor(image_with_boxes, cv2.COLOR_BGR2RGB)
-                        _, buffer = cv2.imencode('.png', output_image_rgb)
-                        image_bytes = buffer.tobytes()
-                        print(f"Image converted to bytes, length: {len(image_bytes)}")
-                    except Exception as e:
-                        print(f"Error converting image: {str(e)}")
-                        return {"error": f"Failed to convert image: {str(e)}"}
-                    
-                    print("=== Detection Process Completed ===")
-                    return {
-                        "image": image_bytes.hex(),
-                        "format": "png",
-                        "message": "Detection completed successfully"
-                    }
-                
-                elif task == "segmentation":
-                    print("Starting segmentation process...")
-                    try:
-                        # Load the model
-                        print("Loading YOLO segmentation model...")
-                        model = YOLO("yolov8n-seg.pt")
-                        print("Model loaded successfully")
-                        
-                        # Run prediction
-                        print("Running prediction...")
-                        results = model.predict(image, verbose=True)
-                        print(f"Prediction complete. Number of results: {len(results)}")
-                        
-                        if not results or len(results) == 0:
-                            print("No results returned from model")
-                            return {"error": "No segmentation results found"}
-                        
-                        # Get the first result
-                        result = results[0]
-                        print(f"Result type: {type(result)}")
-                        print(f"Result attributes: {dir(result)}")
-                        
-                        # Check for masks
-                        if not hasattr(result, 'masks') or result.masks is None:
-                            print("No masks found in results")
-                            return {"error": "No masks found in segmentation results"}
-                        
-                        print(f"Number of masks: {len(result.masks)}")
-                        
-                        # Create output image
-                        output_image = image.copy()
-                        
-                        # Prepare overlay for alpha blending
-                        overlay = output_image.copy()
-                        np.random.seed(42)  # For reproducible colors per run
-                        class_color_map = {}
-
-                        for i, (box, mask) in enumerate(zip(result.boxes, result.masks)):
-                            try:
-                                confidence = float(box.conf)
-                                class_id = int(box.cls)
-                                class_name = names[class_id]
-                                if confidence < threshold or class_name not in selected_classes:
-                                    continue
-                                # Generate or reuse color for this class
-                                if class_id not in class_color_map:
-                                    class_color_map[class_id] = tuple(np.random.randint(0, 255, 3).tolist())
-                                color = class_color_map[class_id]
-                                # Prepare mask
-                                mask_data = mask.data[0].cpu().numpy()
-                                mask_resized = cv2.resize(mask_data, (image.shape[1], image.shape[0]))
-                                mask_bin = (mask_resized > 0.5).astype(np.uint8)
-                                # Create colored mask
-                                colored_mask = np.zeros_like(output_image, dtype=np.uint8)
-                                for c in range(3):
-                                    colored_mask[:,:,c] = color[c]
-                                # Alpha blend mask
-                                alpha = 0.5
-                                overlay[mask_bin == 1] = cv2.addWeighted(output_image, 1-alpha, colored_mask, alpha, 0)[mask_bin == 1]
-                                # Draw label on colored rectangle
-                                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                                label = f"{class_name} {confidence:.2f}"
-                                (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-                                cv2.rectangle(overlay, (x1, y1 - th - 6), (x1 + tw, y1), color, -1)
-                                cv2.putText(overlay, label, (x1, y1 - 2), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255,255,255), 2)
-                            except Exception as e:
-                                print(f"Error processing detection {i}: {str(e)}")
-                                import traceback
-                                print(traceback.format_exc())
-                                continue
-                        
-                        output_image = overlay
-
-                        # Convert image to bytes
-                        print("\nConverting image to bytes...")
-                        try:
-                            # Convert BGR to RGB
-                            output_image_rgb = cv2.cvtColor(output_image, cv2.COLOR_BGR2RGB)
-                            # Encode image to bytes
-                            _, buffer = cv2.imencode('.png', output_image_rgb)
-                            image_bytes = buffer.tobytes()
-                            print(f"Image converted to bytes, length: {len(image_bytes)}")
-                        except Exception as e:
-                            print(f"Error converting image: {str(e)}")
-                            return {"error": f"Failed to convert image: {str(e)}"}
-                        
-                        return {
-                            "image": image_bytes.hex(),
-                            "format": "png",
-                            "message": "Segmentation completed successfully"
-                        }
-                        
-                    except Exception as e:
-                        print(f"Error during segmentation: {str(e)}")
-                        import traceback
-                        print(traceback.format_exc())
-                        return {"error": f"Error during segmentation: {str(e)}"}
-            
-            except Exception as e:
-                print(f"Error processing image: {str(e)}")
-                return {"error": str(e)}
-        
-        elif file_type == "video":
-            # Save the uploaded video
-            temp_file = "temp_video.mp4"
-            with open(temp_file, "wb") as f:
-                f.write(content)
-            
-            if task == "detection":
-                model = YOLO('yolov8l.pt')
-                result = model(temp_file)
-                
-                # Process video frames
-                cap = cv2.VideoCapture(temp_file)
-                width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                
-                output_file = "output.mp4"
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                out = cv2.VideoWriter(output_file, fourcc, 30, (width, height))
-                
-                color_bgr, color_rgb = hex_to_bgr(color)
-                
-                for idx_frame in range(len(result)):
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-                    
-                    for i in range(len(result[idx_frame].boxes.cls)):
-                        if names[int(result[idx_frame].boxes.cls[i])] in selected_classes:
-                            confidence = result[idx_frame].boxes.conf[i]
-                            if confidence > threshold:
-                                start_point_x = int(result[idx_frame].boxes.xywh[i][0]) - int(result[idx_frame].boxes.xywh[i][2] / 2)
-                                start_point_y = int(result[idx_frame].boxes.xywh[i][1]) - int(result[idx_frame].boxes.xywh[i][3] / 2)
-                                start_point = (start_point_x, start_point_y)
-                                end_point_x = start_point_x + int(result[idx_frame].boxes.xywh[i][2])
-                                end_point_y = start_point_y + int(result[idx_frame].boxes.xywh[i][3])
-                                end_point = (end_point_x, end_point_y)
-
-                                frame = cv2.rectangle(frame, start_point, end_point, color_bgr, thickness)
-
-                                if show_confidence:
-                                    frame = cv2.putText(frame, 
-                                        f"{confidence:.2f}%",
-                                        (end_point_x - 30, start_point_y + 12), 
-                                        cv2.FONT_HERSHEY_TRIPLEX, 
-                                        0.4, 
-                                        color_bgr, 
-                                        1)
-
-                                if show_labels:
-                                    object_name = names[int(result[idx_frame].boxes.cls[i])]
-                                    frame = cv2.putText(frame, 
-                                        object_name, 
-                                        (start_point_x + 6, start_point_y + 12), 
-                                        cv2.FONT_HERSHEY_TRIPLEX, 
-                                        0.4, 
-                                        color_bgr, 
-                                        1)
-                
-                    out.write(frame)
-                
-                cap.release()
-                out.release()
-                
-                with open(output_file, 'rb') as f:
-                    return {"video": f.read().hex()}
-                
-            elif task == "segmentation":
-                print("Loading YOLO segmentation model for video...")
-                model = YOLO("yolov8n-seg.pt")
-                result = model(temp_file)
-                
-                cap = cv2.VideoCapture(temp_file)
-                width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                
-                output_file = "output.mp4"
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                out = cv2.VideoWriter(output_file, fourcc, 30, (width, height))
-                
-                for idx_frame in range(len(result)):
-                    ret, frame = cap.read()
-                    if not ret:
+                while True:
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
                         break
-                    
-                    # Tworzymy kopię klatki do rysowania
-                    frame_with_masks = frame.copy()
-                    
-                    # Pobieramy maski i klasy dla aktualnej klatki
-                    masks = result[idx_frame].masks
-                    boxes = result[idx_frame].boxes
-                    
-                    # Tworzymy pustą maskę dla wszystkich obiektów
-                    combined_mask = np.zeros(frame.shape[:2], dtype=np.uint8)
-                    
-                    for i in range(len(masks)):
-                        if i < len(boxes):
-                            confidence = float(boxes[i].conf)
-                            class_id = int(boxes[i].cls)
-                            class_name = names[class_id]
-                            
-                            if class_name in selected_classes and confidence > threshold:
-                                # Pobieramy maskę i konwertujemy ją na numpy array
-                                mask = masks[i].data[0].cpu().numpy()
-                                mask = (mask * 255).astype(np.uint8)
-                                
-                                # Dodajemy maskę do combined_mask
-                                combined_mask = cv2.bitwise_or(combined_mask, mask)
-                                
-                                # Rysujemy kontur maski
-                                contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                                cv2.drawContours(frame_with_masks, contours, -1, color_bgr, thickness)
-                                
-                                if show_labels:
-                                    # Znajdujemy środek maski
-                                    M = cv2.moments(mask)
-                                    if M["m00"] != 0:
-                                        cX = int(M["m10"] / M["m00"])
-                                        cY = int(M["m01"] / M["m00"])
-                                        cv2.putText(frame_with_masks, 
-                                            class_name, 
-                                            (cX - 20, cY), 
-                                            cv2.FONT_HERSHEY_TRIPLEX, 
-                                            0.4, 
-                                            color_bgr, 
-                                            1)
-                    
-                    # Nakładamy maskę na klatkę z przezroczystością
-                    alpha = 0.3
-                    overlay = frame_with_masks.copy()
-                    overlay[combined_mask > 0] = color_bgr
-                    cv2.addWeighted(overlay, alpha, frame_with_masks, 1 - alpha, 0, frame_with_masks)
-                    
-                    out.write(frame_with_masks)
-                
-                cap.release()
-                out.release()
-                
-                with open(output_file, 'rb') as f:
-                    return {"video": f.read().hex()}
-        
-        return {"error": "Unsupported file type or task"}
-    except Exception as e:
-        print(f"Unexpected error: {str(e)}")
-        return {"error": str(e)} 
\ No newline at end of file
+                    content = message.get("bytes")
+                    if content is None:
+                        # Text messages are not part of the protocol
+                        continue
+                    session.frame_received(frames.put((session.received, content, time.perf_counter())))
+            finally:
+                frames.close()
+
+        receiver = asyncio.create_task(receive_frames())
+        try:
+            while True:
+                item = await frames.get()
+                if item is None:
+                    break
+                index, content, received_at = item
+                image_bytes = None
+                try:
+                    if len(content) > max_bytes:
+                        raise DetectionError(f"Frame exceeds the {max_bytes / (1024 * 1024):g} MB limit")
+                    payload, image_bytes = await detect_live_frame(content, task, selected_classes, threshold, options,
+                                                                   include_masks, drawing)
+                    message = {"frame": index, **payload}
+                    session.frame_done(time.perf_counter() - received_at)
+                except Exception as e:
+                    if not isinstance(e, DetectionError):
+                        logger.exception("Live frame failed")
+                    message = {"frame": index, "error": str(e)}
+                    session.frame_done(time.perf_counter() - received_at, error=True)
+                message["stats"] = session.stats()
+                if frames.closed:
+                    break
+                await websocket.send_text(json.dumps(message, separators=(",", ":")))
+                if image_bytes is not None:
+                    await websocket.send_bytes(image_bytes)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            receiver.cancel()
+    finally:
+        live_sessions.discard(session)
+        logger.debug("Live connection closed", extra={"client": client, **session.stats()})
+
+
+@app.post("/api/jobs", status_code=202)
+async def create_job(
+    file: UploadFile = File(...),
+    task: str = Form("detection"),
+    selected_classes: str = Form(None),
+    threshold: float = Form(0.25),
+    show_labels: bool = Form(True),
+    show_confidence: bool = Form(True),
+    color: str = Form("#B9282B"),
+    thickness: int = Form(2),
+    stride: int = Form(None),
+    adaptive_stride: bool = Form(None),
+    tracker: str = Form(None),
+    motion_threshold: float = Form(None),
+    precision: str = Form(None)
+):
+    if task not in ("detection", "segmentation"):
+        raise HTTPException(status_code=400, detail=f"Unsupported task: {task}")
+    if (file.content_type or "").split('/')[0] != "video":
+        raise HTTPException(status_code=400, detail="Jobs accept video files only")
+    # Everything is validated before the upload is copied, so a bad field
+    # neither costs a full upload nor leaves a spooled file behind
+    try:
+        params = {
+            "selected_classes": job_classes(selected_classes),
+            "threshold": threshold,
+            "show_labels": show_labels,
+            "show_confidence": show_confidence,
+            "color": color,
+            "thickness": thickness,
+            **video_options(stride, adaptive_stride, tracker, motion_threshold, precision),
+        }
+        color_to_bgr(color)
+        if thickness < 1:
+            raise ValueError("thickness must be at least 1")
+    except (ValueError, BackendError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job_id = job_manager.new_job_id()
+    input_file = os.path.join(job_manager.job_dir(job_id), "input" + upload_suffix(file.filename))
+    try:
+        await spool_upload(file, input_file, max_upload_bytes("video"))
+        job_manager.submit(job_id, input_file, task, params)
+    except BaseException:
+        job_manager.delete(job_id)
+        raise
+    return job_status(job_manager.get(job_id))
+
+
+def job_classes(selected_classes):
+    """Class names of a job from its selected_classes form field (a JSON list; all classes when unset)."""
+    if selected_classes is None:
+        return names_list
+    try:
+        classes = json.loads(selected_classes)
+    except json.JSONDecodeError:
+        raise ValueError("selected_classes must be a JSON list of class names")
+    if not isinstance(classes, list) or not all(isinstance(name, str) for name in classes):
+        raise ValueError("selected_classes must be a JSON list of class names")
+    return classes
+
+
+def get_job_or_404(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    return job_status(get_job_or_404(job_id))
+
+
+@app.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = get_job_or_404(job_id)
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return FileResponse(job["output_path"], media_type=VIDEO_MEDIA_TYPE, filename=f"{job_id}.mp4")
+
+
+@app.delete("/api/jobs/{job_id}")
+async def delete_job(job_id: str):
+    job = get_job_or_404(job_id)
+    if job["status"] in ("queued", "running"):
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    job_manager.delete(job_id)
+    return {"id": job_id, "deleted": True}
@@ -0,0 +1,152 @@
+"""Prometheus metrics, rendered in the text exposition format by GET /metrics.
+
+A small self-contained implementation of counters, gauges and histograms with
+labels, so the backend needs no extra dependency. Metrics live in the process
+that records them; gauges are read from their source when scraped.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from profiling import current_profile
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds, from a fast image decode up to a long inference
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REGISTRY = []
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        return []
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, names, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(names, values)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [("", self.labels, key, value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(Metric):
+    """A gauge read at scrape time from collect(), which returns {label values: value}."""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labels=(), collect=None):
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+
+    def samples(self):
+        return [("", self.labels, key, value) for key, value in sorted(self.collect().items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        names = self.labels + ("le",)
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append(("_bucket", names, key + (format_value(bound),), cumulative))
+                samples.append(("_sum", self.labels, key, total))
+                samples.append(("_count", self.labels, key, cumulative))
+        return samples
+
+
+def render():
+    """All registered metrics in the Prometheus text format."""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+requests_total = Counter("argus_requests_total", "Detection requests by media type and task.", ["media", "task"])
+stage_seconds = Histogram("argus_stage_seconds", "Time spent in each stage of a request.",
+                          ["stage", "media", "task"])
+model_load_seconds = Histogram("argus_model_load_seconds", "Time to load (and export) a model, without warmup.",
+                               ["weights", "task", "backend"], buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+video_frames_total = Counter("argus_video_frames_total", "Video frames processed.", ["task"])
+video_fps = Histogram("argus_video_fps", "Frames per second of each processed video.", ["task"],
+                      buckets=(1, 2, 5, 10, 15, 24, 30, 60, 120, 240))
+live_frames_total = Counter("argus_live_frames_total", "Live WebSocket frames by outcome (processed, dropped, failed).",
+                            ["task", "outcome"])
+
+
+@contextmanager
+def timed_stage(stage, media_type, task):
+    """Record the time spent in the block as one stage of a request (when it does not raise)."""
+    start = time.perf_counter()
+    yield
+    seconds = time.perf_counter() - start
+    stage_seconds.observe(seconds, stage=stage, media=media_type, task=task)
+    profile = current_profile()
+    if profile is not None:
+        profile.add_stage(stage, seconds)
+
+
+def record_video(task, frames, seconds):
+    video_frames_total.inc(frames, task=task)
+    if seconds > 0:
+        video_fps.observe(frames / seconds, task=task)
@@ -0,0 +1,272 @@
+"""Process-wide registry of loaded YOLO models.
+
+Models are keyed by (weights file, task, backend) and shared between requests.
+Loaded models are kept in LRU order and evicted when the configured memory
+budget is exceeded. Non-torch backends are loaded from cached exports (see
+backends.py).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+import config
+from backends import INT8_BACKEND, PRECISIONS, BackendError, artifact_bytes, load_model
+from logs import get_logger
+from metrics import model_load_seconds
+
+logger = get_logger(__name__)
+
+# Ultralytics task names for the tasks used by the API
+YOLO_TASKS = {"detection": "detect", "segmentation": "segment"}
+
+
+def model_memory_bytes(model):
+    """Approximate memory held by the weights and buffers of a YOLO model."""
+    module = model.model
+    if isinstance(module, (str, os.PathLike)):
+        # Exported models are only loaded by the predictor; their file size
+        # is the closest estimate available up front
+        return artifact_bytes(module)
+    total = 0
+    for tensor in list(module.parameters()) + list(module.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class ModelEntry:
+    def __init__(self, key, model, load_seconds, warmup_seconds, memory_bytes):
+        self.key = key
+        self.model = model
+        self.load_seconds = load_seconds
+        self.warmup_seconds = warmup_seconds
+        self.memory_bytes = memory_bytes
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.uses = 0
+        self.active = 0
+        # Ultralytics predictors keep per-call state, so a shared model
+        # must not run two predictions at the same time
+        self.lock = threading.Lock()
+
+    def info(self):
+        weights, task, backend = self.key
+        return {
+            "weights": weights,
+            "task": task,
+            "backend": backend,
+            "load_seconds": round(self.load_seconds, 4),
+            "warmup_seconds": round(self.warmup_seconds, 4),
+            "memory_mb": round(self.memory_bytes / (1024 * 1024), 2),
+            "loaded_at": self.loaded_at,
+            "last_used": self.last_used,
+            "uses": self.uses,
+            "active": self.active,
+        }
+
+
+class LeasedModel:
+    """A resident model whose predict() calls each hold the model's lock.
+
+    Lets long-running work such as a video share the model with other
+    requests between frames instead of locking it for its whole run.
+    predict() must not be called with stream=True, since the lock would be
+    released before the results are produced.
+    """
+
+    def __init__(self, entry):
+        self._entry = entry
+
+    def predict(self, source, **kwargs):
+        with self._entry.lock:
+            return self._entry.model.predict(source, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._entry.model, name)
+
+
+class ModelRegistry:
+    def __init__(self, memory_budget_mb=0, warmup=True, warmup_size=640, export_size=640):
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self.warmup = warmup
+        self.warmup_size = warmup_size
+        self.export_size = export_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.evictions = 0
+
+    def _load(self, key):
+        weights, task, backend = key
+        start = time.perf_counter()
+        model = load_model(weights, YOLO_TASKS.get(task, task), backend, self.export_size)
+        load_seconds = time.perf_counter() - start
+        model_load_seconds.observe(load_seconds, weights=weights, task=task, backend=backend)
+
+        warmup_seconds = self._warm_up(model) if self.warmup else 0.0
+        logger.info("Loaded model", extra={"weights": weights, "task": task, "backend": backend,
+                                           "load_seconds": round(load_seconds, 3),
+                                           "warmup_seconds": round(warmup_seconds, 3)})
+        return ModelEntry(key, model, load_seconds, warmup_seconds, model_memory_bytes(model))
+
+    def _warm_up(self, model):
+        start = time.perf_counter()
+        dummy = np.zeros((self.warmup_size, self.warmup_size, 3), dtype=np.uint8)
+        model.predict(dummy, verbose=False)
+        return time.perf_counter() - start
+
+    def warm_up(self):
+        """Run the warmup inference on every resident model, e.g. in a worker
+        forked after the models were loaded without it."""
+        with self._lock:
+            entries = list(self._entries.values())
+        for entry in entries:
+            with entry.lock:
+                entry.warmup_seconds = self._warm_up(entry.model)
+
+    def _evict(self, keep):
+        if not self.memory_budget_bytes:
+            return
+        used = sum(entry.memory_bytes for entry in self._entries.values())
+        for key in list(self._entries):
+            if used <= self.memory_budget_bytes:
+                break
+            entry = self._entries[key]
+            if key == keep or entry.active:
+                continue
+            used -= entry.memory_bytes
+            del self._entries[key]
+            self.evictions += 1
+
+    def _entry(self, weights, task, backend="torch"):
+        key = (weights, task, backend)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Load outside the registry lock so other models stay available,
+        # but only once per key when several requests race for it
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is None:
+                entry = self._load(key)
+                with self._lock:
+                    self._entries[key] = entry
+                    self._evict(keep=key)
+        return entry
+
+    def get(self, weights, task, backend="torch"):
+        """Return the shared model for (weights, task, backend), loading it if needed."""
+        entry = self._entry(weights, task, backend)
+        with self._lock:
+            entry.uses += 1
+            entry.last_used = time.time()
+        return entry.model
+
+    @contextmanager
+    def use(self, weights, task, backend="torch"):
+        """Like get(), but holds the model exclusively and keeps it from
+        being evicted until the block exits."""
+        entry = self._entry(weights, task, backend)
+        with self._lock:
+            entry.uses += 1
+            entry.active += 1
+            entry.last_used = time.time()
+        try:
+            with entry.lock:
+                yield entry.model
+        finally:
+            with self._lock:
+                entry.active -= 1
+
+    @contextmanager
+    def lease(self, weights, task, backend="torch"):
+        """Like use(), but only each predict() call holds the model (see
+        LeasedModel); it is kept from being evicted until the block exits."""
+        entry = self._entry(weights, task, backend)
+        with self._lock:
+            entry.uses += 1
+            entry.active += 1
+            entry.last_used = time.time()
+        try:
+            yield LeasedModel(entry)
+        finally:
+            with self._lock:
+                entry.active -= 1
+
+    def preload(self, specs):
+        """Load (weights, task, backend) triples ahead of the first request."""
+        for weights, task, backend in specs:
+            self._entry(weights, task, backend)
+
+    def resident(self):
+        with self._lock:
+            return [entry.info() for entry in self._entries.values()]
+
+    def stats(self):
+        models = self.resident()
+        return {
+            "models": models,
+            "memory_mb": round(sum(m["memory_mb"] for m in models), 2),
+            "memory_budget_mb": self.memory_budget_bytes / (1024 * 1024) or None,
+            "evictions": self.evictions,
+        }
+
+
+registry = ModelRegistry(
+    memory_budget_mb=config.MODEL_MEMORY_BUDGET_MB,
+    warmup=config.WARMUP_MODELS,
+    warmup_size=config.WARMUP_IMAGE_SIZE,
+    export_size=config.EXPORT_IMAGE_SIZE,
+)
+
+
+def resolve_precision(precision=None):
+    precision = precision or config.MODEL_PRECISION
+    if precision not in PRECISIONS:
+        raise BackendError(f"Unsupported precision: {precision}")
+    return precision
+
+
+def model_spec(media_type, task, precision=None):
+    """(weights, task, backend) configured for the media type, task and precision."""
+    backend = config.MODEL_BACKENDS[(media_type, task)]
+    if resolve_precision(precision) == "int8":
+        backend = INT8_BACKEND
+    return config.MODEL_WEIGHTS[(media_type, task)], task, backend
+
+
+def get_model(media_type, task, precision=None):
+    """Shared model configured for the given media type and task."""
+    return registry.get(*model_spec(media_type, task, precision))
+
+
+def use_model(media_type, task, precision=None):
+    """Exclusive access to the model configured for the media type and task."""
+    return registry.use(*model_spec(media_type, task, precision))
+
+
+def lease_model(media_type, task, precision=None):
+    """The model configured for the media type and task, locked per predict() call."""
+    return registry.lease(*model_spec(media_type, task, precision))
+
+
+def predict(media_type, task, source, precision=None, **kwargs):
+    with use_model(media_type, task, precision) as model:
+        return model.predict(source, **kwargs)
+
+
+def preload_configured_models():
+    specs = []
+    for media_type, task in config.MODEL_WEIGHTS:
+        spec = model_spec(media_type, task)
+        if spec not in specs:
+            specs.append(spec)
+    registry.preload(specs)
@@ -0,0 +1,165 @@
+"""Shared class filtering and box post-processing for YOLO results.
+
+Selected class names are turned into class indices once and passed to
+predict() as classes=/conf=, so unwanted boxes are dropped inside NMS. The
+boxes that remain are moved to NumPy in a single transfer and handled as
+arrays.
+"""
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+from classes import names
+
+name_to_id = {name: class_id for class_id, name in names.items()}
+
+
+@lru_cache(maxsize=256)
+def _class_indices(selected):
+    ids = sorted({name_to_id[name] for name in selected if name in name_to_id})
+    # No filter at all when every class is selected
+    return None if len(ids) == len(names) else ids
+
+
+def class_indices(selected_classes):
+    """Class ids for the selected class names, or None for all classes."""
+    if selected_classes is None:
+        return None
+    return _class_indices(tuple(selected_classes))
+
+
+def predict_options(selected_classes, threshold):
+    """Keyword arguments that make predict() apply the class and confidence filters."""
+    options = {"conf": threshold}
+    ids = class_indices(selected_classes)
+    if ids is not None:
+        options["classes"] = ids
+    return options
+
+
+class Detections:
+    """Boxes of one result as arrays: xyxy (N, 4) int, conf (N,), cls (N,) int.
+
+    index holds each row's position in the original result, e.g. to pick the
+    matching masks. ids holds track ids (-1 for untracked rows) when the
+    detections come from a tracker, otherwise None.
+    """
+
+    def __init__(self, xyxy, conf, cls, index, ids=None):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+        self.index = index
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.cls)
+
+    def to_list(self):
+        items = [
+            {
+                "class": names[int(class_id)],
+                "class_id": int(class_id),
+                "confidence": round(float(confidence), 4),
+                "box": [int(v) for v in box],
+            }
+            for box, confidence, class_id in zip(self.xyxy, self.conf, self.cls)
+        ]
+        if self.ids is not None:
+            for item, track_id in zip(items, self.ids.tolist()):
+                item["track_id"] = track_id
+        return items
+
+
+def extract_detections(result, selected_classes=None, threshold=None, inclusive=False):
+    """Filtered detections of a Results object.
+
+    predict() has normally applied the filters already; they are applied here
+    again so results produced without them are handled the same way.
+    """
+    data = result.boxes.data.cpu().numpy() if result.boxes is not None else np.zeros((0, 6))
+    conf = data[:, -2]
+    cls = data[:, -1].astype(int)
+    keep = np.ones(len(data), dtype=bool)
+    if threshold is not None:
+        keep &= conf >= threshold if inclusive else conf > threshold
+    ids = class_indices(selected_classes)
+    if ids is not None:
+        keep &= np.isin(cls, ids)
+    index = np.flatnonzero(keep)
+    return Detections(data[index, :4].astype(int), conf[index], cls[index], index)
+
+
+def draw_boxes(image, detections, color_bgr, thickness, show_labels, show_confidence,
+               font=cv2.FONT_HERSHEY_SIMPLEX, font_scale=0.5, text_color=None, confidence_format="{:.2f}"):
+    """Draw boxes with optional class labels and confidences onto image in place."""
+    text_color = color_bgr if text_color is None else text_color
+    ids = detections.ids.tolist() if detections.ids is not None else [-1] * len(detections)
+    for (x1, y1, x2, y2), confidence, class_id, track_id in zip(detections.xyxy.tolist(), detections.conf.tolist(),
+                                                                 detections.cls.tolist(), ids):
+        cv2.rectangle(image, (x1, y1), (x2, y2), color_bgr, thickness)
+
+        if show_confidence:
+            cv2.putText(image,
+                confidence_format.format(confidence),
+                (x2 - 30, y1 + 12),
+                font,
+                font_scale,
+                text_color,
+                1)
+
+        if show_labels:
+            cv2.putText(image,
+                names[class_id] if track_id < 0 else f"{names[class_id]} #{track_id}",
+                (x1 + 6, y1 + 12),
+                font,
+                font_scale,
+                text_color,
+                1)
+    return image
+
+
+def mask_polygons(result, detections):
+    """Mask outlines of the kept detections as (K, 2) arrays in image coordinates."""
+    if result.masks is None:
+        return [np.zeros((0, 2), dtype=np.float32) for _ in range(len(detections))]
+    polygons = result.masks.xy
+    return [np.asarray(polygons[i], dtype=np.float32) for i in detections.index]
+
+
+def detection_columns(detections, polygons=None):
+    """Detections as parallel arrays, ready to be sent as JSON."""
+    columns = {
+        "count": len(detections),
+        "boxes": detections.xyxy.tolist(),
+        "class_ids": detections.cls.tolist(),
+        "scores": np.round(detections.conf.astype(np.float64), 4).tolist(),
+    }
+    if detections.ids is not None:
+        columns["track_ids"] = detections.ids.tolist()
+    if polygons is not None:
+        # Flat [x0, y0, x1, y1, ...] outline per instance
+        columns["masks"] = [np.round(polygon, 1).ravel().tolist() for polygon in polygons]
+    return columns
+
+
+def detection_arrays(detections, polygons=None):
+    """Detections as typed NumPy arrays for the binary (npz) layout.
+
+    Mask outlines are concatenated into mask_points, with mask_offsets[i]:
+    mask_offsets[i + 1] selecting the points of instance i.
+    """
+    arrays = {
+        "boxes": detections.xyxy.astype(np.int32).reshape(-1, 4),
+        "class_ids": detections.cls.astype(np.int16),
+        "scores": detections.conf.astype(np.float32),
+    }
+    if detections.ids is not None:
+        arrays["track_ids"] = detections.ids.astype(np.int32)
+    if polygons is not None:
+        lengths = [len(polygon) for polygon in polygons]
+        arrays["mask_offsets"] = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int32)
+        arrays["mask_points"] = (np.concatenate(polygons).astype(np.float32) if polygons
+                                 else np.zeros((0, 2), dtype=np.float32))
+    return arrays
@@ -0,0 +1,81 @@
+"""Opt-in profiling of single /api/detect requests.
+
+A profiled request carries a RequestProfile in a context variable. Stages
+timed with metrics.timed_stage() add their duration to it, and every call the
+request makes through a thread WorkerPool runs under cProfile, with the
+results merged into one pstats file per request in config.PROFILE_DIR.
+Profiled requests skip micro-batching, so their model calls are captured
+together with the rest of the request. cProfile can only run once at a time,
+so concurrent profiled calls take turns.
+
+Requests without the flag only pay for reading the context variable.
+"""
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar("argus_profile", default=None)
+_profiler_lock = threading.Lock()
+
+
+def current_profile():
+    """RequestProfile of the request being handled, or None when it is not profiled."""
+    return _current.get()
+
+
+@contextmanager
+def profiling(profile):
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.stages = {}
+        self.stats = None
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn under cProfile and add its profile to the request's."""
+        with _profiler_lock:
+            profiler = cProfile.Profile()
+            try:
+                return profiler.runcall(fn, *args, **kwargs)
+            finally:
+                with self._lock:
+                    if self.stats is None:
+                        self.stats = pstats.Stats(profiler)
+                    else:
+                        self.stats.add(profiler)
+
+    def finish(self, directory):
+        """Summary of the request's timings, saving the profile to directory."""
+        total = time.perf_counter() - self._start
+        summary = {
+            "id": self.id,
+            "total_ms": round(total * 1000, 2),
+            "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in self.stages.items()},
+        }
+        os.makedirs(directory, exist_ok=True)
+        if self.stats is not None:
+            path = os.path.join(directory, f"{self.id}.prof")
+            self.stats.dump_stats(path)
+            summary["profile"] = path
+        with open(os.path.join(directory, f"{self.id}.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        return summary
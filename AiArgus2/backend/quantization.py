@@ -0,0 +1,88 @@
+"""Post-training INT8 quantization of exported ONNX models.
+
+The FP32 ONNX export is quantized statically with ONNX Runtime (QDQ format,
+per-channel INT8 weights and activations). Activation ranges are calibrated on
+a small local image set, preprocessed exactly like Ultralytics does at predict
+time. The detection head (the last module) is kept in FP32, since quantizing
+its box and class outputs costs the most accuracy for the least speed.
+"""
+import hashlib
+import os
+import re
+
+import cv2
+import numpy as np
+from ultralytics.data.augment import LetterBox
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def calibration_images(directory, limit):
+    """Sorted image paths of the calibration set, at most limit of them."""
+    if not directory or not os.path.isdir(directory):
+        return []
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                   if name.lower().endswith(IMAGE_EXTENSIONS))
+    return paths[:limit]
+
+
+def calibration_hash(paths):
+    """Short hash identifying a calibration set by file names, sizes and mtimes."""
+    hasher = hashlib.blake2b(digest_size=6)
+    for path in paths:
+        stat = os.stat(path)
+        hasher.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime}".encode())
+    return hasher.hexdigest()
+
+
+def preprocess(image, imgsz):
+    """BGR image as the (1, 3, imgsz, imgsz) float tensor the exported model expects."""
+    image = LetterBox((imgsz, imgsz), auto=False)(image=image)
+    image = image[:, :, ::-1].transpose(2, 0, 1)
+    return np.ascontiguousarray(image, dtype=np.float32)[None] / 255.0
+
+
+def head_nodes(model_path):
+    """Names of the nodes of the last module (the detection/segmentation head)."""
+    import onnx
+
+    model = onnx.load(model_path)
+    modules = {}
+    for node in model.graph.node:
+        match = re.match(r"/model\.(\d+)/", node.name)
+        if match:
+            modules.setdefault(int(match.group(1)), []).append(node.name)
+    return modules[max(modules)] if modules else []
+
+
+def quantize_model(fp32_path, int8_path, images, imgsz):
+    """Write an INT8 copy of the FP32 ONNX model at fp32_path, calibrated on images."""
+    import onnx
+    from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType,
+                                          quantize_static)
+
+    class Reader(CalibrationDataReader):
+        def __init__(self, input_name):
+            self.input_name = input_name
+            self.paths = iter(images)
+
+        def get_next(self):
+            for path in self.paths:
+                image = cv2.imread(path)
+                if image is not None:
+                    return {self.input_name: preprocess(image, imgsz)}
+            return None
+
+    input_name = onnx.load(fp32_path).graph.input[0].name
+    quantize_static(
+        fp32_path,
+        int8_path,
+        Reader(input_name),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        nodes_to_exclude=head_nodes(fp32_path),
+        calibrate_method=CalibrationMethod.MinMax,
+    )
+    return int8_path
@@ -0,0 +1,98 @@
+"""Drawing and serialization of the results of one image.
+
+Shared by the API (main.py) and batch ingestion (ingest.py), so both produce
+the same annotated images and detection payloads.
+"""
+import cv2
+import numpy as np
+
+from classes import names
+from compositing import blend_labels, label_map
+from encoding import encode_image, image_format_name, npz_bytes
+from logs import get_logger
+from metrics import timed_stage
+from postprocess import detection_arrays, detection_columns, draw_boxes, extract_detections, mask_polygons
+from video import color_to_bgr
+
+logger = get_logger(__name__)
+
+
+class DetectionError(Exception):
+    pass
+
+
+def render_detection(image, result, selected_classes, threshold, show_labels, show_confidence, color, thickness):
+    detections = extract_detections(result, selected_classes, threshold)
+    image_with_boxes = draw_boxes(image.copy(), detections, color_to_bgr(color), thickness,
+                                  show_labels, show_confidence)
+    return image_with_boxes, detections.to_list()
+
+
+def render_segmentation(image, result, selected_classes, threshold):
+    # Check for masks
+    if not hasattr(result, 'masks') or result.masks is None:
+        raise DetectionError("No masks found in segmentation results")
+
+    detections = extract_detections(result, selected_classes, threshold, inclusive=True)
+
+    np.random.seed(42)  # For reproducible colors per run
+    class_color_map = {}
+    colors = []
+    for class_id in detections.cls.tolist():
+        # Generate or reuse color for this class
+        if class_id not in class_color_map:
+            class_color_map[class_id] = tuple(np.random.randint(0, 255, 3).tolist())
+        colors.append(class_color_map[class_id])
+
+    # Blend all masks at once
+    labels = label_map(result.masks.data[detections.index].cpu().numpy(), image.shape)
+    overlay = blend_labels(image, labels, colors, alpha=0.5)
+
+    for (x1, y1, x2, y2), confidence, class_id, color in zip(detections.xyxy.tolist(), detections.conf.tolist(),
+                                                             detections.cls.tolist(), colors):
+        # Draw label on colored rectangle
+        label = f"{names[class_id]} {confidence:.2f}"
+        (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+        cv2.rectangle(overlay, (x1, y1 - th - 6), (x1 + tw, y1), color, -1)
+        cv2.putText(overlay, label, (x1, y1 - 2), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255,255,255), 2)
+
+    return overlay, detections.to_list()
+
+
+def render_image(image, result, task, selected_classes, threshold, show_labels, show_confidence, color, thickness,
+                 image_format="png", quality=None, response_format="json"):
+    with timed_stage("render", "image", task):
+        if task == "detection":
+            output_image, detections = render_detection(image, result, selected_classes, threshold,
+                                                        show_labels, show_confidence, color, thickness)
+        else:
+            output_image, detections = render_segmentation(image, result, selected_classes, threshold)
+
+    # Convert image to bytes
+    try:
+        with timed_stage("encode", "image", task):
+            image_bytes, media_type = encode_image(output_image, image_format, quality)
+        logger.debug("Encoded image", extra={"format": image_format, "bytes": len(image_bytes)})
+    except Exception as e:
+        logger.exception("Failed to convert image")
+        raise DetectionError(f"Failed to convert image: {str(e)}")
+
+    metadata = {
+        "format": image_format_name(image_format),
+        "message": f"{task.capitalize()} completed successfully",
+        "detections": detections,
+    }
+    if response_format == "json":
+        return dict(image=image_bytes.hex(), **metadata)
+    return image_bytes, media_type, metadata
+
+
+def detections_payload(shape, result, task, selected_classes, threshold, include_masks=False,
+                       detections_format="json"):
+    """Detections of one image of shape (height, width) without drawing or encoding anything."""
+    detections = extract_detections(result, selected_classes, threshold, inclusive=task == "segmentation")
+    polygons = mask_polygons(result, detections) if include_masks else None
+    height, width = shape
+    if detections_format == "npz":
+        return npz_bytes(detection_arrays(detections, polygons), width=width, height=height)
+    return {"task": task, "width": width, "height": height, "detections": detection_columns(detections, polygons)}
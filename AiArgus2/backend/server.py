@@ -0,0 +1,178 @@
+"""Multi-worker server for the backend, forking its workers from one parent.
+
+    python server.py --workers 4 --host 0.0.0.0 --port 8000
+
+The parent imports the app and loads the configured models once, then forks
+the workers, so they share the loaded weights copy-on-write instead of each
+loading its own copy. The CPU cores are split between the workers: each one
+sets torch's intra-op threads (and OpenCV's) to its share of the cores, with
+ARGUS_SERVER_INTEROP_THREADS inter-op threads, and can be pinned to those
+cores. All workers accept connections from one listening socket, and a worker
+that dies is replaced after the video jobs it was running are requeued. Needs
+os.fork, so it runs on Linux and macOS only.
+"""
+import argparse
+import gc
+import os
+import signal
+import time
+
+import cv2
+import torch
+import uvicorn
+
+import config
+from jobs import job_manager
+from logs import get_logger
+from main import app
+from model_registry import preload_configured_models, registry
+
+logger = get_logger("server")
+
+# A worker that dies sooner than this after starting is restarted with a delay
+MIN_WORKER_UPTIME = 1.0
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def cpu_shares(workers, threads=0):
+    """CPU ids of each worker, and the number of torch threads per worker.
+
+    threads=0 splits the available cores evenly. Workers that do not get a
+    core of their own share them round-robin.
+    """
+    cpus = available_cpus()
+    threads = threads or max(1, len(cpus) // workers)
+    shares = []
+    for index in range(workers):
+        share = {cpus[(index * threads + k) % len(cpus)] for k in range(threads)}
+        shares.append(sorted(share))
+    return shares, threads
+
+
+def set_threads(threads, interop_threads):
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(interop_threads)
+    except RuntimeError:
+        # Only possible before the process has run inter-op parallel work
+        logger.warning("Could not set inter-op threads", extra={"interop_threads": interop_threads})
+    cv2.setNumThreads(threads)
+
+
+def run_worker(index, sock, uvicorn_config, threads, interop_threads, cpus=None):
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    set_threads(threads, interop_threads)
+    # The parent loads the models without warmup so that it never starts
+    # torch's thread pools before forking
+    if registry.warmup:
+        registry.warm_up()
+    logger.info("Worker started", extra={"worker": index, "pid": os.getpid(), "threads": threads,
+                                         "interop_threads": interop_threads, "cpus": cpus})
+    uvicorn.Server(uvicorn_config).run(sockets=[sock])
+
+
+def serve(workers, host, port, threads=0, interop_threads=1, pin_cpus=False, log_level="info"):
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    shares, threads = cpu_shares(workers, threads)
+
+    # Load the models in the parent, single-threaded and without warmup
+    torch.set_num_threads(1)
+    if config.PRELOAD_MODELS:
+        warmup, registry.warmup = registry.warmup, False
+        try:
+            preload_configured_models()
+        finally:
+            registry.warmup = warmup
+    job_manager.recover()
+    job_manager.recover_on_start = False
+
+    uvicorn_config = uvicorn.Config(app, host=host, port=port, log_level=log_level)
+    sock = uvicorn_config.bind_socket()
+    # Keep the garbage collector from writing to (and so copying) the pages
+    # of every object the parent created
+    gc.freeze()
+
+    children = {}
+    stopping = False
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                run_worker(index, sock, uvicorn_config, threads, interop_threads,
+                           shares[index] if pin_cpus else None)
+            except BaseException:
+                logger.exception("Worker failed", extra={"worker": index})
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = (index, time.monotonic())
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                # SIGTERM lets uvicorn finish the requests in progress
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    logger.info("Starting workers", extra={"workers": workers, "threads": threads,
+                                           "interop_threads": interop_threads, "host": host, "port": port})
+    for index in range(workers):
+        spawn(index)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index, started = children.pop(pid, (None, 0.0))
+        if index is None:
+            continue
+        # Jobs the worker was running would otherwise stay running forever;
+        # the replacement worker (or the next start) picks them up again
+        requeued = job_manager.recover(worker_pids=[pid])
+        if stopping:
+            continue
+        logger.warning("Worker exited, restarting it",
+                       extra={"worker": index, "pid": pid, "exit_code": os.waitstatus_to_exitcode(status),
+                              "requeued_jobs": requeued})
+        if time.monotonic() - started < MIN_WORKER_UPTIME:
+            time.sleep(MIN_WORKER_UPTIME)
+        if not stopping:
+            spawn(index)
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=config.SERVER_WORKERS)
+    parser.add_argument("--threads", type=int, default=config.SERVER_THREADS,
+                        help="torch threads per worker (0 splits the cores evenly)")
+    parser.add_argument("--interop-threads", type=int, default=config.SERVER_INTEROP_THREADS)
+    parser.add_argument("--pin-cpus", action="store_true", default=config.SERVER_PIN_CPUS,
+                        help="pin each worker to its share of the cores")
+    parser.add_argument("--log-level", default="info", help="uvicorn's log level")
+    args = parser.parse_args()
+    serve(args.workers, args.host, args.port, threads=args.threads, interop_threads=args.interop_threads,
+          pin_cpus=args.pin_cpus, log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
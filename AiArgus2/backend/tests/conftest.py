@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+# The backend modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def local_weights():
+    """Skips the test unless the weights configured for (media_type, task) are present locally."""
+    from model_registry import model_spec
+
+    def require(media_type, task):
+        weights = model_spec(media_type, task)[0]
+        if not os.path.exists(weights):
+            pytest.skip(f"{weights} not found (set ARGUS_{media_type.upper()}_{task.upper()}_WEIGHTS)")
+        return weights
+
+    return require
+
+
+@pytest.fixture
+def api_client(tmp_path, monkeypatch):
+    """TestClient for the app with its temporary and job files under tmp_path, and models loaded lazily."""
+    import config
+    import main
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(config, "TEMP_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "PRELOAD_MODELS", False)
+    monkeypatch.setattr(main.job_manager, "jobs_dir", str(tmp_path / "jobs"))
+    monkeypatch.setattr(main.job_manager, "db_path", str(tmp_path / "jobs" / "jobs.sqlite3"))
+    with TestClient(main.app) as client:
+        yield client
+    main.job_manager.store.close()
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+import config
+from backends import load_model
+from benchmark import box_iou, synthetic_frame
+from model_registry import YOLO_TASKS
+from postprocess import detection_columns, extract_detections
+
+# Runtime each exported backend needs
+RUNTIMES = {"onnx": "onnxruntime", "openvino": "openvino"}
+# Low enough that even untrained weights produce boxes to compare
+CONFIDENCE = 0.05
+# Boxes this close to the threshold may fall on either side of it in another runtime
+MARGIN = 0.02
+MIN_IOU = 0.9
+MAX_SCORE_DIFFERENCE = 0.02
+# Largest difference of the raw predictions: box coordinates in pixels, class scores
+MAX_BOX_DIFFERENCE = 0.5
+MAX_RAW_SCORE_DIFFERENCE = 1e-3
+
+
+def images():
+    return [synthetic_frame(index * 7, 640, 480) for index in range(4)]
+
+
+def columns(model):
+    return [detection_columns(extract_detections(model.predict(image, verbose=False, conf=CONFIDENCE)[0]))
+            for image in images()]
+
+
+def unmatched(reference, other):
+    """Boxes of reference clearly above the threshold with no close box of the same class in other."""
+    missing = []
+    for ref, cand in zip(reference, other):
+        for row in range(ref["count"]):
+            if ref["scores"][row] < CONFIDENCE + MARGIN:
+                continue
+            if cand["count"]:
+                overlaps = box_iou(np.asarray(ref["boxes"])[row], cand["boxes"])[0]
+                close = ((overlaps >= MIN_IOU)
+                         & (np.asarray(cand["class_ids"]) == ref["class_ids"][row])
+                         & (np.abs(np.asarray(cand["scores"]) - ref["scores"][row]) <= MAX_SCORE_DIFFERENCE))
+                if close.any():
+                    continue
+            missing.append((ref["class_ids"][row], ref["scores"][row]))
+    return missing
+
+
+def raw_predictions(model, image):
+    """Predictions of model for image before confidence filtering and NMS, as (1, 4 + classes, anchors)."""
+    model.predict(image, verbose=False)
+    predictor = model.predictor
+    output = predictor.model(predictor.preprocess([image]))
+    if isinstance(output, (list, tuple)):
+        output = output[0]
+    return output.cpu().numpy() if hasattr(output, "cpu") else np.asarray(output)
+
+
+@pytest.fixture(scope="module")
+def export_dir(tmp_path_factory):
+    previous = config.EXPORT_DIR
+    config.EXPORT_DIR = str(tmp_path_factory.mktemp("exports"))
+    yield config.EXPORT_DIR
+    config.EXPORT_DIR = previous
+
+
+@pytest.mark.parametrize("backend", ["onnx", "openvino"])
+def test_backend_matches_torch(backend, export_dir, local_weights):
+    pytest.importorskip(RUNTIMES[backend])
+    weights = local_weights("image", "detection")
+    task = YOLO_TASKS["detection"]
+    torch_model = load_model(weights, task, "torch")
+    exported_model = load_model(weights, task, backend, config.EXPORT_IMAGE_SIZE)
+
+    # Square frames are letterboxed the same way for every backend, so the
+    # raw outputs line up anchor by anchor
+    square = synthetic_frame(3, config.EXPORT_IMAGE_SIZE, config.EXPORT_IMAGE_SIZE)
+    reference, exported = raw_predictions(torch_model, square), raw_predictions(exported_model, square)
+    assert reference.shape == exported.shape
+    assert np.abs(reference[:, :4] - exported[:, :4]).max() <= MAX_BOX_DIFFERENCE
+    assert np.abs(reference[:, 4:] - exported[:, 4:]).max() <= MAX_RAW_SCORE_DIFFERENCE
+
+    reference, exported = columns(torch_model), columns(exported_model)
+    assert unmatched(reference, exported) == []
+    assert unmatched(exported, reference) == []
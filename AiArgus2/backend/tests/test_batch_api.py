@@ -0,0 +1,75 @@
+import io
+import json
+import time
+import zipfile
+
+import cv2
+import numpy as np
+import pytest
+import torch
+from ultralytics.engine.results import Results
+
+import main
+from classes import names
+from workers import image_pool
+
+PNG = cv2.imencode(".png", np.zeros((32, 48, 3), dtype=np.uint8))[1].tobytes()
+
+
+@pytest.fixture
+def fake_predict(monkeypatch):
+    async def predict_one(image, task, options):
+        boxes = torch.tensor([[1.0, 2.0, 3.0, 4.0, 0.9, 0.0]])
+        return Results(image, path="", names=names, boxes=boxes)
+
+    monkeypatch.setattr(main, "predict_one", predict_one)
+
+
+def lines(response):
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def wait_for_cleanup(tmp_path):
+    # The work directory is removed in the background once the stream ends
+    for _ in range(50):
+        if not list(tmp_path.glob("argus-*")):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_batch_streams_one_line_per_image_then_stats(api_client, tmp_path, fake_predict):
+    files = [("files", ("a.png", PNG, "image/png")), ("files", ("bad.jpg", b"x", "image/jpeg")),
+             ("files", ("b.png", PNG, "image/png"))]
+    *items, last = lines(api_client.post("/api/detect/batch", files=files))
+    items.sort(key=lambda item: item["index"])
+    assert [item["name"] for item in items] == ["a.png", "bad.jpg", "b.png"]
+    assert items[0]["width"] == 48 and items[0]["height"] == 32
+    assert items[0]["detections"]["boxes"] == [[1, 2, 3, 4]]
+    assert items[1]["error"] == "Could not decode image"
+    assert last["stats"]["images"] == 3 and last["stats"]["errors"] == 1
+    assert image_pool.in_flight == 0
+    assert wait_for_cleanup(tmp_path)
+
+
+def test_batch_reads_images_from_an_archive(api_client, tmp_path, fake_predict):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("one.png", PNG)
+        archive.writestr("notes.txt", b"not an image")
+        archive.writestr("dir/two.png", PNG)
+    files = [("files", ("images.zip", buffer.getvalue(), "application/zip"))]
+    *items, last = lines(api_client.post("/api/detect/batch", files=files))
+    errors = {item["name"]: item.get("error") for item in items}
+    assert errors == {"one.png": None, "notes.txt": "Unsupported file type", "dir/two.png": None}
+    assert last["stats"]["images"] == 3 and last["stats"]["errors"] == 1
+    assert wait_for_cleanup(tmp_path)
+
+
+def test_a_busy_server_leaves_no_work_directory_behind(api_client, tmp_path, monkeypatch):
+    monkeypatch.setattr(image_pool, "in_flight", image_pool.max_in_flight)
+    response = api_client.post("/api/detect/batch", files=[("files", ("a.jpg", b"x", "image/jpeg"))])
+    assert response.status_code == 503
+    assert list(tmp_path.glob("argus-*")) == []
@@ -0,0 +1,77 @@
+import asyncio
+
+from batching import MicroBatcher
+
+
+class FakePool:
+    """Returns (image, options) for every image instead of running the model."""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    async def submit(self, fn, media_type, task, images, **options):
+        self.batches.append(list(images))
+        await asyncio.sleep(0)
+        if self.fail:
+            raise RuntimeError("inference failed")
+        options.pop("verbose")
+        return [(image, options) for image in images]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_requests_share_a_batch():
+    pool = FakePool()
+    batcher = MicroBatcher("image", "detection", pool, max_batch_size=8, max_wait_ms=50)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(index, conf=0.25) for index in range(5)))
+
+    results = run(main())
+    assert results == [(index, {"conf": 0.25}) for index in range(5)]
+    assert pool.batches == [[0, 1, 2, 3, 4]]
+    assert batcher.stats()["batch_sizes"] == {"5": 1}
+
+
+def test_batches_are_capped_at_max_batch_size():
+    pool = FakePool()
+    batcher = MicroBatcher("image", "detection", pool, max_batch_size=2, max_wait_ms=50)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(index) for index in range(5)))
+
+    assert [image for image, _ in run(main())] == list(range(5))
+    assert [len(batch) for batch in pool.batches] == [2, 2, 1]
+
+
+def test_requests_with_different_options_are_not_mixed():
+    pool = FakePool()
+    batcher = MicroBatcher("image", "detection", pool, max_batch_size=8, max_wait_ms=50)
+
+    async def main():
+        return await asyncio.gather(batcher.submit(0, conf=0.25), batcher.submit(1, conf=0.5),
+                                    batcher.submit(2, conf=0.25))
+
+    results = run(main())
+    assert results == [(0, {"conf": 0.25}), (1, {"conf": 0.5}), (2, {"conf": 0.25})]
+    assert pool.batches == [[0, 2], [1]]
+
+
+def test_a_failed_batch_fails_each_of_its_requests():
+    batcher = MicroBatcher("image", "detection", FakePool(fail=True), max_wait_ms=10)
+
+    async def main():
+        return await asyncio.gather(batcher.submit(0), batcher.submit(1), return_exceptions=True)
+
+    assert [str(error) for error in run(main())] == ["inference failed"] * 2
+
+
+def test_a_new_event_loop_gets_a_new_worker():
+    pool = FakePool()
+    batcher = MicroBatcher("image", "detection", pool, max_wait_ms=0)
+    assert run(batcher.submit(0))[0] == 0
+    assert run(batcher.submit(1))[0] == 1
+    assert pool.batches == [[0], [1]]
@@ -0,0 +1,50 @@
+import numpy as np
+
+from compositing import blend_labels, label_centroids, label_map, mask_region
+
+
+def test_mask_region_drops_the_letterbox_padding():
+    # A 320 x 640 image letterboxed into 640 x 640 has 160 rows of padding on each side
+    assert mask_region((640, 640), (320, 640)) == (160, 480, 0, 640)
+    assert mask_region((640, 640), (640, 320)) == (0, 640, 160, 480)
+    assert mask_region((160, 160), (640, 640)) == (0, 160, 0, 160)
+
+
+def test_later_instances_win_where_masks_overlap():
+    masks = np.zeros((2, 4, 4), dtype=np.float32)
+    masks[0, :, :3] = 1
+    masks[1, :, 2:] = 1
+    labels = label_map(masks, (4, 4))
+    assert labels.dtype == np.uint16
+    assert labels[0].tolist() == [1, 1, 2, 2]
+
+
+def test_label_map_is_cropped_and_scaled_to_the_image():
+    masks = np.zeros((1, 8, 8), dtype=np.float32)
+    masks[0, 2:6, :4] = 1
+    # The image is half as tall as wide, so rows 0-1 and 6-7 are padding
+    labels = label_map(masks, (16, 32))
+    assert labels.shape == (16, 32)
+    assert labels[:, :16].all()
+    assert not labels[:, 16:].any()
+
+
+def test_no_masks_give_an_empty_map():
+    assert not label_map(None, (3, 5)).any()
+    assert label_map(np.zeros((0, 4, 4)), (3, 5)).shape == (3, 5)
+
+
+def test_blend_only_touches_instances():
+    image = np.full((2, 2, 3), 100, dtype=np.uint8)
+    labels = np.array([[0, 1], [0, 0]], dtype=np.uint16)
+    out = blend_labels(image, labels, np.array([[0, 0, 200]]), alpha=0.5)
+    assert out[0, 0].tolist() == [100, 100, 100]
+    assert out[0, 1].tolist() == [50, 50, 150]
+
+
+def test_centroids_of_each_instance():
+    labels = np.zeros((4, 4), dtype=np.uint16)
+    labels[0, 0:2] = 1
+    centroids = label_centroids(labels, 2)
+    assert centroids[0].tolist() == [0.5, 0.0]
+    assert np.isnan(centroids[1]).all()
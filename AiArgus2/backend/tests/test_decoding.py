@@ -0,0 +1,53 @@
+import cv2
+import numpy as np
+import pytest
+import torch
+from ultralytics.engine.results import Results
+
+from classes import names
+from decoding import decode_image, image_header, reduction_factor, rescale_result
+
+
+def encoded(width, height, extension=".jpg"):
+    image = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    return cv2.imencode(extension, image)[1].tobytes()
+
+
+@pytest.mark.parametrize("width, height, target, factor", [
+    (4000, 3000, 640, 4), (6000, 4000, 640, 8), (1280, 720, 640, 2), (1000, 600, 640, 1), (640, 480, 640, 1),
+])
+def test_reduction_keeps_the_longer_side_at_the_target(width, height, target, factor):
+    assert reduction_factor(width, height, target) == factor
+
+
+def test_header_is_read_without_decoding():
+    assert image_header(encoded(300, 200)) == (300, 200, "JPEG")
+    assert image_header(b"not an image") is None
+
+
+@pytest.mark.parametrize("extension", [".jpg", ".png"])
+def test_reduced_decode_reports_the_full_shape(extension):
+    image, shape = decode_image(encoded(1300, 700, extension), target=320)
+    assert shape == (700, 1300)
+    # Reduced by 4, rounded up
+    assert image.shape == (175, 325, 3)
+
+
+def test_without_a_target_the_image_is_decoded_in_full():
+    image, shape = decode_image(encoded(1300, 700), target=None)
+    assert image.shape == (700, 1300, 3) and shape == (700, 1300)
+
+
+def test_undecodable_uploads_give_none():
+    assert decode_image(b"not an image", target=640) == (None, None)
+
+
+def test_rescaled_boxes_are_in_full_image_coordinates():
+    reduced = np.zeros((100, 200, 3), dtype=np.uint8)
+    result = Results(reduced, path="", names=names, boxes=torch.tensor([[10.0, 20.0, 30.0, 40.0, 0.9, 0.0]]))
+    rescaled = rescale_result(result, (400, 800))
+    assert rescaled.orig_shape == (400, 800)
+    assert rescaled.boxes.data[0, :4].tolist() == [40.0, 80.0, 120.0, 160.0]
+    assert rescaled.boxes.data[0, 4:].tolist() == pytest.approx([0.9, 0.0])
+    # The original result is left untouched
+    assert result.boxes.data[0, 0] == 10.0
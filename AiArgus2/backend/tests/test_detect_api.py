@@ -0,0 +1,52 @@
+import logging
+
+import pytest
+
+import config
+
+IMAGE = {"file": ("a.jpg", b"x", "image/jpeg")}
+VIDEO = {"file": ("clip.mp4", bytes(1024), "video/mp4")}
+
+
+@pytest.mark.parametrize("files, data, detail", [
+    (IMAGE, {"task": "foo"}, "Unsupported task: foo"),
+    (IMAGE, {"imgsz": "100"}, "imgsz must be a multiple of 32 between 32 and 4096"),
+    (IMAGE, {"precision": "fp64"}, "Unsupported precision: fp64"),
+    (IMAGE, {"tile_size": "8"}, "tile_size must be 0 (off) or at least 32"),
+    (IMAGE, {"image_format": "gif"}, "Unsupported image format: gif"),
+    (IMAGE, {"response_format": "xml"}, "Unsupported response format: xml"),
+    (VIDEO, {"tracker": "nope"}, "Unsupported tracker: nope"),
+])
+def test_invalid_fields_are_rejected_with_400(api_client, caplog, monkeypatch, files, data, detail):
+    monkeypatch.setattr(logging.getLogger("argus"), "propagate", True)
+    response = api_client.post("/api/detect", files=files, data=data)
+    assert response.status_code == 400
+    assert response.json() == {"detail": detail}
+    assert "Rejected detect request" in caplog.messages
+    assert max(record.levelno for record in caplog.records) < logging.WARNING
+
+
+def test_unknown_tasks_are_not_counted(api_client):
+    api_client.post("/api/detect", files=IMAGE, data={"task": "foo"})
+    assert 'task="foo"' not in api_client.get("/metrics").text
+
+
+def test_profiling_is_refused_without_a_token_or_allowed_client(api_client, monkeypatch):
+    monkeypatch.setattr(config, "PROFILE_TOKEN", "secret")
+    monkeypatch.setattr(config, "PROFILE_CLIENTS", [])
+    for headers in ({}, {"X-Profile-Token": "wrong"}):
+        response = api_client.post("/api/detect", files=IMAGE, data={"profile": "true"}, headers=headers)
+        assert response.status_code == 403
+
+
+@pytest.mark.parametrize("token, clients, headers", [
+    ("secret", [], {"X-Profile-Token": "secret"}),
+    (None, ["testclient"], {}),
+])
+def test_allowed_callers_get_a_profile(api_client, tmp_path, monkeypatch, token, clients, headers):
+    monkeypatch.setattr(config, "PROFILE_TOKEN", token)
+    monkeypatch.setattr(config, "PROFILE_CLIENTS", clients)
+    monkeypatch.setattr(config, "PROFILE_DIR", str(tmp_path / "profiles"))
+    response = api_client.post("/api/detect", files=IMAGE, data={"profile": "true"}, headers=headers)
+    assert response.status_code == 200
+    assert "total_ms" in response.json()["profile"]
@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+import config
+from encoding import EncodingError, encode_image, image_format_name, media_response, metadata_headers
+
+
+def noisy_image():
+    return np.random.default_rng(0).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("image_format, media_type", [
+    ("png", "image/png"), ("jpeg", "image/jpeg"), ("jpg", "image/jpeg"), ("webp", "image/webp"),
+])
+def test_images_decode_back_in_every_format(image_format, media_type):
+    data, returned_type = encode_image(noisy_image(), image_format)
+    assert returned_type == media_type
+    assert cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR).shape == (64, 64, 3)
+
+
+def test_format_names_are_normalized():
+    assert image_format_name(None) == "png"
+    assert image_format_name("JPG") == "jpeg"
+    with pytest.raises(EncodingError):
+        image_format_name("gif")
+
+
+@pytest.mark.parametrize("image_format", ["jpeg", "webp"])
+def test_quality_changes_the_size(image_format):
+    low, _ = encode_image(noisy_image(), image_format, quality=10)
+    high, _ = encode_image(noisy_image(), image_format, quality=95)
+    assert len(low) < len(high)
+
+
+def test_metadata_headers_are_truncated_over_the_limit(monkeypatch):
+    metadata = {"message": "ok", "detections": [{"label": "person"}] * 3}
+    headers = metadata_headers(metadata)
+    assert headers["X-Detection-Count"] == "3"
+    assert json.loads(headers["X-Detections"]) == metadata
+
+    monkeypatch.setattr(config, "MAX_METADATA_HEADER_BYTES", 10)
+    headers = metadata_headers(metadata)
+    assert "X-Detections" not in headers
+    assert headers["X-Detections-Truncated"] == "1"
+
+
+def test_binary_response_carries_the_media_and_headers():
+    response = media_response(b"media", "image/png", {"message": "ok", "detections": []}, "binary")
+    assert response.body == b"media"
+    assert response.media_type == "image/png"
+    assert response.headers["X-Detection-Count"] == "0"
+
+
+def test_multipart_response_has_metadata_then_media():
+    response = media_response(b"media", "image/png", {"message": "ok"}, "multipart")
+
+    async def body():
+        return b"".join([chunk async for chunk in response.body_iterator])
+
+    boundary = response.media_type.split("boundary=")[1]
+    parts = asyncio.run(body()).split(f"--{boundary}".encode())
+    assert parts[1] == b'\r\nContent-Type: application/json\r\n\r\n{"message":"ok"}\r\n'
+    assert parts[2] == b"\r\nContent-Type: image/png\r\n\r\nmedia\r\n"
+    assert parts[3] == b"--\r\n"
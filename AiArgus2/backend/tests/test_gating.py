@@ -0,0 +1,45 @@
+import numpy as np
+
+from gating import MotionGate
+
+
+def frame(value=0, changed=0.0):
+    image = np.full((120, 160, 3), value, dtype=np.uint8)
+    image[:, :int(160 * changed)] = 255
+    return image
+
+
+def test_without_a_reference_nothing_is_static():
+    gate = MotionGate(0.05)
+    assert gate.change(frame()) == 1.0
+    assert not gate.static(frame())
+
+
+def test_small_changes_are_static_and_large_ones_are_not():
+    gate = MotionGate(0.05)
+    gate.reset(frame())
+    assert gate.static(frame(changed=0.02))
+    assert not gate.static(frame(changed=0.5))
+
+
+def test_sensor_noise_below_pixel_delta_is_ignored():
+    gate = MotionGate(0.05, pixel_delta=12)
+    gate.reset(frame(100))
+    assert gate.change(frame(110)) == 0.0
+    assert gate.change(frame(120)) == 1.0
+
+
+def test_max_skip_forces_the_model_to_run():
+    gate = MotionGate(0.05, max_skip=2)
+    gate.reset(frame())
+    assert gate.static(frame())
+    assert gate.static(frame())
+    assert not gate.static(frame())
+    gate.reset(frame())
+    assert gate.static(frame())
+
+
+def test_grayscale_frames_are_accepted():
+    gate = MotionGate(0.05)
+    gate.reset(np.zeros((120, 160), dtype=np.uint8))
+    assert gate.static(np.zeros((120, 160), dtype=np.uint8))
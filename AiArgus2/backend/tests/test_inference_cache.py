@@ -0,0 +1,90 @@
+import asyncio
+
+import cv2
+import numpy as np
+
+import main
+from inference_cache import ENTRY_OVERHEAD, InferenceCache, cache_key, to_entry, to_result
+
+
+def entry(rows=1, masks=False):
+    result = {"boxes": np.arange(rows * 6, dtype=np.float32).reshape(rows, 6)}
+    if masks:
+        result["masks"] = np.ones((rows, 8, 8), dtype=bool)
+    return result
+
+
+def test_key_depends_on_content_and_options():
+    key = cache_key(b"image", "image", "detection", conf=0.1, imgsz=640)
+    assert key == cache_key(b"image", "image", "detection", imgsz=640, conf=0.1)
+    assert key != cache_key(b"other", "image", "detection", conf=0.1, imgsz=640)
+    assert key != cache_key(b"image", "image", "detection", conf=0.1, imgsz=1280)
+    assert key != cache_key(b"image", "image", "segmentation", conf=0.1, imgsz=640)
+
+
+def test_lookup_counts_hits_and_misses():
+    cache = InferenceCache(1024 * 1024)
+    key, cached = cache.lookup(b"image", "image", "detection", conf=0.1)
+    assert cached is None
+    cache.put(key, entry())
+    _, cached = cache.lookup(b"image", "image", "detection", conf=0.1)
+    np.testing.assert_array_equal(cached["boxes"], entry()["boxes"])
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_least_recently_used_entries_are_evicted_over_budget():
+    size = ENTRY_OVERHEAD + entry()["boxes"].nbytes
+    cache = InferenceCache(2 * size)
+    cache.put("a", entry())
+    cache.put("b", entry())
+    assert cache.get("a") is not None
+    cache.put("c", entry())
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.bytes == 2 * size
+    assert cache.evictions == 1
+
+
+def test_entries_larger_than_the_budget_are_not_kept():
+    cache = InferenceCache(ENTRY_OVERHEAD)
+    cache.put("a", entry())
+    assert cache.get("a") is None
+    assert cache.bytes == 0
+
+
+def test_disk_tier_survives_a_new_cache_and_is_trimmed(tmp_path):
+    cache = InferenceCache(0, disk_dir=str(tmp_path))
+    assert cache.enabled
+    cache.put("a", entry(masks=True))
+    restored = InferenceCache(1024 * 1024, disk_dir=str(tmp_path)).get("a")
+    np.testing.assert_array_equal(restored["masks"], entry(masks=True)["masks"])
+
+    small = InferenceCache(0, disk_dir=str(tmp_path), disk_max_bytes=1)
+    small.put("b", entry())
+    assert not list(tmp_path.glob("*.npz"))
+
+
+def test_entry_round_trip_keeps_boxes():
+    image = np.zeros((40, 60, 3), dtype=np.uint8)
+    original = entry(rows=2)
+    original["boxes"][:, 5] = [0, 2]
+    result = to_result(original, image)
+    np.testing.assert_array_equal(to_entry(result)["boxes"], original["boxes"])
+    assert result.masks is None
+
+
+def test_image_requests_keep_their_filters_in_predict_when_the_cache_is_off(monkeypatch):
+    seen = []
+
+    async def fake_predict(image, task, options, *tiles):
+        seen.append(options)
+        raise RuntimeError("stop")
+
+    monkeypatch.setattr(main, "predict_image", fake_predict)
+    monkeypatch.setattr(main.inference_cache, "max_bytes", 0)
+    monkeypatch.setattr(main.inference_cache, "disk_dir", None)
+    content = cv2.imencode(".png", np.zeros((64, 64, 3), dtype=np.uint8))[1].tobytes()
+    asyncio.run(main.detect_image(content, "detection", ["person"], 0.5, False, False, None, 0, render=False))
+    assert seen[0]["conf"] == 0.5
+    assert seen[0]["classes"] == [0]
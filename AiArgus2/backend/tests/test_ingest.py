@@ -0,0 +1,55 @@
+import os
+
+from ingest import Checkpoint, media_kind, replace_when_done, scan
+
+
+def test_media_kind_by_suffix():
+    assert media_kind("a/b.JPG") == "image"
+    assert media_kind("clip.mkv") == "video"
+    assert media_kind("notes.txt") is None
+
+
+def test_scan_skips_hidden_files_the_output_and_unsettled_files(tmp_path):
+    for name in ("b.jpg", "a.mp4", "notes.txt", ".hidden.jpg", "cam/c.png", ".cache/d.jpg", "out/e.jpg"):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x")
+    old = os.path.getmtime(tmp_path / "b.jpg") - 60
+    for name in ("b.jpg", "a.mp4", "cam/c.png"):
+        os.utime(tmp_path / name, (old, old))
+
+    found = [relative for _, relative, _, _ in scan(str(tmp_path), skip_dir=str(tmp_path / "out"))]
+    assert found == ["a.mp4", "b.jpg", "cam/c.png"]
+    settled = [relative for _, relative, _, _ in scan(str(tmp_path), skip_dir=str(tmp_path / "out"), settle=30)]
+    assert settled == ["a.mp4", "b.jpg", "cam/c.png"]
+    (tmp_path / "b.jpg").write_bytes(b"new")
+    settled = [relative for _, relative, _, _ in scan(str(tmp_path), skip_dir=str(tmp_path / "out"), settle=30)]
+    assert settled == ["a.mp4", "cam/c.png"]
+
+
+def test_checkpoint_skips_done_files_until_they_change(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "ingest.sqlite3"))
+    assert checkpoint.pending("a.jpg", 10, 1.0)
+    checkpoint.mark("a.jpg", 10, 1.0, "running")
+    # A file left running was interrupted and is processed again
+    assert checkpoint.pending("a.jpg", 10, 1.0)
+    checkpoint.mark("a.jpg", 10, 1.0, "done")
+    assert not checkpoint.pending("a.jpg", 10, 1.0)
+    assert checkpoint.pending("a.jpg", 11, 1.0)
+    assert checkpoint.pending("a.jpg", 10, 2.0)
+
+
+def test_checkpoint_retries_failed_files_only_when_asked(tmp_path):
+    path = str(tmp_path / "ingest.sqlite3")
+    checkpoint = Checkpoint(path)
+    checkpoint.mark("bad.jpg", 4, 1.0, "running")
+    checkpoint.mark("bad.jpg", 4, 1.0, "failed", error="Could not decode image")
+    # State survives reopening, as when a run is resumed
+    reopened = Checkpoint(path)
+    assert reopened.get("bad.jpg")["error"] == "Could not decode image"
+    assert not reopened.pending("bad.jpg", 4, 1.0)
+    assert reopened.pending("bad.jpg", 4, 1.0, retry_failed=True)
+
+
+def test_partial_outputs_keep_their_extension():
+    assert replace_when_done("/out/clip.mp4.annotated.mp4") == "/out/clip.mp4.annotated.partial.mp4"
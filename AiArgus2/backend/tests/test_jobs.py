@@ -0,0 +1,52 @@
+import os
+
+from jobs import JobManager, JobStore
+
+
+def store_with_jobs(path, count):
+    store = JobStore(str(path))
+    for index in range(count):
+        store.create(f"job{index}", "detection", {}, "in.mp4", "out.mp4")
+    return store
+
+
+def test_claim_runs_a_job_once_and_records_the_worker(tmp_path):
+    store = store_with_jobs(tmp_path / "jobs.sqlite3", 1)
+    assert store.claim("job0", 1.0)
+    assert not store.claim("job0", 2.0)
+    job = store.get("job0")
+    assert (job["status"], job["started_at"], job["worker_pid"]) == ("running", 1.0, os.getpid())
+
+
+def test_recover_requeues_only_the_jobs_of_dead_workers(tmp_path):
+    db_path = tmp_path / "jobs.sqlite3"
+    store = store_with_jobs(db_path, 3)
+    for index, pid in enumerate([101, 102]):
+        store.claim(f"job{index}", 1.0)
+        store.update(f"job{index}", worker_pid=pid, frames_done=5)
+
+    manager = JobManager(str(tmp_path), str(db_path))
+    assert manager.recover(worker_pids=[101]) == 1
+    assert [store.get(f"job{index}")["status"] for index in range(3)] == ["queued", "running", "queued"]
+    assert store.get("job0")["frames_done"] == 0
+    assert store.get("job0")["worker_pid"] is None
+
+    assert manager.recover() == 1
+    assert [job["id"] for job in store.with_status("queued")] == ["job0", "job1", "job2"]
+
+
+def test_databases_without_the_worker_column_are_migrated(tmp_path):
+    import sqlite3
+
+    db_path = tmp_path / "jobs.sqlite3"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, task TEXT NOT NULL, "
+                 "params TEXT NOT NULL, input_path TEXT NOT NULL, output_path TEXT NOT NULL, "
+                 "frames_done INTEGER NOT NULL DEFAULT 0, frames_total INTEGER NOT NULL DEFAULT 0, fps REAL, "
+                 "error TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL)")
+    conn.commit()
+    conn.close()
+    store = JobStore(str(db_path))
+    store.create("job0", "detection", {}, "in.mp4", "out.mp4")
+    assert store.claim("job0", 1.0)
+    assert store.get("job0")["worker_pid"] == os.getpid()
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import config
+import main
+from jobs import job_manager
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PRELOAD_MODELS", False)
+    monkeypatch.setattr(job_manager, "jobs_dir", str(tmp_path / "jobs"))
+    monkeypatch.setattr(job_manager, "db_path", str(tmp_path / "jobs" / "jobs.sqlite3"))
+    with TestClient(main.app) as client:
+        yield client
+    job_manager.store.close()
+
+
+def post_job(client, **fields):
+    return client.post("/api/jobs", files={"file": ("clip.mp4", bytes(1024), "video/mp4")}, data=fields)
+
+
+@pytest.mark.parametrize("fields", [
+    {"selected_classes": "not json"},
+    {"selected_classes": '"person"'},
+    {"selected_classes": "[1, 2]"},
+    {"color": "#zzzzzz"},
+    {"thickness": "0"},
+    {"tracker": "unknown"},
+    {"precision": "fp8"},
+])
+def test_invalid_fields_are_rejected_before_the_upload_is_kept(client, fields):
+    response = post_job(client, **fields)
+    assert response.status_code == 400
+    assert os.listdir(job_manager.jobs_dir) == ["jobs.sqlite3"]
+
+
+def test_a_failed_upload_leaves_no_job_behind(client, monkeypatch):
+    monkeypatch.setattr(config, "MAX_VIDEO_UPLOAD_MB", 0.0001)
+    response = post_job(client, selected_classes='["person"]')
+    assert response.status_code == 413
+    assert os.listdir(job_manager.jobs_dir) == ["jobs.sqlite3"]
+    assert job_manager.store.with_status("queued", "running", "done", "failed") == []
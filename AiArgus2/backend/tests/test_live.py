@@ -0,0 +1,89 @@
+import asyncio
+
+import config
+import main
+from live import LatestFrame, LiveSession
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_latest_frame_keeps_only_the_newest_frame():
+    async def scenario():
+        frames = LatestFrame()
+        assert not frames.put(1)
+        assert frames.put(2)
+        assert await frames.get() == 2
+        assert not frames.put(3)
+        return await frames.get()
+
+    assert run(scenario()) == 3
+
+
+def test_latest_frame_get_waits_for_a_frame_and_ends_when_closed():
+    async def scenario():
+        frames = LatestFrame()
+        waiting = asyncio.create_task(frames.get())
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        frames.put("frame")
+        assert await waiting == "frame"
+        frames.put("unsent")
+        frames.close()
+        return await frames.get()
+
+    assert run(scenario()) is None
+
+
+def test_session_counts_dropped_and_failed_frames():
+    session = LiveSession("detection")
+    for replaced in (False, True, True, False):
+        session.frame_received(replaced)
+    session.frame_done(0.01)
+    session.frame_done(0.02, error=True)
+    stats = session.stats()
+    assert (stats["received"], stats["dropped"], stats["processed"], stats["errors"]) == (4, 2, 1, 1)
+    assert stats["drop_ratio"] == 0.5
+    assert stats["latency_ms"] == 20.0
+    # fps needs at least two processed frames
+    assert stats["fps"] is None
+
+
+class FakeWebSocket:
+    """Accepts slowly and disconnects right away, like a client that sends nothing."""
+
+    client = None
+
+    def __init__(self):
+        self.accepted = False
+        self.close_code = None
+
+    async def accept(self):
+        await asyncio.sleep(0.01)
+        self.accepted = True
+
+    async def close(self, code=1000, reason=None):
+        self.close_code = code
+
+    async def receive(self):
+        await asyncio.sleep(0.05)
+        return {"type": "websocket.disconnect"}
+
+
+def test_connection_limit_holds_for_concurrent_handshakes(monkeypatch):
+    monkeypatch.setattr(config, "LIVE_MAX_CONNECTIONS", 2)
+    sockets = [FakeWebSocket() for _ in range(5)]
+
+    async def scenario():
+        await asyncio.gather(*(main.live_detection(websocket, task="detection", selected_classes=None,
+                                                   threshold=0.25, include_masks=False, precision=None,
+                                                   imgsz=None, render=False, image_format="jpeg", quality=None,
+                                                   show_labels=True, show_confidence=True, color="#B9282B",
+                                                   thickness=2)
+                               for websocket in sockets))
+
+    run(scenario())
+    assert sum(websocket.accepted for websocket in sockets) == 2
+    assert [websocket.close_code for websocket in sockets if not websocket.accepted] == [1013] * 3
+    assert not main.live_sessions
@@ -0,0 +1,73 @@
+import threading
+
+from model_registry import ModelEntry, ModelRegistry
+
+
+class FakeModel:
+    def __init__(self):
+        self.locked_during_predict = []
+        self.entry = None
+
+    def predict(self, source, **kwargs):
+        self.locked_during_predict.append(self.entry.lock.locked())
+        return [source]
+
+
+def registry_with(model):
+    registry = ModelRegistry(warmup=False)
+    key = ("fake.pt", "detection", "torch")
+    entry = ModelEntry(key, model, 0.0, 0.0, 0)
+    model.entry = entry
+    registry._entries[key] = entry
+    return registry, key, entry
+
+
+def test_use_holds_the_model_for_the_whole_block():
+    registry, key, entry = registry_with(FakeModel())
+    with registry.use(*key):
+        assert entry.lock.locked()
+        assert entry.active == 1
+    assert not entry.lock.locked()
+    assert entry.active == 0
+
+
+def test_lease_only_locks_the_model_during_predict():
+    model = FakeModel()
+    registry, key, entry = registry_with(model)
+    with registry.lease(*key) as leased:
+        assert not entry.lock.locked()
+        assert entry.active == 1
+        assert leased.predict("frame") == ["frame"]
+        assert leased.predict("frame") == ["frame"]
+        assert not entry.lock.locked()
+    assert model.locked_during_predict == [True, True]
+    assert entry.active == 0
+
+
+def test_lease_lets_other_requests_predict_between_frames():
+    registry, key, entry = registry_with(FakeModel())
+    with registry.lease(*key) as leased:
+        leased.predict("frame")
+        done = threading.Event()
+
+        def other_request():
+            with registry.use(*key) as model:
+                model.predict("image")
+            done.set()
+
+        thread = threading.Thread(target=other_request)
+        thread.start()
+        assert done.wait(5)
+        thread.join()
+        leased.predict("frame")
+
+
+def test_leased_model_is_not_evicted():
+    registry, key, entry = registry_with(FakeModel())
+    registry.memory_budget_bytes = 1
+    entry.memory_bytes = 10
+    with registry.lease(*key):
+        registry._evict(keep=None)
+        assert key in registry._entries
+    registry._evict(keep=None)
+    assert key not in registry._entries
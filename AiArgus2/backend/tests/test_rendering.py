@@ -0,0 +1,51 @@
+import io
+
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+from classes import names
+from rendering import detections_payload
+
+
+def result(masks=False):
+    boxes = torch.tensor([[10.0, 20.0, 30.0, 40.0, 0.9, 0.0], [0.0, 0.0, 5.0, 5.0, 0.3, 2.0]])
+    mask_data = None
+    if masks:
+        mask_data = torch.zeros((2, 64, 64))
+        mask_data[0, 20:40, 10:30] = 1
+    return Results(np.zeros((64, 64, 3), dtype=np.uint8), path="", names=names, boxes=boxes, masks=mask_data)
+
+
+def load(payload):
+    with np.load(io.BytesIO(payload)) as data:
+        return {name: data[name] for name in data.files}
+
+
+def test_json_payload_is_columnar_and_filtered():
+    payload = detections_payload((64, 64), result(), "detection", ["person"], 0.5)
+    assert payload == {"task": "detection", "width": 64, "height": 64, "detections": {
+        "count": 1, "boxes": [[10, 20, 30, 40]], "class_ids": [0], "scores": [0.9]}}
+
+
+def test_npz_payload_has_typed_arrays():
+    arrays = load(detections_payload((48, 64), result(), "detection", None, 0.25, detections_format="npz"))
+    assert arrays["width"] == 64 and arrays["height"] == 48
+    assert arrays["boxes"].dtype == np.int32
+    assert arrays["boxes"].tolist() == [[10, 20, 30, 40], [0, 0, 5, 5]]
+    assert arrays["class_ids"].dtype == np.int16
+    assert arrays["class_ids"].tolist() == [0, 2]
+    assert arrays["scores"].dtype == np.float32
+    assert "mask_points" not in arrays
+
+
+def test_npz_mask_offsets_select_each_outline():
+    arrays = load(detections_payload((64, 64), result(masks=True), "segmentation", None, 0.25,
+                                     include_masks=True, detections_format="npz"))
+    offsets = arrays["mask_offsets"]
+    assert len(offsets) == 3
+    first = arrays["mask_points"][offsets[0]:offsets[1]]
+    assert len(first) > 0
+    assert (first.min(axis=0) >= [9, 19]).all() and (first.max(axis=0) <= [31, 41]).all()
+    # The second instance has an empty mask
+    assert offsets[1] == offsets[2]
@@ -0,0 +1,103 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from jobs import JobStore
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="server.py needs os.fork")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_json(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.load(response)
+
+
+def wait_for(condition, timeout, interval=0.2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = condition()
+        if value:
+            return value
+        time.sleep(interval)
+    return None
+
+
+@pytest.fixture
+def server(tmp_path):
+    port = free_port()
+    env = dict(os.environ, ARGUS_PRELOAD_MODELS="false", ARGUS_JOBS_DIR=str(tmp_path / "jobs"),
+               ARGUS_INFERENCE_CACHE_MB="0")
+    process = subprocess.Popen([sys.executable, "server.py", "--workers", "2", "--port", str(port),
+                                "--log-level", "warning"], cwd=BACKEND, env=env)
+    url = f"http://127.0.0.1:{port}"
+
+    def ready():
+        try:
+            return get_json(url + "/api/workers")
+        except (OSError, urllib.error.URLError):
+            assert process.poll() is None, "server exited"
+            return None
+
+    try:
+        assert wait_for(ready, 120), "server did not start"
+        yield url, process, str(tmp_path / "jobs" / "jobs.sqlite3")
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def worker_pids(url, requests=200):
+    pids = set()
+    for _ in range(requests):
+        pids.add(get_json(url + "/api/workers")["pid"])
+        if len(pids) == 2:
+            break
+    return pids
+
+
+def test_both_workers_serve_requests(server):
+    url, process, _ = server
+    pids = worker_pids(url)
+    assert len(pids) == 2
+    assert process.pid not in pids
+
+
+def test_jobs_of_a_dead_worker_are_requeued_and_the_worker_replaced(server):
+    url, process, db_path = server
+    dead = sorted(worker_pids(url))[0]
+    store = JobStore(db_path)
+    store.create("stuck", "detection", {}, "missing.mp4", "out.mp4")
+    assert store.claim("stuck", time.time())
+    store.update("stuck", worker_pid=dead)
+
+    os.kill(dead, signal.SIGKILL)
+    # The replacement worker picks the requeued job up; its input does not
+    # exist, so it fails instead of staying running forever
+    assert wait_for(lambda: store.get("stuck")["status"] != "running", 60)
+    assert store.get("stuck")["worker_pid"] != dead
+
+    def replaced():
+        pids = worker_pids(url)
+        return len(pids) == 2 and dead not in pids
+
+    assert wait_for(replaced, 120)
+    store.close()
@@ -0,0 +1,65 @@
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+from classes import names
+from tiling import merge_boxes, needs_tiling, tile_windows, tiled_predict
+
+
+def rows(*boxes):
+    return np.array(boxes, dtype=np.float32).reshape(-1, 6)
+
+
+def test_windows_cover_the_image_and_end_at_the_border():
+    windows = tile_windows(1500, 700, 640, overlap=0.2)
+    xs = sorted({(x0, x1) for x0, _, x1, _ in windows})
+    ys = sorted({(y0, y1) for _, y0, _, y1 in windows})
+    assert xs == [(0, 640), (512, 1152), (860, 1500)]
+    assert ys == [(0, 640), (60, 700)]
+    assert len(windows) == 6
+
+
+def test_small_images_are_a_single_window():
+    assert tile_windows(300, 200, 640) == [(0, 0, 300, 200)]
+    assert not needs_tiling(np.zeros((200, 300, 3)), 640)
+    assert not needs_tiling(np.zeros((2000, 3000, 3)), 0)
+    assert needs_tiling(np.zeros((2000, 3000, 3)), 640)
+
+
+def test_pieces_of_an_object_cut_by_a_tile_edge_become_one_box():
+    merged = merge_boxes(rows([100, 100, 200, 200, 0.9, 0], [150, 100, 300, 200, 0.6, 0]), threshold=0.3)
+    np.testing.assert_allclose(merged, rows([100, 100, 300, 200, 0.9, 0]))
+
+
+def test_boxes_of_other_classes_or_apart_are_kept():
+    data = rows([0, 0, 100, 100, 0.9, 0], [0, 0, 100, 100, 0.8, 1], [500, 500, 600, 600, 0.7, 0])
+    merged = merge_boxes(data)
+    assert len(merged) == 3
+    np.testing.assert_allclose(merged[:, 4], [0.9, 0.8, 0.7])
+
+
+def test_a_box_inside_a_larger_one_is_absorbed():
+    merged = merge_boxes(rows([0, 0, 400, 400, 0.5, 2], [10, 10, 50, 50, 0.8, 2]))
+    np.testing.assert_allclose(merged, rows([0, 0, 400, 400, 0.8, 2]))
+
+
+def test_merge_keeps_empty_input():
+    assert merge_boxes(rows()).shape == (0, 6)
+
+
+def test_tiled_predict_maps_tile_boxes_to_image_coordinates():
+    image = np.zeros((700, 1500, 3), dtype=np.uint8)
+    calls = []
+
+    def predict(images, **options):
+        calls.append(len(images))
+        # One box in the top left corner of every tile
+        return [Results(tile, path="", names=names, boxes=torch.tensor([[10.0, 10.0, 40.0, 40.0, 0.9, 0.0]]))
+                for tile in images]
+
+    result = tiled_predict(predict, image, 640, overlap=0.2, batch=4, full_pass=True)
+    assert calls == [4, 2, 1]
+    boxes = result.boxes.data.numpy()
+    corners = {(int(x0), int(y0)) for x0, y0 in boxes[:, :2]}
+    assert corners == {(x0 + 10, y0 + 10) for x0, y0, _, _ in tile_windows(1500, 700, 640, 0.2)}
+    assert result.orig_img is image
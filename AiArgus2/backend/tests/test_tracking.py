@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+import torch
+from ultralytics.engine.results import Results
+
+from classes import names
+from postprocess import Detections
+from tracking import interpolate, keyframe_results, make_tracker
+
+
+def detections(boxes, ids):
+    count = len(boxes)
+    return Detections(np.array(boxes, dtype=int).reshape(-1, 4), np.full(count, 0.9), np.zeros(count, dtype=int),
+                      np.arange(count), ids=np.array(ids, dtype=int))
+
+
+def test_interpolate_moves_matching_tracks_only():
+    base = detections([[0, 0, 10, 10], [50, 50, 60, 60]], [1, 2])
+    other = detections([[20, 0, 30, 10], [0, 0, 1, 1]], [1, 3])
+    moved = interpolate(base, other, 0.25)
+    assert moved.xyxy.tolist() == [[5, 0, 15, 10], [50, 50, 60, 60]]
+    assert moved.ids.tolist() == [1, 2]
+
+
+def test_untracked_rows_are_not_interpolated():
+    base = detections([[0, 0, 10, 10]], [-1])
+    other = detections([[20, 0, 30, 10]], [-1])
+    assert interpolate(base, other, 0.5).xyxy.tolist() == [[0, 0, 10, 10]]
+
+
+class MovingBoxModel:
+    """Predicts one person box that moves 8 px to the right per frame."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, frame, verbose=False, **options):
+        x = 8 * int(frame[0, 0, 0])
+        self.calls += 1
+        boxes = torch.tensor([[100.0 + x, 100.0, 200.0 + x, 200.0, 0.9, 0.0]])
+        return [Results(frame, path="", names=names, boxes=boxes)]
+
+
+def frames(count):
+    # The frame index is stored in the first pixel
+    for index in range(count):
+        frame = np.zeros((320, 320, 3), dtype=np.uint8)
+        frame[0, 0] = index
+        yield frame
+
+
+def test_keyframes_run_the_model_and_frames_between_are_interpolated():
+    model = MovingBoxModel()
+    stats = {}
+    output = list(keyframe_results(model, frames(5), None, 0.25, {}, stride=2, stats=stats))
+    assert len(output) == 5
+    assert model.calls == stats["keyframes"] == 3
+    lefts = [items[2].xyxy[0, 0] for items in output]
+    assert lefts == [100, 108, 116, 124, 132]
+
+
+def test_trailing_frames_keep_the_last_keyframe():
+    output = list(keyframe_results(MovingBoxModel(), frames(4), None, 0.25, {}, stride=3))
+    assert [items[2].xyxy[0, 0] for items in output][-1] == 124
+
+
+def test_a_steady_scene_doubles_the_adaptive_stride():
+    model = MovingBoxModel()
+    list(keyframe_results(model, frames(16), None, 0.25, {}, stride=1, adaptive=True, max_stride=4))
+    # Keyframes at 0, 1, 3, 7, 11, 15
+    assert model.calls == 6
+
+
+def test_gated_keyframes_reuse_the_previous_results():
+    class AlwaysStatic:
+        def static(self, frame):
+            return True
+
+        def reset(self, frame):
+            pass
+
+    model = MovingBoxModel()
+    stats = {}
+    output = list(keyframe_results(model, frames(3), None, 0.25, {}, tracker=None, gate=AlwaysStatic(),
+                                   stats=stats))
+    assert model.calls == 1 and stats["gated"] == 2
+    assert [items[2].xyxy[0, 0] for items in output] == [100, 100, 100]
+
+
+def test_unknown_trackers_are_rejected():
+    with pytest.raises(ValueError):
+        make_tracker("sort")
@@ -0,0 +1,30 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import config
+import main
+from uploads import endpoint_upload_bytes, max_upload_bytes
+
+MB = 1024 * 1024
+
+
+def test_each_endpoint_has_its_own_limit(monkeypatch):
+    monkeypatch.setattr(config, "MAX_IMAGE_UPLOAD_MB", 5)
+    monkeypatch.setattr(config, "MAX_VIDEO_UPLOAD_MB", 20)
+    monkeypatch.setattr(config, "MAX_BATCH_UPLOAD_MB", 100)
+    assert endpoint_upload_bytes("/api/detect") == 20 * MB
+    assert endpoint_upload_bytes("/api/jobs") == 20 * MB
+    assert endpoint_upload_bytes("/api/detect/batch") == 100 * MB
+    assert max_upload_bytes("image") == 5 * MB
+
+
+@pytest.mark.parametrize("path", ["/api/detect", "/api/jobs"])
+def test_single_file_uploads_are_rejected_up_front_below_the_batch_limit(monkeypatch, path):
+    monkeypatch.setattr(config, "MAX_IMAGE_UPLOAD_MB", 0.001)
+    monkeypatch.setattr(config, "MAX_VIDEO_UPLOAD_MB", 0.001)
+    monkeypatch.setattr(config, "MAX_BATCH_UPLOAD_MB", 100)
+    client = TestClient(main.app)
+    response = client.post(path, files={"file": ("clip.mp4", bytes(4096), "video/mp4")})
+    assert response.status_code == 413
+    # Rejected by the middleware, before the endpoint parsed the form
+    assert response.json() == {"detail": "Upload too large"}
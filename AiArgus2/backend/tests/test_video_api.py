@@ -0,0 +1,9 @@
+from workers import video_pool
+
+
+def test_a_busy_server_leaves_no_work_directory_behind(api_client, tmp_path, monkeypatch):
+    monkeypatch.setattr(video_pool, "in_flight", video_pool.max_in_flight)
+    response = api_client.post("/api/detect", files={"file": ("clip.mp4", bytes(1024), "video/mp4")},
+                               data={"render": "false"})
+    assert response.status_code == 503
+    assert list(tmp_path.glob("argus-*")) == []
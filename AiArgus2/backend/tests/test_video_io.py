@@ -0,0 +1,116 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+import config
+from benchmark import synthetic_clip
+from video import video_properties
+from video_io import BackgroundWriter, OpenCVSink, open_video_writer, output_fps, prefetch_frames, read_frames
+
+
+@pytest.fixture
+def clip(tmp_path):
+    return synthetic_clip(str(tmp_path / "clip.mp4"), 12, 160, 120, fps=25)
+
+
+def decode_threads():
+    return [thread for thread in threading.enumerate() if thread.name == "argus-video-decode"]
+
+
+@pytest.mark.parametrize("queue_size", [0, 1, 4])
+def test_prefetched_frames_match_inline_decoding(clip, queue_size):
+    expected = list(read_frames(clip))
+    frames = list(prefetch_frames(clip, queue_size))
+    assert len(frames) == len(expected) == 12
+    for frame, reference in zip(frames, expected):
+        np.testing.assert_array_equal(frame, reference)
+    assert not decode_threads()
+
+
+def test_closing_early_stops_the_decoder(clip):
+    frames = prefetch_frames(clip, 2)
+    next(frames)
+    frames.close()
+    assert not decode_threads()
+
+
+def test_decoder_errors_reach_the_consumer(monkeypatch, clip):
+    def failing(path):
+        yield np.zeros((2, 2, 3), dtype=np.uint8)
+        raise OSError("read failed")
+
+    monkeypatch.setattr("video_io.read_frames", failing)
+    frames = prefetch_frames(clip, 2)
+    next(frames)
+    with pytest.raises(OSError, match="read failed"):
+        next(frames)
+
+
+def test_output_fps_falls_back_when_missing_or_implausible():
+    assert output_fps(25.0) == 25.0
+    assert output_fps(None) == 30
+    assert output_fps(0) == 30
+    assert output_fps(90000) == 30
+
+
+@pytest.mark.parametrize("queue_size", [0, 3])
+def test_writer_keeps_the_frames_and_frame_rate(tmp_path, clip, queue_size):
+    path = str(tmp_path / "out.mp4")
+    writer = open_video_writer(path, 25.0, (160, 120), "opencv", queue_size)
+    assert isinstance(writer, BackgroundWriter if queue_size else OpenCVSink)
+    for frame in read_frames(clip):
+        writer.write(frame)
+    writer.release()
+    properties = video_properties(path)
+    assert (properties["frames"], properties["fps"], properties["width"]) == (12, 25.0, 160)
+
+
+class FailingSink:
+    def __init__(self):
+        self.released = False
+
+    def write(self, frame):
+        raise RuntimeError("encoder failed")
+
+    def release(self):
+        self.released = True
+
+
+def test_background_writer_reraises_encoder_errors():
+    sink = FailingSink()
+    writer = BackgroundWriter(sink, 2)
+    with pytest.raises(RuntimeError, match="encoder failed"):
+        for _ in range(100):
+            writer.write(np.zeros((2, 2, 3), dtype=np.uint8))
+    # The caller still releases the writer, as process_video does in finally
+    with pytest.raises(RuntimeError, match="encoder failed"):
+        writer.release()
+    assert sink.released
+    assert not writer._thread.is_alive()
+
+
+def test_unknown_encoders_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        open_video_writer(str(tmp_path / "out.mp4"), 30, (16, 16), encoder="x264")
+
+
+def test_ffmpeg_falls_back_to_opencv_when_missing(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "VIDEO_FFMPEG", "argus-missing-ffmpeg")
+    writer = open_video_writer(str(tmp_path / "out.mp4"), 30, (16, 16), encoder="ffmpeg", queue_size=0)
+    assert isinstance(writer, OpenCVSink)
+    writer.release()
+
+
+@pytest.mark.skipif(os.name != "posix", reason="uses shell scripts as stand-ins for ffmpeg")
+def test_ffmpeg_failures_are_reported(tmp_path, monkeypatch):
+    fake = tmp_path / "ffmpeg"
+    fake.write_text("#!/bin/sh\necho 'Unknown encoder' >&2\nexit 1\n")
+    fake.chmod(0o755)
+    monkeypatch.setattr(config, "VIDEO_FFMPEG", str(fake))
+    writer = open_video_writer(str(tmp_path / "out.mp4"), 30, (16, 16), encoder="ffmpeg", queue_size=2)
+    with pytest.raises(RuntimeError, match="Unknown encoder"):
+        for _ in range(50):
+            writer.write(np.zeros((16, 16, 3), dtype=np.uint8))
+        writer.release()
@@ -0,0 +1,42 @@
+import os
+
+from benchmark import current_rss_mb, synthetic_clip
+from classes import names_list
+from video import iter_video_detections, process_video
+
+FRAMES = 120
+WIDTH, HEIGHT = 1280, 720
+# Holding every decoded frame would take about 330 MB
+MAX_GROWTH_MB = 64
+# RSS is measured from this frame on, after one-off allocations of the first frames
+WARM_FRAMES = 10
+
+
+def steady_growth(samples):
+    steady = samples[WARM_FRAMES:]
+    return max(steady) - steady[0]
+
+
+def test_process_video_memory_stays_flat(tmp_path, local_weights):
+    local_weights("video", "detection")
+    clip = synthetic_clip(str(tmp_path / "clip.mp4"), FRAMES, WIDTH, HEIGHT)
+    samples = []
+    written = process_video(clip, str(tmp_path / "out.mp4"), "detection", names_list, 0.25, True, True,
+                            "#B9282B", 2, progress=lambda done, total: samples.append(current_rss_mb()))
+    assert written == FRAMES
+    assert os.path.getsize(tmp_path / "out.mp4") > 0
+    assert steady_growth(samples) < MAX_GROWTH_MB
+
+
+def test_iter_video_detections_memory_stays_flat(tmp_path, local_weights):
+    local_weights("video", "detection")
+    clip = synthetic_clip(str(tmp_path / "clip.mp4"), FRAMES, WIDTH, HEIGHT)
+    samples = []
+    frames = 0
+    for item in iter_video_detections(clip, "detection", names_list, 0.25):
+        if "frame" in item:
+            frames += 1
+            samples.append(current_rss_mb())
+    assert frames == FRAMES
+    assert item["stats"]["frames"] == FRAMES
+    assert steady_growth(samples) < MAX_GROWTH_MB
@@ -0,0 +1,101 @@
+"""Tiled inference for images much larger than the model input.
+
+The image is covered with overlapping square tiles that are predicted at
+full resolution, so small objects are not lost to the letterbox downscale.
+Tiles are views into the decoded image and are sent to the model in batches,
+which keeps preprocessing memory proportional to the tile size. Tile boxes are
+shifted back to image coordinates and merged with a global, class-wise NMS.
+Overlap is measured as intersection over the smaller box and overlapping boxes
+are merged into their union, so the pieces of an object cut by tile edges end
+up as one box. An optional
+whole-image pass catches objects larger than a tile.
+
+Tiled results are detection-only; masks are not merged.
+"""
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+from classes import names
+
+
+def tile_windows(width, height, tile, overlap=0.2):
+    """(x0, y0, x1, y1) windows of at most tile x tile covering the image with the given overlap."""
+    step = max(int(tile * (1 - overlap)), 1)
+
+    def starts(size):
+        if size <= tile:
+            return [0]
+        positions = list(range(0, size - tile, step))
+        # The last tile is aligned with the border instead of running past it
+        return positions + [size - tile]
+
+    return [(x, y, min(x + tile, width), min(y + tile, height)) for y in starts(height) for x in starts(width)]
+
+
+def needs_tiling(image, tile):
+    return bool(tile) and max(image.shape[:2]) > tile
+
+
+def tile_images(image, windows):
+    return [image[y0:y1, x0:x1] for x0, y0, x1, y1 in windows]
+
+
+def shifted_boxes(result, window):
+    """(N, 6) boxes of a tile result in image coordinates."""
+    data = result.boxes.data.cpu().numpy()[:, [0, 1, 2, 3, -2, -1]].astype(np.float32)
+    data[:, [0, 2]] += window[0]
+    data[:, [1, 3]] += window[1]
+    return data
+
+
+def merge_boxes(data, threshold=0.6):
+    """Greedy class-wise merge of (N, 6) rows overlapping by intersection over the smaller box.
+
+    The highest scoring box of each group is kept and grown to the union of the
+    boxes it absorbs, so the pieces of an object cut by tile edges become one box.
+    """
+    if len(data) == 0:
+        return data
+    area = np.prod(data[:, 2:4] - data[:, :2], axis=1)
+    data = data[np.lexsort((-area, -data[:, 4]))].copy()
+    keep = np.zeros(len(data), dtype=bool)
+    for class_id in np.unique(data[:, 5]):
+        rows = np.flatnonzero(data[:, 5] == class_id)
+        boxes = data[rows, :4]
+        area = np.prod(boxes[:, 2:] - boxes[:, :2], axis=1)
+        lt = np.maximum(boxes[:, None, :2], boxes[None, :, :2])
+        rb = np.minimum(boxes[:, None, 2:], boxes[None, :, 2:])
+        inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+        overlap = inter / np.maximum(np.minimum(area[:, None], area[None, :]), 1e-9)
+        merged = np.zeros(len(rows), dtype=bool)
+        for i in range(len(rows)):
+            if merged[i]:
+                continue
+            keep[rows[i]] = True
+            group = np.flatnonzero(~merged[i + 1:] & (overlap[i, i + 1:] > threshold)) + i + 1
+            merged[group] = True
+            if len(group):
+                members = boxes[np.append(group, i)]
+                data[rows[i], :2] = members[:, :2].min(axis=0)
+                data[rows[i], 2:4] = members[:, 2:].max(axis=0)
+    return data[keep]
+
+
+def merge_tile_results(image, windows, results, full_result=None, threshold=0.6):
+    """One Results for the whole image from per-tile (and optional whole-image) Results."""
+    parts = [shifted_boxes(result, window) for result, window in zip(results, windows)]
+    if full_result is not None:
+        parts.append(shifted_boxes(full_result, (0, 0)))
+    data = merge_boxes(np.concatenate(parts) if parts else np.zeros((0, 6), dtype=np.float32), threshold)
+    return Results(image, path="", names=names, boxes=torch.from_numpy(np.ascontiguousarray(data)))
+
+
+def tiled_predict(predict, image, tile, overlap=0.2, batch=8, full_pass=True, threshold=0.6, **options):
+    """Tiled inference with a predict(images, **options) callable returning one Results per image."""
+    windows = tile_windows(image.shape[1], image.shape[0], tile, overlap)
+    results = []
+    for start in range(0, len(windows), batch):
+        results.extend(predict(tile_images(image, windows[start:start + batch]), **options))
+    full_result = predict([image], **options)[0] if full_pass else None
+    return merge_tile_results(image, windows, results, full_result, threshold)
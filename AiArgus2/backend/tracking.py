@@ -0,0 +1,121 @@
+"""Keyframe video inference with tracking in between.
+
+The detector only runs on every Nth frame (the keyframes). A multi-object
+tracker from Ultralytics (ByteTrack or BoT-SORT) associates the keyframe
+detections into tracks, and boxes for the frames in between are interpolated
+between the two surrounding keyframes by track id. Frames are buffered until
+the next keyframe arrives, so memory is bounded by the stride.
+
+With an adaptive stride the interval doubles while the set of tracks stays the
+same and halves as soon as objects appear or disappear.
+
+An optional MotionGate (see gating.py) can additionally skip the detector on
+keyframes that barely differ from the last frame it ran on.
+"""
+import math
+
+import numpy as np
+from ultralytics.trackers.track import TRACKER_MAP
+from ultralytics.utils import IterableSimpleNamespace
+from ultralytics.utils.checks import check_yaml
+
+try:
+    from ultralytics.utils import yaml_load
+except ImportError:  # newer Ultralytics releases
+    from ultralytics.utils import YAML
+    yaml_load = YAML.load
+
+from postprocess import Detections, extract_detections
+
+TRACKERS = ("bytetrack", "botsort")
+
+
+def make_tracker(name, stride=1):
+    """A fresh tracker for one video that is updated once per keyframe."""
+    if name not in TRACKERS:
+        raise ValueError(f"Unsupported tracker: {name}")
+    cfg = IterableSimpleNamespace(**yaml_load(check_yaml(f"{name}.yaml")))
+    # track_buffer counts updates, which only happen on keyframes
+    cfg.track_buffer = max(1, math.ceil(cfg.track_buffer / max(stride, 1)))
+    return TRACKER_MAP[cfg.tracker_type](args=cfg)
+
+
+def track_detections(tracker, result, frame, selected_classes, threshold):
+    """Detections of a keyframe with the track id of each row (-1 when untracked)."""
+    detections = extract_detections(result, selected_classes, threshold)
+    boxes = result.boxes.cpu().numpy()
+    # Updated on every keyframe, even without boxes, so lost tracks age
+    tracks = tracker.update(boxes, frame)
+    ids = np.full(len(boxes), -1, dtype=int)
+    if len(tracks):
+        ids[tracks[:, -1].astype(int)] = tracks[:, 4].astype(int)
+    detections.ids = ids[detections.index]
+    return detections
+
+
+def interpolate(base, other, weight):
+    """base's detections with boxes moved weight of the way towards the same tracks in other."""
+    xyxy = base.xyxy.astype(float)
+    rows = {track_id: row for row, track_id in enumerate(other.ids.tolist()) if track_id >= 0}
+    for row, track_id in enumerate(base.ids.tolist()):
+        if track_id in rows:
+            xyxy[row] += (other.xyxy[rows[track_id]] - xyxy[row]) * weight
+    return Detections(np.rint(xyxy).astype(int), base.conf, base.cls, base.index, ids=base.ids)
+
+
+def keyframe_results(model, frames, selected_classes, threshold, predict_options, stride=1, adaptive=False,
+                     max_stride=8, tracker="bytetrack", gate=None, stats=None):
+    """Yield (frame, result, detections) for every frame, running the model on keyframes only.
+
+    Between keyframes, result is the nearest keyframe's Results (e.g. for its
+    masks) and detections holds the interpolated boxes. Without a tracker the
+    stride must be 1. Keyframes that gate finds static reuse the previous
+    keyframe's results. stats, if given, is a dict whose "keyframes" (model
+    runs) and "gated" counts are updated as frames are processed.
+    """
+    tracker = make_tracker(tracker, stride) if tracker else None
+    stride = max(stride, 1)
+    max_stride = max(max_stride, stride)
+    interval = stride
+    previous = None  # (result, detections) of the last keyframe
+    pending = []
+    next_keyframe = 0
+    stats = {} if stats is None else stats
+    stats["keyframes"] = 0
+    stats["gated"] = 0
+
+    for index, frame in enumerate(frames):
+        if index != next_keyframe:
+            pending.append(frame)
+            continue
+
+        if gate is not None and previous is not None and gate.static(frame):
+            result, detections = previous
+            stats["gated"] += 1
+        else:
+            result = model.predict(frame, verbose=False, **predict_options)[0]
+            if tracker is not None:
+                detections = track_detections(tracker, result, frame, selected_classes, threshold)
+            else:
+                detections = extract_detections(result, selected_classes, threshold)
+            stats["keyframes"] += 1
+            if gate is not None:
+                gate.reset(frame)
+        for offset, between in enumerate(pending, 1):
+            weight = offset / (len(pending) + 1)
+            if weight < 0.5:
+                yield between, previous[0], interpolate(previous[1], detections, weight)
+            else:
+                yield between, result, interpolate(detections, previous[1], 1 - weight)
+        pending.clear()
+        yield frame, result, detections
+
+        if adaptive and tracker is not None and previous is not None:
+            steady = (-1 not in detections.ids and set(detections.ids.tolist()) == set(previous[1].ids.tolist()))
+            interval = min(interval * 2, max_stride) if steady else max(interval // 2, 1)
+        previous = (result, detections)
+        next_keyframe = index + interval
+
+    # Frames after the last keyframe keep its detections
+    for frame in pending:
+        yield frame, previous[0], previous[1]
@@ -0,0 +1,184 @@
+"""Chunked upload handling, image archives and per-request working directories."""
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
+from fastapi import HTTPException
+
+import config
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+
+
+def max_upload_bytes(file_type):
+    limit_mb = {"video": config.MAX_VIDEO_UPLOAD_MB, "batch": config.MAX_BATCH_UPLOAD_MB}.get(
+        file_type, config.MAX_IMAGE_UPLOAD_MB)
+    return int(limit_mb * 1024 * 1024)
+
+
+def endpoint_upload_bytes(path):
+    """Largest upload the POST endpoint at path accepts."""
+    if path.startswith("/api/detect/batch"):
+        return max_upload_bytes("batch")
+    if path.startswith("/api/jobs"):
+        return max_upload_bytes("video")
+    # /api/detect takes either an image or a video
+    return max(max_upload_bytes("image"), max_upload_bytes("video"))
+
+
+def too_large(limit):
+    return HTTPException(status_code=413, detail=f"Upload exceeds the {limit / (1024 * 1024):g} MB limit")
+
+
+async def read_upload(file, max_bytes):
+    """Read a small upload (an image) into memory, enforcing a size limit."""
+    data = bytearray()
+    while True:
+        chunk = await file.read(config.UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        data.extend(chunk)
+        if len(data) > max_bytes:
+            raise too_large(max_bytes)
+    return bytes(data)
+
+
+async def spool_upload(file, path, max_bytes):
+    """Copy an upload to path in chunks without holding it in memory."""
+    size = 0
+    with open(path, "wb") as f:
+        while True:
+            chunk = await file.read(config.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise too_large(max_bytes)
+            f.write(chunk)
+    return size
+
+
+async def spool_image_uploads(files, workdir, max_bytes):
+    """Spool image uploads to workdir, as (name, path, error) entries for iter_spooled_images.
+
+    Files that are not images or are larger than max_bytes get an error
+    instead of failing the whole request.
+    """
+    entries = []
+    for index, file in enumerate(files):
+        name = file.filename or str(index)
+        if (file.content_type or "").split("/")[0] != "image":
+            entries.append((name, None, "Unsupported file type"))
+            continue
+        path = workdir.file(f"{index:06d}{upload_suffix(file.filename, '.jpg')}")
+        try:
+            await spool_upload(file, path, max_bytes)
+        except HTTPException as e:
+            os.remove(path)
+            entries.append((name, None, e.detail))
+            continue
+        entries.append((name, path, None))
+    return entries
+
+
+def upload_suffix(filename, default=".mp4"):
+    suffix = os.path.splitext(filename or "")[1].lower()
+    return suffix if suffix.isascii() and 1 < len(suffix) <= 8 else default
+
+
+def is_archive(filename):
+    return (filename or "").lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def readable_archive(path):
+    return zipfile.is_zipfile(path) or tarfile.is_tarfile(path)
+
+
+def is_image_name(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_SUFFIXES
+
+
+def hidden_member(name):
+    # Directories and resource forks added by archivers, e.g. __MACOSX/._photo.jpg
+    return any(part.startswith((".", "__MACOSX")) for part in name.split("/") if part)
+
+
+def read_limited(f, max_bytes):
+    """Contents of f, or None when it is larger than max_bytes."""
+    content = f.read(max_bytes + 1)
+    return content if len(content) <= max_bytes else None
+
+
+def archive_member(name, f, max_bytes):
+    """(name, content, error) of one archive member."""
+    if not is_image_name(name):
+        return name, None, "Unsupported file type"
+    content = read_limited(f, max_bytes)
+    if content is None:
+        return name, None, f"Image exceeds the {max_bytes / (1024 * 1024):g} MB limit"
+    return name, content, None
+
+
+def iter_archive_images(path, max_bytes):
+    """(name, content, error) of each file in a zip or tar archive.
+
+    Members are read one at a time, so only the images being processed are
+    held in memory, whatever the size of the archive. Members larger than
+    max_bytes are reported with an error instead of being read.
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or hidden_member(info.filename):
+                    continue
+                if info.file_size > max_bytes:
+                    yield info.filename, None, f"Image exceeds the {max_bytes / (1024 * 1024):g} MB limit"
+                    continue
+                try:
+                    with archive.open(info) as f:
+                        yield archive_member(info.filename, f, max_bytes)
+                except (zipfile.BadZipFile, OSError, RuntimeError) as e:
+                    # Corrupt or encrypted members
+                    yield info.filename, None, str(e)
+        return
+    try:
+        archive = tarfile.open(path)
+    except tarfile.TarError:
+        raise ValueError("Unsupported or corrupt archive")
+    with archive:
+        # Iterating the archive reads the members in order, without an index
+        for member in archive:
+            if not member.isfile() or hidden_member(member.name):
+                continue
+            if member.size > max_bytes:
+                yield member.name, None, f"Image exceeds the {max_bytes / (1024 * 1024):g} MB limit"
+                continue
+            yield archive_member(member.name, archive.extractfile(member), max_bytes)
+
+
+def iter_spooled_images(entries):
+    """(name, content, error) of uploads spooled to disk, given as (name, path, error) entries."""
+    for name, path, error in entries:
+        if error is not None:
+            yield name, None, error
+            continue
+        with open(path, "rb") as f:
+            content = f.read()
+        os.remove(path)
+        yield name, content, None
+
+
+class WorkDir:
+    """Temporary directory owned by a single request."""
+
+    def __init__(self):
+        self.path = tempfile.mkdtemp(prefix="argus-", dir=config.TEMP_DIR)
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
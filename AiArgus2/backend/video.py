@@ -0,0 +1,202 @@
+"""Single-pass video pipeline: decode, infer, annotate and write frame by frame.
+
+Decoding and encoding run in background threads (see video_io.py) that
+overlap with inference, and only a bounded number of frames is held in memory
+regardless of clip length.
+"""
+from contextlib import closing
+
+import cv2
+import numpy as np
+
+from classes import names
+from compositing import blend_labels, draw_outlines, label_centroids, label_map
+import config
+from postprocess import detection_columns, draw_boxes, extract_detections, mask_polygons, predict_options
+from model_registry import lease_model, resolve_precision
+from gating import MotionGate
+from tracking import TRACKERS, keyframe_results
+from video_io import open_video_writer, output_fps, prefetch_frames
+
+
+def color_to_bgr(value):
+    value = value.lstrip('#')
+    if len(value) == 3:
+        value = ''.join([c * 2 for c in value])
+    return tuple(int(value[i:i + 2], 16) for i in (4, 2, 0))
+
+
+def video_options(stride=None, adaptive_stride=None, tracker=None, motion_threshold=None, precision=None):
+    """Keyframe, gating and precision options for process_video, with unset fields taken from the config."""
+    tracker = tracker or None
+    if tracker is not None and tracker not in TRACKERS:
+        raise ValueError(f"Unsupported tracker: {tracker}")
+    return {
+        "stride": config.VIDEO_STRIDE if stride is None else max(stride, 1),
+        "adaptive_stride": config.VIDEO_ADAPTIVE_STRIDE if adaptive_stride is None else adaptive_stride,
+        "tracker": tracker,
+        "motion_threshold": config.VIDEO_MOTION_THRESHOLD if motion_threshold is None else motion_threshold,
+        "precision": resolve_precision(precision),
+    }
+
+
+def video_properties(path):
+    cap = cv2.VideoCapture(path)
+    try:
+        return {
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "frames": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+            "fps": cap.get(cv2.CAP_PROP_FPS) or None,
+        }
+    finally:
+        cap.release()
+
+
+def draw_frame_detections(frame, detections, show_labels, show_confidence, color_bgr, thickness):
+    return draw_boxes(frame, detections, color_bgr, thickness, show_labels, show_confidence,
+                      font=cv2.FONT_HERSHEY_TRIPLEX, font_scale=0.4, confidence_format="{:.2f}%")
+
+
+def draw_frame_segmentation(frame, result, detections, show_labels, color_bgr, thickness):
+    # Pobieramy maski i klasy dla aktualnej klatki
+    masks = result.masks
+    if masks is None:
+        return frame
+
+    # Jedna mapa etykiet dla wszystkich obiektów
+    labels = label_map(masks.data[detections.index].cpu().numpy(), frame.shape)
+    draw_outlines(frame, labels, color_bgr, thickness)
+
+    if show_labels:
+        # Znajdujemy środki masek
+        for class_id, (cX, cY) in zip(detections.cls.tolist(), label_centroids(labels, len(detections))):
+            if not np.isnan(cX):
+                cv2.putText(frame,
+                    names[class_id],
+                    (int(cX) - 20, int(cY)),
+                    cv2.FONT_HERSHEY_TRIPLEX,
+                    0.4,
+                    color_bgr,
+                    1)
+
+    # Nakładamy maskę na klatkę z przezroczystością
+    colors = np.tile(np.array(color_bgr, dtype=np.uint8), (len(detections), 1))
+    return blend_labels(frame, labels, colors, alpha=0.3, out=frame)
+
+
+def frame_results(model, input_path, selected_classes, threshold, stride=1, adaptive_stride=False, tracker=None,
+                  motion_threshold=0, stats=None, queue_size=None):
+    """Yield (frame, result, detections) for every frame of a video.
+
+    With a stride above 1, an adaptive stride or a tracker, the detector only
+    runs on keyframes (see tracking.py). A motion_threshold above 0 also skips
+    it on frames that barely changed (see gating.py). Otherwise it runs on
+    every frame. stats, if given, receives the "keyframes" and "gated" counts.
+    Frames are decoded ahead with at most queue_size of them waiting.
+    """
+    stats = {} if stats is None else stats
+    options = predict_options(selected_classes, threshold)
+    frames = prefetch_frames(input_path, queue_size)
+    # Closed explicitly so the decoder thread stops as soon as this generator does
+    with closing(frames):
+        if stride <= 1 and not adaptive_stride and not tracker and not motion_threshold:
+            stats.update(keyframes=0, gated=0)
+            for frame in frames:
+                result = model.predict(frame, verbose=False, **options)[0]
+                stats["keyframes"] += 1
+                yield frame, result, extract_detections(result, selected_classes, threshold)
+            return
+        if stride > 1 or adaptive_stride:
+            tracker = tracker or config.VIDEO_TRACKER
+        gate = None
+        if motion_threshold:
+            gate = MotionGate(motion_threshold, width=config.VIDEO_MOTION_WIDTH,
+                              pixel_delta=config.VIDEO_MOTION_PIXEL_DELTA, max_skip=config.VIDEO_MOTION_MAX_SKIP)
+        yield from keyframe_results(model, frames, selected_classes, threshold, options,
+                                    stride=stride, adaptive=adaptive_stride, max_stride=config.VIDEO_MAX_STRIDE,
+                                    tracker=tracker, gate=gate, stats=stats)
+
+
+def process_video(input_path, output_path, task, selected_classes, threshold, show_labels, show_confidence,
+                  color, thickness, progress=None, stride=1, adaptive_stride=False, tracker=None,
+                  motion_threshold=0, precision=None, stats=None, on_frame=None, queue_size=None, encoder=None):
+    """Annotate a video in one streaming pass and return the number of frames written.
+
+    progress, if given, is called as progress(frames_done, total_frames) after
+    every written frame. stats, if given, is a dict that receives the frame
+    counts (see frame_stats). on_frame, if given, is called as
+    on_frame(result, detections) for every frame before it is drawn.
+    queue_size and encoder default to config.VIDEO_QUEUE_SIZE and
+    config.VIDEO_ENCODER (see video_io.py). The output keeps the frame rate
+    of the input.
+    """
+    properties = video_properties(input_path)
+    color_bgr = color_to_bgr(color)
+    out = open_video_writer(output_path, output_fps(properties["fps"]), (properties["width"], properties["height"]),
+                            encoder, queue_size)
+
+    frames = 0
+    stats = {} if stats is None else stats
+    try:
+        with lease_model("video", task, precision) as model:
+            for frame, result, detections in frame_results(model, input_path, selected_classes, threshold,
+                                                           stride, adaptive_stride, tracker, motion_threshold,
+                                                           stats, queue_size):
+                if on_frame is not None:
+                    on_frame(result, detections)
+                if task == "detection":
+                    frame = draw_frame_detections(frame, detections, show_labels, show_confidence,
+                                                  color_bgr, thickness)
+                else:
+                    frame = draw_frame_segmentation(frame, result, detections, show_labels, color_bgr, thickness)
+                out.write(frame)
+                frames += 1
+                if progress is not None:
+                    progress(frames, properties["frames"])
+    finally:
+        out.release()
+        stats.update(frame_stats(frames, stats))
+    return frames
+
+
+def annotate_video(*args, **kwargs):
+    """process_video returning (frames, stats); the stats dict is not shared with worker processes."""
+    stats = {}
+    frames = process_video(*args, stats=stats, **kwargs)
+    return frames, stats
+
+
+def frame_stats(frames, stats):
+    """Per-video counts: frames, model runs (keyframes), gated keyframes and frames in between."""
+    keyframes = stats.get("keyframes", frames)
+    gated = stats.get("gated", 0)
+    return {
+        "frames": frames,
+        "keyframes": keyframes,
+        "gated": gated,
+        "interpolated": max(frames - keyframes - gated, 0),
+        "gated_ratio": round(gated / frames, 4) if frames else None,
+    }
+
+
+def iter_video_detections(input_path, task, selected_classes, threshold, include_masks=False, stride=1,
+                          adaptive_stride=False, tracker=None, motion_threshold=0, precision=None,
+                          queue_size=None):
+    """Yield the video properties, the detections of every frame as columns and finally the frame stats.
+
+    Nothing is drawn or encoded. The model is kept resident until the
+    generator is exhausted or closed, but only locked while a frame is
+    predicted, so a slow reader does not hold up other requests.
+    """
+    yield video_properties(input_path)
+    stats = {}
+    frames = 0
+    with lease_model("video", task, precision) as model:
+        for _, result, detections in frame_results(model, input_path, selected_classes, threshold, stride,
+                                                   adaptive_stride, tracker, motion_threshold, stats,
+                                                   queue_size):
+            polygons = mask_polygons(result, detections) if include_masks else None
+            yield dict(frame=frames, **detection_columns(detections, polygons))
+            frames += 1
+    yield {"stats": frame_stats(frames, stats)}
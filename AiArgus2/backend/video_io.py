@@ -0,0 +1,203 @@
+"""Video decoding and encoding overlapped with inference.
+
+prefetch_frames() decodes frames in a background thread into a bounded queue,
+and open_video_writer() returns a writer whose frames are encoded in another
+background thread, so decode and encode stalls no longer hold up the model.
+Each queue holds at most config.VIDEO_QUEUE_SIZE frames (0 decodes and writes
+inline). Videos are written with OpenCV's mp4v codec, or piped as raw frames
+to an external ffmpeg for H.264 when config.VIDEO_ENCODER is "ffmpeg".
+"""
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+from contextlib import closing
+
+import cv2
+import numpy as np
+
+import config
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+VIDEO_ENCODERS = ("opencv", "ffmpeg")
+# Used when the container reports no usable frame rate
+DEFAULT_FPS = 30
+_END = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+def read_frames(path):
+    cap = cv2.VideoCapture(path)
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+
+def prefetch_frames(path, queue_size=None):
+    """Frames of a video, decoded ahead by a background thread.
+
+    At most queue_size decoded frames wait in memory; closing the generator
+    stops the decoder.
+    """
+    queue_size = config.VIDEO_QUEUE_SIZE if queue_size is None else queue_size
+    if queue_size <= 0:
+        yield from read_frames(path)
+        return
+
+    frames = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(item):
+        # Gives up when the consumer has gone away
+        while not stop.is_set():
+            try:
+                frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def decode():
+        try:
+            with closing(read_frames(path)) as source:
+                for frame in source:
+                    if not put(frame):
+                        return
+            put(_END)
+        except BaseException as e:
+            put(_Failure(e))
+
+    thread = threading.Thread(target=decode, name="argus-video-decode", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = frames.get()
+            if item is _END:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def output_fps(fps):
+    """Frame rate to write a video at, given the one its source reports."""
+    return fps if fps and 1 <= fps <= 240 else DEFAULT_FPS
+
+
+class OpenCVSink:
+    def __init__(self, path, fps, size):
+        self._writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+
+    def write(self, frame):
+        self._writer.write(frame)
+
+    def release(self):
+        self._writer.release()
+
+
+class FFmpegSink:
+    """Pipes raw BGR frames to an ffmpeg process that encodes them as H.264."""
+
+    def __init__(self, executable, path, fps, size):
+        width, height = size
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(
+            [executable, "-y", "-loglevel", "error",
+             "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", f"{fps:g}", "-i", "-",
+             "-an", "-c:v", config.VIDEO_FFMPEG_CODEC, "-preset", config.VIDEO_FFMPEG_PRESET,
+             "-crf", str(config.VIDEO_FFMPEG_CRF), "-pix_fmt", "yuv420p", "-movflags", "+faststart", path],
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._stderr,
+        )
+
+    def write(self, frame):
+        try:
+            self._process.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            self.release()
+
+    def release(self):
+        if self._process.stdin.closed:
+            return
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        code = self._process.wait()
+        self._stderr.seek(0)
+        message = self._stderr.read().decode(errors="replace").strip()
+        self._stderr.close()
+        if code != 0:
+            raise RuntimeError(f"ffmpeg exited with code {code}: {message[-500:]}")
+
+
+class BackgroundWriter:
+    """Writes frames to a sink from a background thread, with at most queue_size frames waiting."""
+
+    def __init__(self, sink, queue_size):
+        self.sink = sink
+        self._frames = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="argus-video-encode", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            frame = self._frames.get()
+            if frame is None:
+                return
+            # After a failure the queue is still drained so write() never blocks
+            if self._error is None:
+                try:
+                    self.sink.write(frame)
+                except BaseException as e:
+                    self._error = e
+
+    def write(self, frame):
+        if self._error is not None:
+            raise self._error
+        self._frames.put(frame)
+
+    def release(self):
+        if self._thread.is_alive():
+            self._frames.put(None)
+            self._thread.join()
+        self.sink.release()
+        if self._error is not None:
+            raise self._error
+
+
+def open_video_writer(path, fps, size, encoder=None, queue_size=None):
+    """Writer for a video of size (width, height) with write(frame) and release().
+
+    Frames passed to write() must not be modified afterwards, since they may
+    still be waiting to be encoded.
+    """
+    encoder = encoder or config.VIDEO_ENCODER
+    if encoder not in VIDEO_ENCODERS:
+        raise ValueError(f"Unsupported video encoder: {encoder}")
+    queue_size = config.VIDEO_QUEUE_SIZE if queue_size is None else queue_size
+    sink = None
+    if encoder == "ffmpeg":
+        executable = shutil.which(config.VIDEO_FFMPEG)
+        if executable is not None:
+            sink = FFmpegSink(executable, path, fps, size)
+        else:
+            logger.warning("ffmpeg not found, writing mp4v with OpenCV", extra={"ffmpeg": config.VIDEO_FFMPEG})
+    if sink is None:
+        sink = OpenCVSink(path, fps, size)
+    return BackgroundWriter(sink, queue_size) if queue_size > 0 else sink
@@ -2,6 +2,7 @@ import streamlit as st
 from ultralytics import YOLO
 import numpy as np
 import cv2
+from postprocess import draw_boxes, extract_detections, predict_options
 
 
 names = {0: 'person', 1: 'bicycle', 2: 'car', 3: 'motorcycle', 4: 'airplane',
@@ -39,48 +40,12 @@ def hex_to_bgr(value):
 def detect_objects_on_image():
     detection_model = YOLO('yolov8l.pt')
     image = read_image_bytes(my_upload, 'detection')
-    result = detection_model.predict(image)
-    number_of_objects = len(result[0].boxes.cls)
-    for i in range(0, number_of_objects):   # ta petla dodaje bbox wykrytych obiektów w danej klatce
-        if  names[int(result[0].boxes.cls[i])] in st.session_state['kind_of_objects']:
-            confidence = result[0].boxes.conf[i]
-            if confidence > threshold:
-                start_point_x = int(result[0].boxes.xywh[i][0]) - \
-                                int(result[0].boxes.xywh[i][2] / 2)
-                start_point_y = int(result[0].boxes.xywh[i][1]) - \
-                                int(result[0].boxes.xywh[i][3] / 2)
-
-                start_point = (start_point_x, start_point_y)
-
-                end_point_x = start_point_x + int(result[0].boxes.xywh[i][2])
-                end_point_y = start_point_y + int(result[0].boxes.xywh[i][3])
-
-                end_point = (end_point_x, end_point_y)
-
-                image = cv2.rectangle(image, start_point, end_point, color_value_rgb, thickness_line)
-
-                if are_confs:
-                    confidence = result[0].boxes.conf[i]
-
-                    image = cv2.putText(image, 
-                                str(confidence)[9:11] + "%",
-                                (end_point_x -30, start_point_y + 12), 
-                                fontFace=cv2.FONT_HERSHEY_TRIPLEX, 
-                                fontScale=0.4, 
-                                color=(0, 255, 0), 
-                                thickness=1)
-
-                if are_labels == True:
-                    object_name = names[int(result[0].boxes.cls[i])]
-
-                    image = cv2.putText(image, 
-                            object_name, 
-                            (start_point_x +6, start_point_y + 12), 
-                            fontFace=cv2.FONT_HERSHEY_TRIPLEX, 
-                            fontScale=0.4, 
-                            color=(0, 255, 0), 
-                            thickness=1)
-                
+    selected = st.session_state['kind_of_objects']
+    result = detection_model.predict(image, **predict_options(selected, threshold))
+    detections = extract_detections(result[0], selected, threshold)
+    image = draw_boxes(image, detections, color_value_rgb, thickness_line, are_labels, are_confs,
+                       font=cv2.FONT_HERSHEY_TRIPLEX, font_scale=0.4, text_color=(0, 255, 0),
+                       confidence_format="{:.0%}")
 
     st.image(image, use_column_width=True)
 
@@ -92,68 +57,24 @@ def detect_objects_on_video():
         file.write(my_upload.getbuffer())
 
     detection_model = YOLO('yolov8l.pt')
-    
-    with st.spinner("Processing video..."):
-        result = detection_model(tempfile_name)
-
 
     vidcap = cv2.VideoCapture(tempfile_name)
     width  = int(vidcap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(vidcap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    vidcap.release()
 
     fourcc = cv2.VideoWriter_fourcc(*'mp4v')
     out = cv2.VideoWriter('output.mp4', fourcc, 35, (width,  height))
 
-    is_success = True
-
-    idx_frame = 0
-    while is_success:   # ta pętla przetwarza klatki
-        is_success, frame = vidcap.read()
-        if is_success == False:
-            break
-        
-        number_of_objects = len(result[idx_frame].boxes.cls)
-
-        for i in range(0, number_of_objects):   # ta petla dodaje bbox wykrytych obiektów w danej klatce
-            if  names[int(result[idx_frame].boxes.cls[i])] in st.session_state['kind_of_objects']:
-                confidence = result[idx_frame].boxes.conf[i]
-                if confidence > threshold:
-                    start_point_x = int(result[idx_frame].boxes.xywh[i][0]) - \
-                                    int(result[idx_frame].boxes.xywh[i][2] / 2)
-                    start_point_y = int(result[idx_frame].boxes.xywh[i][1]) - \
-                                    int(result[idx_frame].boxes.xywh[i][3] / 2)
-
-                    start_point = (start_point_x, start_point_y)
-
-                    end_point_x = start_point_x + int(result[idx_frame].boxes.xywh[i][2])
-                    end_point_y = start_point_y + int(result[idx_frame].boxes.xywh[i][3])
-
-                    end_point = (end_point_x, end_point_y)
-
-                    frame = cv2.rectangle(frame, start_point, end_point, color_value_bgr, thickness_line)
-
-                    if are_confs:
-                        frame = cv2.putText(frame, 
-                                    str(confidence)[9:11] + "%",
-                                    (end_point_x -30, start_point_y + 12), 
-                                    fontFace=cv2.FONT_HERSHEY_TRIPLEX, 
-                                    fontScale=0.4, 
-                                    color=(0, 255, 0), 
-                                    thickness=1)
-
-                    if are_labels == True:
-                        object_name = names[int(result[idx_frame].boxes.cls[i])]
-
-                        frame = cv2.putText(frame, 
-                                object_name, 
-                                (start_point_x +6, start_point_y + 12), 
-                                fontFace=cv2.FONT_HERSHEY_TRIPLEX, 
-                                fontScale=0.4, 
-                                color=(0, 255, 0), 
-                                thickness=1)
-
-        out.write(frame)
-        idx_frame += 1
+    selected = st.session_state['kind_of_objects']
+    with st.spinner("Processing video..."):
+        # ta pętla przetwarza klatki
+        for result in detection_model.predict(tempfile_name, stream=True, **predict_options(selected, threshold)):
+            detections = extract_detections(result, selected, threshold)
+            frame = draw_boxes(result.orig_img, detections, color_value_bgr, thickness_line, are_labels, are_confs,
+                               font=cv2.FONT_HERSHEY_TRIPLEX, font_scale=0.4, text_color=(0, 255, 0),
+                               confidence_format="{:.0%}")
+            out.write(frame)
     
     out.release()
 
@@ -164,7 +85,6 @@ def detect_objects_on_video():
 
 def read_image_bytes(image_bytes, task):
     nparr = np.frombuffer(image_bytes.read(), np.uint8)
-    print(nparr.shape)
     img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
     if task != "segmentation":
         img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
@@ -0,0 +1,118 @@
+"""Bounded worker pools that keep blocking work off the asyncio event loop."""
+import asyncio
+import contextvars
+import functools
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+import config
+from profiling import current_profile
+
+
+class WorkerPool:
+    """Runs blocking callables in an executor with a cap on in-flight calls.
+
+    Calls above the cap are rejected immediately with 503 and a Retry-After
+    header instead of being queued in memory.
+    """
+
+    def __init__(self, name, kind="thread", max_workers=1, max_in_flight=1, retry_after=5):
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_in_flight = max(max_in_flight, 1)
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor = None
+
+    @property
+    def executor(self):
+        # Created lazily so importing the module does not spawn processes
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix=f"argus-{self.name}"
+                )
+        return self._executor
+
+    def reject(self):
+        self.rejected += 1
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server busy: too many {self.name} requests in progress",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    def acquire(self):
+        """Admit one request, or reject it if the pool is at its limit.
+
+        Every successful acquire() must be paired with a release().
+        """
+        # The counter is only touched from the event loop thread
+        if self.in_flight >= self.max_in_flight:
+            self.reject()
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self.completed += 1
+
+    @asynccontextmanager
+    async def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def submit(self, fn, *args, **kwargs):
+        """Run fn in the executor for a request that already holds a slot."""
+        loop = asyncio.get_running_loop()
+        call = functools.partial(fn, *args, **kwargs)
+        profile = current_profile()
+        if profile is not None and self.kind == "thread":
+            # Profiled requests run in their own context (so stages are
+            # recorded) and under cProfile
+            call = functools.partial(contextvars.copy_context().run, profile.call, call)
+        return await loop.run_in_executor(self.executor, call)
+
+    async def run(self, fn, *args, **kwargs):
+        async with self.slot():
+            return await self.submit(fn, *args, **kwargs)
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+image_pool = WorkerPool(
+    "image",
+    kind=config.WORKER_KIND,
+    max_workers=config.IMAGE_WORKERS,
+    max_in_flight=config.IMAGE_MAX_IN_FLIGHT,
+    retry_after=config.RETRY_AFTER_SECONDS,
+)
+video_pool = WorkerPool(
+    "video",
+    kind=config.WORKER_KIND,
+    max_workers=config.VIDEO_WORKERS,
+    max_in_flight=config.VIDEO_MAX_IN_FLIGHT,
+    retry_after=config.RETRY_AFTER_SECONDS,
+)
@@ -106,6 +106,27 @@ const StyledTabs = styled(Tabs)(({ theme }) => ({
   },
 }));
 
+interface DetectionColumns {
+  count: number;
+  boxes: number[][];
+  class_ids: number[];
+  scores: number[];
+  masks?: number[][];
+}
+
+interface DetectionResponse {
+  image?: string;
+  video?: string;
+  format?: string;
+  message?: string;
+  detections?: unknown[];
+  overlay?: {
+    width: number;
+    height: number;
+    detections: DetectionColumns;
+  };
+}
+
 function App() {
   const [mode, setMode] = useState<'light' | 'dark'>('light');
   const [task, setTask] = useState<'detection' | 'segmentation'>('detection');
@@ -115,7 +136,7 @@ function App() {
   const [showConfidence, setShowConfidence] = useState(true);
   const [color, setColor] = useState('#B9282B');
   const [thickness, setThickness] = useState(2);
-  const [result, setResult] = useState<{ image?: string; video?: string } | null>(null);
+  const [result, setResult] = useState<DetectionResponse | null>(null);
   const [classNames, setClassNames] = useState<string[]>([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
@@ -135,6 +156,14 @@ function App() {
     },
   });
 
+  useEffect(() => {
+    // Media is delivered as a blob; release the object URL when it is replaced
+    return () => {
+      if (result?.image) URL.revokeObjectURL(result.image);
+      if (result?.video) URL.revokeObjectURL(result.video);
+    };
+  }, [result]);
+
   useEffect(() => {
     const fetchClassNames = async () => {
       try {
@@ -178,6 +207,16 @@ function App() {
       formData.append('show_confidence', showConfidence.toString());
       formData.append('color', color);
       formData.append('thickness', thickness.toString());
+      formData.append('response_format', 'binary');
+      formData.append('image_format', 'jpeg');
+
+      // Images come back as detections only and are drawn in the browser, so
+      // changing the style does not need another request
+      const isImage = file.type.startsWith('image/');
+      if (isImage) {
+        formData.append('render', 'false');
+        formData.append('include_masks', (task === 'segmentation').toString());
+      }
 
       const response = await fetch('http://localhost:8000/api/detect', {
         method: 'POST',
@@ -186,17 +225,39 @@ function App() {
         mode: 'cors'
       });
 
-      const data = await response.json();
-      
-      if (data.error) {
-        throw new Error(data.error);
+      const contentType = response.headers.get('Content-Type') || '';
+
+      if (isImage && response.ok && contentType.startsWith('application/json')) {
+        const data = await response.json();
+        if (data.error) {
+          throw new Error(data.error);
+        }
+        setResult({
+          image: URL.createObjectURL(file),
+          message: `${task.charAt(0).toUpperCase()}${task.slice(1)} completed successfully`,
+          overlay: { width: data.width, height: data.height, detections: data.detections },
+        });
+        return;
       }
 
-      if (!data.image && !data.video) {
+      if (!response.ok || contentType.startsWith('application/json')) {
+        const data = await response.json().catch(() => ({}));
+        throw new Error(data.error || data.detail || `Request failed with status ${response.status}`);
+      }
+
+      if (!contentType.startsWith('image/') && !contentType.startsWith('video/')) {
         throw new Error('Server response missing image or video data');
       }
 
-      setResult(data);
+      const metadataHeader = response.headers.get('X-Detections');
+      const metadata = metadataHeader ? JSON.parse(metadataHeader) : {};
+      const url = URL.createObjectURL(await response.blob());
+
+      setResult({
+        ...metadata,
+        message: metadata.message || response.headers.get('X-Message') || undefined,
+        [contentType.startsWith('video/') ? 'video' : 'image']: url,
+      });
       setError(null);
     } catch (err) {
       console.error('Error processing file:', err);
@@ -376,7 +437,19 @@ function App() {
 
                 {result && (
                   <StyledPaper>
-                    <ResultsDisplay result={result} task={task} />
+                    <ResultsDisplay
+                      result={result}
+                      task={task}
+                      classNames={classNames}
+                      overlayStyle={{
+                        selectedClasses,
+                        threshold,
+                        showLabels,
+                        showConfidence,
+                        color,
+                        thickness,
+                      }}
+                    />
                   </StyledPaper>
                 )}
 
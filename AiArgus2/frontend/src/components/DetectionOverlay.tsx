@@ -0,0 +1,101 @@
+import React from 'react';
+
+export interface OverlayStyle {
+  selectedClasses: string[];
+  threshold: number;
+  showLabels: boolean;
+  showConfidence: boolean;
+  color: string;
+  thickness: number;
+}
+
+interface DetectionOverlayProps {
+  width: number;
+  height: number;
+  detections: {
+    count: number;
+    boxes: number[][];
+    class_ids: number[];
+    scores: number[];
+    masks?: number[][];
+  };
+  classNames: string[];
+  style: OverlayStyle;
+}
+
+// Stable color per class, used for segmentation masks
+const classColor = (classId: number) => `hsl(${(classId * 137.5) % 360}, 75%, 50%)`;
+
+const toPoints = (flat: number[]) => {
+  const points: string[] = [];
+  for (let i = 0; i + 1 < flat.length; i += 2) {
+    points.push(`${flat[i]},${flat[i + 1]}`);
+  }
+  return points.join(' ');
+};
+
+function DetectionOverlay({ width, height, detections, classNames, style }: DetectionOverlayProps) {
+  const selected = new Set(style.selectedClasses);
+  // The server already filtered at the requested threshold; raising it or
+  // deselecting classes afterwards only hides detections
+  const visible = detections.scores
+    .map((_, i) => i)
+    .filter((i) => detections.scores[i] >= style.threshold
+      && (selected.size === 0 || selected.has(classNames[detections.class_ids[i]])));
+  const fontSize = Math.max(12, Math.round(Math.max(width, height) / 60));
+
+  return (
+    <svg
+      viewBox={`0 0 ${width} ${height}`}
+      preserveAspectRatio="none"
+      style={{ position: 'absolute', inset: 0, width: '100%', height: '100%', pointerEvents: 'none' }}
+    >
+      {visible.map((i) => {
+        const [x1, y1, x2, y2] = detections.boxes[i];
+        const classId = detections.class_ids[i];
+        const mask = detections.masks?.[i];
+        const label = [
+          style.showLabels ? classNames[classId] ?? String(classId) : null,
+          style.showConfidence ? detections.scores[i].toFixed(2) : null,
+        ].filter(Boolean).join(' ');
+
+        return (
+          <g key={i}>
+            {mask && mask.length > 0 ? (
+              <polygon
+                points={toPoints(mask)}
+                fill={classColor(classId)}
+                fillOpacity={0.5}
+                stroke={style.color}
+                strokeWidth={style.thickness}
+              />
+            ) : (
+              <rect
+                x={x1}
+                y={y1}
+                width={x2 - x1}
+                height={y2 - y1}
+                fill="none"
+                stroke={style.color}
+                strokeWidth={style.thickness}
+              />
+            )}
+            {label && (
+              <text
+                x={x1 + 6}
+                y={y1 + fontSize}
+                fill={style.color}
+                fontSize={fontSize}
+                fontFamily="sans-serif"
+              >
+                {label}
+              </text>
+            )}
+          </g>
+        );
+      })}
+    </svg>
+  );
+}
+
+export default DetectionOverlay;
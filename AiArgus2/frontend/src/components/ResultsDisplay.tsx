@@ -7,6 +7,7 @@ import CheckCircleIcon from '@mui/icons-material/CheckCircle';
 import TrendingUpIcon from '@mui/icons-material/TrendingUp';
 import ImageIcon from '@mui/icons-material/Image';
 import VideoLibraryIcon from '@mui/icons-material/VideoLibrary';
+import DetectionOverlay, { OverlayStyle } from './DetectionOverlay';
 
 const fadeIn = keyframes`
   from {
@@ -160,14 +161,28 @@ const IconWrapper = styled(Box)(({ theme }) => ({
 interface ResultsDisplayProps {
   result: {
     image?: string;
+    video?: string;
     format?: string;
     message?: string;
     error?: string;
+    overlay?: {
+      width: number;
+      height: number;
+      detections: {
+        count: number;
+        boxes: number[][];
+        class_ids: number[];
+        scores: number[];
+        masks?: number[][];
+      };
+    };
   } | null;
   task?: 'detection' | 'segmentation';
+  classNames?: string[];
+  overlayStyle?: OverlayStyle;
 }
 
-function ResultsDisplay({ result, task = 'detection' }: ResultsDisplayProps) {
+function ResultsDisplay({ result, task = 'detection', classNames = [], overlayStyle }: ResultsDisplayProps) {
   const theme = useTheme();
 
   if (!result) {
@@ -238,24 +253,46 @@ function ResultsDisplay({ result, task = 'detection' }: ResultsDisplayProps) {
                 {result.message}
               </Typography>
               {result.image && (
-                <img
-                  src={`data:image/png;base64,${btoa(result.image.match(/.{1,2}/g)!.map(byte => String.fromCharCode(parseInt(byte, 16))).join(''))}`}
-                  alt="Processed result with segmentation masks"
+                <Box sx={{ position: 'relative', display: 'inline-block', maxWidth: '100%', mt: 2 }}>
+                  <img
+                    src={result.image}
+                    alt="Processed result with segmentation masks"
+                    style={{ 
+                      maxWidth: '100%', 
+                      height: 'auto',
+                      borderRadius: theme.shape.borderRadius * 2,
+                      boxShadow: `0 4px 20px ${alpha(theme.palette.common.black, 0.1)}`,
+                      display: 'block'
+                    }}
+                    onError={(e) => {
+                      console.error('Error loading image:', e);
+                      const target = e.target as HTMLImageElement;
+                      console.error('Image source:', target.src);
+                      console.error('Full response:', result);
+                    }}
+                  />
+                  {result.overlay && overlayStyle && (
+                    <DetectionOverlay
+                      width={result.overlay.width}
+                      height={result.overlay.height}
+                      detections={result.overlay.detections}
+                      classNames={classNames}
+                      style={overlayStyle}
+                    />
+                  )}
+                </Box>
+              )}
+              {result.video && (
+                <video
+                  src={result.video}
+                  controls
                   style={{ 
                     maxWidth: '100%', 
-                    height: 'auto',
                     borderRadius: theme.shape.borderRadius * 2,
                     boxShadow: `0 4px 20px ${alpha(theme.palette.common.black, 0.1)}`,
                     display: 'block',
                     marginTop: theme.spacing(2)
                   }}
-                  onError={(e) => {
-                    console.error('Error loading image:', e);
-                    const target = e.target as HTMLImageElement;
-                    console.error('Image source:', target.src.substring(0, 100) + '...');
-                    console.error('Image data length:', result.image?.length);
-                    console.error('Full response:', result);
-                  }}
                 />
               )}
             </Box>